@@ -0,0 +1,63 @@
+import asyncio
+import hmac
+from typing import Optional
+
+from fastapi import APIRouter, Header, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+
+from app.config import settings
+from app.services.profiler import FOCUS, profiler
+
+router = APIRouter()
+
+async def require_admin(x_admin_token: Optional[str] = Header(None)):
+    """FastAPI dependency: the X-Admin-Token header must match ADMIN_TOKEN."""
+    if not settings.ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled (ADMIN_TOKEN not set).")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token, settings.ADMIN_TOKEN):
+        raise HTTPException(status_code=401, detail="Invalid admin token.")
+
+@router.post("/profile")
+async def profile(
+    seconds: float = Query(10, gt=0),
+    fraction: Optional[float] = Query(None, gt=0, le=1),
+    interval_ms: Optional[float] = Query(None, ge=1),
+    focus: str = "app",
+    format: str = "collapsed"
+):
+    """
+    Sample this worker's stacks for `seconds` and return them collapsed
+    (flamegraph.pl / speedscope input) or as JSON. With `fraction`, only
+    sample while one of that share of requests is in flight. `focus` keeps
+    stacks through app code, request handlers, embedding or chunking.
+    """
+    if focus not in FOCUS:
+        raise HTTPException(status_code=400, detail=f"focus must be one of {sorted(FOCUS)}")
+    if format not in ("collapsed", "json"):
+        raise HTTPException(status_code=400, detail="format must be 'collapsed' or 'json'")
+    try:
+        session = profiler.start(min(seconds, settings.PROFILER_MAX_SECONDS), interval_ms, fraction, focus)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+    try:
+        await asyncio.to_thread(session.done.wait)
+    finally:
+        # Client gone or cancelled: stop sampling either way
+        profiler.stop()
+
+    summary = session.summary()
+    print(f"Profile: {summary}")
+    if format == "json":
+        return {**summary, "stacks": dict(session.stacks.most_common())}
+    return PlainTextResponse(
+        session.collapsed(),
+        headers={f"X-Profile-{k.replace('_', '-').title()}": str(v) for k, v in summary.items()}
+    )
+
+@router.get("/profile")
+async def profile_status():
+    """The running (or last) profile's progress; stacks come back from the POST."""
+    if not profiler.session:
+        return {"running": False}
+    return profiler.session.summary()
@@ -1,102 +1,165 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException
-from typing import List, Dict
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from typing import List, Dict, Optional, Tuple
 import os
 import shutil
 import tempfile
 
 from app.utils.preprocessing import FileLoader
-from app.utils.chunking import ChunkingStrategy, get_chunker
-from app.services.embeddings import EmbeddingService
-from app.services.retrieval import VectorService
+from app.utils.chunking import ChunkingStrategy, ParentChildChunking, get_chunker
+from app.config import settings
+from app.services.container import services
+from app.services.admission import BACKGROUND
+from app.services.retrieval import namespace_for_tenant
 
 router = APIRouter()
 
-# Services
-# (In prod, use dependency injection)
-embed_service = EmbeddingService(provider="local")
-vector_service = VectorService()
-
 @router.post("/upload")
-async def upload_document(file: UploadFile = File(...)):
+async def upload_document(file: UploadFile = File(...), tenant: Optional[str] = Form(None)):
     """
     Upload a file, process it, and index it into Vector DB.
+    Documents uploaded with a `tenant` are only searchable by that tenant.
     """
     allowed_extensions = {".pdf", ".docx", ".txt", ".md"}
     ext = os.path.splitext(file.filename)[1].lower()
     
     if ext not in allowed_extensions:
         raise HTTPException(status_code=400, detail=f"Unsupported file type. Allowed: {allowed_extensions}")
+
+    try:
+        namespace = namespace_for_tenant(tenant)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
+    # Ingestion is background work: it queues behind interactive queries
+    # at every shared stage, and runs off the event loop
+    async with services.admission.request("ingest", priority=BACKGROUND):
+        return await run_in_threadpool(_ingest, file, namespace, ext)
+
+def _ingest(file: UploadFile, namespace: str, ext: str) -> Dict:
     try:
-        # Save to temp file
-        with tempfile.NamedTemporaryFile(delete=False, suffix=ext) as tmp:
-            shutil.copyfileobj(file.file, tmp)
-            tmp_path = tmp.name
-            
-        # Process
-        loader = FileLoader()
-        chunks = []
-        
-        # Load content
-        # Note: FileLoader typically takes a directory or file path.
-        # We need to adapt it or manually use the specific loader method logic
-        # For simplicity, let's instantiate FileLoader and use `load_file` if we had it exposed publicly
-        # Checking FileLoader implementation... it has `load_directory`. 
-        # Let's verify `FileLoader` logic. It uses `_load_pdf`, etc. based on file.
-        # We can implement a helper or modify FileLoader to load a single file path publically.
-        # Assuming FileLoader defaults to directory but we can use its internal methods or we can just point it to the temp file?
-        # Actually FileLoader.load_directory iterates.
-        # Let's implement a quick single file load here re-using logic or adding to FileLoader.
-        # Better: Add `load_file` to `FileLoader` in `preprocessing.py`.
-        # For now, let's rely on `_load_pdf` etc being accessible or copy logic?
-        # Accessing protected members is bad practice.
-        # Let's update `FileLoader` in a separate step or just do a quick dirty check.
-        # Actually FileLoader has `load_documents` which takes a directory. 
-        # I will hack specific loader here for API simplicity or assume I can create a temp directory.
-        
-        # Temp directory approach (re-uses existing robust logic)
         with tempfile.TemporaryDirectory() as temp_dir:
-            # Move temp file to temp dir with original name
+            # Saved under its original name, which becomes the chunks' source
             final_path = os.path.join(temp_dir, file.filename)
-            shutil.move(tmp_path, final_path)
-            
-            docs = loader.load_directory(temp_dir)
-            
-        if not docs:
+            with open(final_path, "wb") as out:
+                shutil.copyfileobj(file.file, out)
+
+            loader = FileLoader(extraction_cache=services.extraction_cache)
+            chunker = _chunker_for(settings.CHUNK_STRATEGY)
+            pages = chunks_created = count = skipped = 0
+            pending = []
+            written = set() # ids this upload stored or resolved to
+
+            # PDFs stream in page by page, and chunks are embedded and upserted
+            # a batch at a time, so memory holds one page and one batch rather
+            # than the whole document
+            for doc in loader.iter_pages(final_path):
+                pages += 1
+                if isinstance(chunker, ParentChildChunking):
+                    # Small-to-big: parent windows go to the docstore, children get embedded
+                    doc_chunks, parents = chunker.chunk_with_parents(doc)
+                    services.vector_service.store_texts(parents, namespace=namespace)
+                else:
+                    doc_chunks = chunker.chunk(doc)
+                chunks_created += len(doc_chunks)
+                pending.extend(doc_chunks)
+
+                while len(pending) >= settings.INGEST_BATCH_SIZE:
+                    upserted, dropped = _index_batch(pending[:settings.INGEST_BATCH_SIZE], namespace, written)
+                    count, skipped = count + upserted, skipped + dropped
+                    pending = pending[settings.INGEST_BATCH_SIZE:]
+            if pending:
+                upserted, dropped = _index_batch(pending, namespace, written)
+                count, skipped = count + upserted, skipped + dropped
+
+        if not pages:
             raise HTTPException(status_code=400, detail="Could not extract text from file.")
-            
-        # Chunk
-        chunker = get_chunker(strategy_name="fixed") # Default
-        all_chunks = []
-        for doc in docs:
-            doc_chunks = chunker.chunk(doc)
-            all_chunks.extend(doc_chunks)
-            
-        # Embed
-        texts = [c.content for c in all_chunks]
-        embeddings = embed_service.get_embeddings(texts)
-        
-        # Upsert
-        count = vector_service.upsert_chunks(all_chunks, embeddings)
-        
+
+        # A re-upload replaces the document: its chunks that were not rewritten
+        # (removed text, or ids from an older chunking scheme) are deleted
+        stale = services.vector_service.delete_stale(file.filename, written, namespace=namespace)
+        if stale and services.deduplicator:
+            services.deduplicator.forget(namespace, stale)
+
         return {
             "filename": file.filename,
-            "chunks_created": len(all_chunks),
+            "pages": pages,
+            "chunks_created": chunks_created,
+            "duplicates_skipped": skipped,
             "vectors_upserted": count,
+            "stale_vectors_deleted": len(stale),
             "status": "success"
         }
         
+    except HTTPException:
+        raise
+    except ValueError as e:
+        # Unreadable or encrypted files
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        if 'tmp_path' in locals() and os.path.exists(tmp_path):
-            os.remove(tmp_path)
+
+def _index_batch(batch: List, namespace: str, written: set) -> Tuple[int, int]:
+    """Dedup, embed and upsert one batch of chunks; returns (upserted, duplicates skipped)."""
+    # Near-duplicates of stored (or earlier) chunks are attributed, not embedded
+    plan = services.deduplicator.check(
+        batch, namespace, exists=lambda ids: services.vector_service.existing_ids(ids, namespace)
+    ) if services.deduplicator else None
+    new_chunks = plan.kept if plan else batch
+
+    # Embed
+    texts = [c.content for c in new_chunks]
+    with services.admission.stage("embed"):
+        embeddings = services.embed_service.get_embeddings(texts) if texts else []
+    del texts
+
+    # Upsert
+    with services.admission.stage("vector"):
+        count = services.vector_service.upsert_chunks(new_chunks, embeddings, namespace=namespace)
+    if plan:
+        services.vector_service.set_sources(plan.attributions, namespace=namespace)
+        services.deduplicator.commit(plan)
+        written.update(plan.matched)
+    written.update(c.chunk_id for c in new_chunks)
+    return count, plan.skipped if plan else 0
+
+def _embed_staged(texts: List[str]):
+    with services.admission.stage("embed"):
+        return services.embed_service.get_embeddings(texts)
+
+def _chunker_for(strategy: str) -> ChunkingStrategy:
+    if strategy == "semantic":
+        return get_chunker(
+            strategy_name="semantic",
+            embed_fn=_embed_staged,
+            max_tokens=settings.SEMANTIC_CHUNK_MAX_TOKENS,
+            min_tokens=settings.SEMANTIC_CHUNK_MIN_TOKENS,
+            breakpoint_percentile=settings.SEMANTIC_BREAKPOINT_PERCENTILE,
+            count_tokens=services.context_assembler.count_tokens
+        )
+    if strategy == "sentence":
+        return get_chunker(strategy_name="sentence")
+    if strategy == "small_to_big":
+        return get_chunker(
+            strategy_name="small_to_big",
+            parent_size=settings.SMALL_TO_BIG_PARENT_SIZE,
+            child_size=settings.SMALL_TO_BIG_CHILD_SIZE,
+            child_overlap=settings.SMALL_TO_BIG_CHILD_OVERLAP
+        )
+    return get_chunker(strategy_name="fixed", chunk_size=settings.CHUNK_SIZE, overlap=settings.CHUNK_OVERLAP)
 
 @router.delete("/reset")
-async def reset_index():
-    """Delete all vectors."""
+async def reset_index(tenant: Optional[str] = None):
+    """Delete all vectors (only the tenant's namespace when `tenant` is given)."""
+    try:
+        namespace = namespace_for_tenant(tenant)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
     try:
-        vector_service.delete_all()
+        services.vector_service.delete_all(namespace=namespace)
+        if services.deduplicator:
+            services.deduplicator.clear(namespace)
         return {"status": "success", "message": "Index cleared."}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
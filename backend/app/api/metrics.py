@@ -1,9 +1,52 @@
-from fastapi import APIRouter
-from app.services.monitoring import MonitoringService
+from fastapi import APIRouter, Depends
+from app.services.container import services, require_services
 
 router = APIRouter()
-monitor = MonitoringService()
 
+# Not gated on startup: the dashboard shows an empty history until the store is open
 @router.get("/recent")
 async def get_recent_metrics(limit: int = 20):
-    return monitor.get_recent_metrics(limit=limit)
+    if not services.monitoring_service:
+        return []
+    return await services.monitoring_service.get_recent_metrics(limit=limit)
+
+@router.get("/summary")
+async def get_metrics_summary(window: float = 3600):
+    """Per-model request count, latency, tokens and cost over the last `window` seconds."""
+    if not services.monitoring_service:
+        return {"available": False}
+    return {
+        **await services.monitoring_service.get_summary(window_seconds=window),
+        "store": services.monitoring_service.stats()
+    }
+
+@router.get("/coalescing", dependencies=[Depends(require_services)])
+async def get_coalescing_stats():
+    return services.single_flight.stats()
+
+@router.get("/llm", dependencies=[Depends(require_services)])
+async def get_llm_status():
+    if not services.gen_service:
+        return {"available": False}
+    return {"available": True, "providers": services.gen_service.stats()}
+
+@router.get("/vector", dependencies=[Depends(require_services)])
+async def get_vector_latency():
+    return services.vector_service.latency_stats()
+
+@router.get("/dedup", dependencies=[Depends(require_services)])
+async def get_dedup_stats():
+    if not services.deduplicator:
+        return {"enabled": False}
+    return {"enabled": True, **services.deduplicator.stats()}
+
+@router.get("/extraction", dependencies=[Depends(require_services)])
+async def get_extraction_cache_stats():
+    if not services.extraction_cache:
+        return {"enabled": False}
+    return {"enabled": True, **services.extraction_cache.stats()}
+
+@router.get("/admission", dependencies=[Depends(require_services)])
+async def get_admission_stats():
+    """In-flight counts, queue depths and shed counts per request gate and pipeline stage."""
+    return services.admission.stats()
@@ -1,34 +1,50 @@
 from fastapi import APIRouter, HTTPException, BackgroundTasks
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
 from pydantic import BaseModel
-from typing import List, Optional, Dict
+from typing import Callable, List, Optional, Dict, Tuple
+import asyncio
+import json
+import threading
 import time
+from dataclasses import replace
 
-from app.services.embeddings import EmbeddingService
-from app.services.retrieval import VectorService
-from app.services.generation import GenerationService
-from app.services.caching import CacheService
-from app.services.routing import Router as QueryRouter
-from app.services.monitoring import MonitoringService
+from app.config import settings
+from app.services.container import services
+from app.services.caching import normalize_query
+from app.services.conversation import ConversationContext, history_key, needs_history
+from app.services.extractive import NO_CONTEXT_REPLY
+from app.services.hedging import DeadlineExceeded
+from app.services.retrieval import RetrievalScope, build_filter, namespace_for_tenant
+from app.services.warming import CacheWarmer
 
 router = APIRouter()
 
-# Initialize Services
-# Note: Ideally these are dependencies injected, but for simplicity here we instantiate.
-embed_service = EmbeddingService(provider="local")
-vector_service = VectorService()
-# Lazy load generation service to avoid startup errors if keys missing (handled in service)
-try:
-    gen_service = GenerationService()
-except:
-    gen_service = None # Handle gracefully
-    
-cache_service = CacheService()
-query_router = QueryRouter()
-monitoring_service = MonitoringService()
+SKIP_REPLY = "Happy to help! Ask me anything about your documents."
+
+class QueryFilters(BaseModel):
+    source: Optional[List[str]] = None
+    type: Optional[List[str]] = None
+    page: Optional[List[int]] = None
 
 class QueryRequest(BaseModel):
     query: str
     chat_history: Optional[List[Dict]] = []
+    conversation_id: Optional[str] = None # lets the summary of older turns be cached
+    tenant: Optional[str] = None
+    filters: Optional[QueryFilters] = None
+
+class BatchQueryRequest(BaseModel):
+    queries: List[str]
+    tenant: Optional[str] = None
+    filters: Optional[QueryFilters] = None
+
+class CacheWarmRequest(BaseModel):
+    window_hours: Optional[float] = None
+    max_queries: Optional[int] = None
+    half_life_hours: Optional[float] = None
+    concurrency: Optional[int] = None
 
 class SourceDocument(BaseModel):
     text: str
@@ -42,108 +58,420 @@ class QueryResponse(BaseModel):
     model_used: str
 
 @router.post("/query", response_model=QueryResponse)
-async def query_rag(request: QueryRequest):
+async def query_rag(request: QueryRequest, background_tasks: BackgroundTasks):
     start_time = time.time()
     query_text = request.query
-    
-    # 1. Routing
-    route = query_router.route_query(query_text)
-    
-    if route == "chat":
-        # Skip RAG, just chat (simple generation without context)
-        # For MVP, let's just use the same generation service but with empty context
-        # Or a specific "chat" method.
-        # We will treat it as RAG with empty context for now or specific prompt.
-        
-        # Check Cache first even for chat
-        cached = cache_service.get_cached_response(query_text)
-        if cached:
-            latency = (time.time() - start_time) * 1000
-            monitoring_service.log_request(query_text, cached['answer'], latency, model="cache", retrieval_count=0)
-            return QueryResponse(
-                answer=cached['answer'],
-                sources=[],
-                latency_ms=latency,
-                model_used="cache-hit"
-            )
+    scope = _scope_for(request.tenant, request.filters)
 
-        context_chunks = []
-        if gen_service:
-            answer = gen_service.generate_response(query_text, []) # No context
-        else:
-            answer = "LLM Service not available."
-            
-        latency = (time.time() - start_time) * 1000
-        monitoring_service.log_request(query_text, answer, latency, model="groq-chat")
-        
-        # Cache result
-        cache_service.set_cached_response(query_text, {"answer": answer})
-        
-        return QueryResponse(
-            answer=answer,
-            sources=[],
-            latency_ms=latency,
-            model_used="groq-chat"
-        )
-        
-    # 2. RAG Flow
-    
-    # Check Cache
-    cached = cache_service.get_cached_response(query_text)
-    if cached:
-        latency = (time.time() - start_time) * 1000
-        monitoring_service.log_request(query_text, cached['answer'], latency, model="cache", retrieval_count=0)
-        return QueryResponse(
-            answer=cached['answer'],
-            sources=cached.get('sources', []),
-            latency_ms=latency,
-            model_used="cache-hit"
+    # Shed before any work starts when too many queries are already waiting
+    async with services.admission.request("query"):
+        return await _query(request, query_text, start_time, scope, background_tasks)
+
+async def _query(request: QueryRequest, query_text: str, start_time: float, scope: RetrievalScope,
+                 background_tasks: BackgroundTasks) -> QueryResponse:
+    conversation = None
+    if request.chat_history:
+        conversation = await run_in_threadpool(
+            services.conversation_memory.prepare, request.conversation_id, request.chat_history
         )
+        # Summarize turns that left the window after the response is sent
+        background_tasks.add_task(services.conversation_memory.update, request.conversation_id, conversation)
+        if not needs_history(query_text):
+            # Standalone question: answered (and cached) like any other
+            conversation = None
+
+    # Identical in-flight queries share one pipeline execution; answers that
+    # depend on the conversation are keyed by it
+    history = conversation.render() if conversation else ""
+    result, shared = await services.single_flight.do(
+        normalize_query(query_text) + scope.cache_scope + history_key(history),
+        lambda: _run_query(query_text, start_time, scope, conversation)
+    )
+    if not shared:
+        return result
+
+    latency = (time.time() - start_time) * 1000
+    services.monitoring_service.log_request(query_text, result.answer, latency, model="coalesced", retrieval_count=0)
+    return QueryResponse(
+        answer=result.answer,
+        sources=result.sources,
+        latency_ms=latency,
+        model_used="coalesced"
+    )
 
+def _scope_for(tenant: Optional[str], filters: Optional[QueryFilters]) -> RetrievalScope:
     try:
-        # Embed
-        query_emb = embed_service.get_embedding(query_text)
-        
-        # Retrieve
-        results = vector_service.query(query_emb, top_k=5)
-        
-        # Format sources for response
-        sources = []
-        context_chunks = []
-        for res in results:
-            src = SourceDocument(text=res['text'], metadata=res['metadata'], score=res['score'])
-            sources.append(src)
-            context_chunks.append({"text": res['text'], "metadata": res['metadata']})
-            
-        # Generate
-        if gen_service:
-            answer = gen_service.generate_response(query_text, context_chunks)
+        namespace = namespace_for_tenant(tenant)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if filters is None:
+        return RetrievalScope(namespace=namespace)
+    return RetrievalScope(
+        namespace=namespace,
+        filter=build_filter(source=filters.source, doc_type=filters.type, page=filters.page)
+    )
+
+async def _run_query(query_text: str, start_time: float, scope: RetrievalScope,
+                     conversation: Optional[ConversationContext] = None) -> QueryResponse:
+    """
+    The query pipeline as a small task graph: the cache lookup runs alongside
+    a speculative embed -> route -> retrieve chain instead of before it. A
+    cache hit abandons the chain; a miss finds retrieval already done or under
+    way. The time the overlap saved is recorded with the request's metrics.
+    The chain only speculates into a free embed slot: when the stage is busy
+    it waits for the lookup, so a cache hit never holds or queues for one.
+    """
+    history = conversation.render() if conversation else ""
+    t0 = time.time()
+    # `decided` is set once the lookup is over; `abandoned` too if the chain is not needed
+    decided, abandoned = asyncio.Event(), threading.Event()
+    prepared = asyncio.ensure_future(_speculate(query_text, scope, decided, abandoned))
+    # A failure after a cache hit is never awaited: don't let asyncio warn about it
+    prepared.add_done_callback(lambda f: f.cancelled() or f.exception())
+
+    try:
+        # 1. Check Cache (chat answers are cached too)
+        scope, cached, lookup_s = await run_in_threadpool(_lookup, query_text, scope, history)
+        if cached:
+            abandoned.set()
+            decided.set()
+            return _from_cache(query_text, cached, start_time)
+        decided.set()
+
+        # 2-4. Embed, route and retrieve (started with the lookup)
+        query_emb, route, results, prepare_s = await prepared
+        # What running the lookup and the chain one after the other would have added
+        saved_ms = max(0.0, lookup_s + prepare_s - (time.time() - t0)) * 1000
+
+        if route == "skip":
+            return _answer_skip(query_text, start_time, saved_ms)
+        if route == "chat":
+            # Skip RAG, just chat (generation without context)
+            return await run_in_threadpool(_answer_chat, query_text, start_time, scope, history, saved_ms)
+
+        # 5. Generate
+        return await run_in_threadpool(
+            _answer_rag, query_text, query_emb, results, start_time, scope, history, saved_ms
+        )
+
+    except HTTPException:
+        raise
+    except DeadlineExceeded as e:
+        raise HTTPException(status_code=504, detail=f"Vector search timed out: {e}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        if not prepared.done():
+            # Not cancelled: a chain holding an embed slot must run to its release
+            abandoned.set()
+            decided.set()
+
+def _lookup(query_text: str, scope: RetrievalScope, history: str) -> Tuple[RetrievalScope, Optional[Dict], float]:
+    t0 = time.time()
+    # Pin the index generation up front: the answer is cached under the version it was built from
+    scope = replace(scope, generation=services.cache_service.get_generation(scope.namespace))
+    cached = services.cache_service.get_cached_response(query_text, scope=scope.cache_scope + history_key(history))
+    return scope, cached, time.time() - t0
+
+async def _speculate(query_text: str, scope: RetrievalScope, decided: asyncio.Event, abandoned: threading.Event):
+    t0 = time.time()
+    release = services.admission.try_stage("embed")
+    if release is None:
+        # No free slot: wait for the lookup on the loop, not in a worker thread
+        # (threads parked on it could starve the lookups that would wake them)
+        await decided.wait()
+        if abandoned.is_set():
+            return None, None, None, time.time() - t0
+    query_emb, route, results = await run_in_threadpool(_prepare, query_text, scope, abandoned, release)
+    return query_emb, route, results, time.time() - t0
+
+def _prepare(query_text: str, scope: RetrievalScope, abandoned: threading.Event,
+             release: Optional[Callable[[], None]] = None):
+    """
+    Embed, route and (for RAG) retrieve; stops between steps once a cache hit
+    abandons it. With `release`, an embed slot is already held for it.
+    """
+    query_emb, route, results = None, None, None
+    # Embed once: the router and retrieval share this vector
+    if release is not None:
+        try:
+            if not abandoned.is_set():
+                query_emb = services.embed_service.get_embedding(query_text)
+        finally:
+            release()
+    elif not abandoned.is_set():
+        with services.admission.stage("embed"):
+            query_emb = services.embed_service.get_embedding(query_text)
+    if query_emb is not None:
+        route = services.query_router.route_query(query_text, query_emb)
+        if route == "rag" and not abandoned.is_set():
+            results = _retrieve(query_emb, scope)
+    return query_emb, route, results
+
+def _from_cache(query_text: str, cached: Dict, start_time: float) -> QueryResponse:
+    latency = (time.time() - start_time) * 1000
+    services.monitoring_service.log_request(query_text, cached['answer'], latency, model="cache", retrieval_count=0)
+    return QueryResponse(
+        answer=cached['answer'],
+        sources=cached.get('sources', []),
+        latency_ms=latency,
+        model_used="cache-hit"
+    )
+
+def _answer_skip(query_text: str, start_time: float, saved_ms: float = 0.0) -> QueryResponse:
+    # Acknowledgements ("thanks", "ok", "bye") need neither retrieval nor the LLM
+    answer = SKIP_REPLY
+    latency = (time.time() - start_time) * 1000
+    services.monitoring_service.log_request(query_text, answer, latency, model="router-skip", saved_ms=saved_ms)
+    return QueryResponse(
+        answer=answer,
+        sources=[],
+        latency_ms=latency,
+        model_used="router-skip"
+    )
+
+def _answer_chat(query_text: str, start_time: float, scope: RetrievalScope, history: str = "",
+                 saved_ms: float = 0.0) -> QueryResponse:
+    model = "llm-unavailable"
+    if services.gen_service:
+        with services.admission.stage("llm"):
+            answer, provider = services.gen_service.generate_with_provider(query_text, [], history) # No context
+        if answer is None:
+            # Nothing to extract from without context: fail fast
+            answer = NO_CONTEXT_REPLY
         else:
-            answer = "LLM Service not initialized. Check API Keys."
-            
-        latency = (time.time() - start_time) * 1000
-        
-        # Log
-        monitoring_service.log_request(
-            query_text, 
-            answer, 
-            latency, 
-            model="groq-rag", 
-            retrieval_count=len(results)
+            model = f"{provider}-chat"
+    else:
+        answer = "LLM Service not available."
+
+    latency = (time.time() - start_time) * 1000
+    services.monitoring_service.log_request(query_text, answer, latency, model=model, saved_ms=saved_ms)
+
+    # Cache result (never a degraded one; conversational ones under their history)
+    if model != "llm-unavailable":
+        services.cache_service.set_cached_response(query_text, {"answer": answer},
+                                                   scope=scope.cache_scope + history_key(history))
+
+    return QueryResponse(
+        answer=answer,
+        sources=[],
+        latency_ms=latency,
+        model_used=model
+    )
+
+def _embed_batch(texts: List[str]):
+    with services.admission.stage("embed"):
+        return services.embed_service.get_embeddings(texts)
+
+def _retrieve(query_emb: List[float], scope: RetrievalScope) -> List[Dict]:
+    # Filters and namespace are pushed down to the vector store
+    if not settings.ADAPTIVE_RETRIEVAL:
+        with services.admission.stage("vector"):
+            return services.vector_service.query(
+                query_emb, top_k=settings.DEFAULT_RETRIEVAL_TOP_K, filter=scope.filter, namespace=scope.namespace
+            )
+
+    # Over-fetch with vectors, then let score cutoff + MMR decide how many to keep
+    with services.admission.stage("vector"):
+        candidates = services.vector_service.query(
+            query_emb, top_k=settings.RETRIEVAL_CANDIDATES, filter=scope.filter,
+            namespace=scope.namespace, include_values=True, hydrate=False
         )
-        
-        # Cache
-        cache_service.set_cached_response(query_text, {
+    # Texts (or small-to-big parents) are read for the chosen few only
+    selected = services.result_selector.select(query_emb, candidates)
+    return services.vector_service.hydrate(selected, namespace=scope.namespace)
+
+def _answer_rag(query_text: str, query_emb: List[float], results: List[Dict], start_time: float,
+                scope: RetrievalScope, history: str = "", saved_ms: float = 0.0) -> QueryResponse:
+    # Format sources for response
+    sources = []
+    context_chunks = []
+    for res in results:
+        src = SourceDocument(text=res['text'], metadata=res['metadata'], score=res['score'])
+        sources.append(src)
+        context_chunks.append({"text": res['text'], "metadata": res['metadata'], "score": res['score']})
+
+    # Versions of the cited documents, read before the (slow) generation step
+    deps = services.cache_service.source_versions(scope.namespace, [r['metadata'].get('source') for r in results])
+
+    # Merge overlapping neighbours, drop near-duplicates, fit the token budget
+    context = services.context_assembler.assemble(context_chunks)
+
+    model = "llm-unavailable"
+    if services.gen_service:
+        with services.admission.stage("llm"):
+            answer, provider = services.gen_service.generate_with_provider(query_text, context.passages, history)
+        if answer is None:
+            # Every provider failing or open: answer from the retrieved text right away
+            answer = services.extractive_answerer.answer(query_emb, context.passages)
+            model = "extractive-fallback"
+        else:
+            model = f"{provider}-rag"
+    else:
+        answer = "LLM Service not initialized. Check API Keys."
+
+    latency = (time.time() - start_time) * 1000
+
+    # Log
+    services.monitoring_service.log_request(
+        query_text,
+        answer,
+        latency,
+        tokens=context.tokens_saved,
+        model=model,
+        retrieval_count=len(results),
+        saved_ms=saved_ms
+    )
+
+    # Cache (fallback answers would outlive the outage, so skip them)
+    if model.endswith("-rag"):
+        services.cache_service.set_cached_response(query_text, {
             "answer": answer,
             "sources": [s.dict() for s in sources]
-        })
-        
-        return QueryResponse(
-            answer=answer,
-            sources=sources,
-            latency_ms=latency,
-            model_used="groq-rag"
+        }, scope=scope.cache_scope + history_key(history), deps=deps)
+
+    return QueryResponse(
+        answer=answer,
+        sources=sources,
+        latency_ms=latency,
+        model_used=model
+    )
+
+@router.post("/query/batch")
+async def query_batch(request: BatchQueryRequest):
+    """
+    Answer many queries in one call, streamed back as NDJSON in completion order.
+    Each line carries the `index` of the query it answers.
+    """
+    if len(request.queries) > settings.BATCH_MAX_QUERIES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many queries. Max per batch: {settings.BATCH_MAX_QUERIES}"
         )
 
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    scope = _scope_for(request.tenant, request.filters)
+    # Admitted (or shed) before the stream starts; the slot is held until it ends
+    release = await services.admission.admit("query")
+    return StreamingResponse(_stream_batch(request.queries, scope, release), media_type="application/x-ndjson",
+                             # Also covers a client gone before the first line; async so it runs on the loop
+                             background=BackgroundTask(_call_on_loop, release))
+
+async def _call_on_loop(fn):
+    fn()
+
+async def _stream_batch(queries: List[str], scope: RetrievalScope, release=None):
+    try:
+        async for line in _batch_lines(queries, scope):
+            yield line
+    finally:
+        if release:
+            release()
+
+async def _batch_lines(queries: List[str], scope: RetrievalScope):
+    start_time = time.time()
+
+    # Duplicates within the batch are answered once
+    positions: Dict[str, List[int]] = {}
+    unique: List[str] = []
+    for i, q in enumerate(queries):
+        key = normalize_query(q)
+        if key not in positions:
+            positions[key] = []
+            unique.append(q)
+        positions[key].append(i)
+
+    def lines(query_text: str, payload: Dict) -> str:
+        return "".join(
+            json.dumps({"index": i, "query": queries[i], **payload}) + "\n"
+            for i in positions[normalize_query(query_text)]
+        )
+
+    scope = replace(scope, generation=await run_in_threadpool(services.cache_service.get_generation, scope.namespace))
+
+    # One round trip for every cache lookup
+    cached = await run_in_threadpool(services.cache_service.get_cached_responses, unique, scope.cache_scope)
+    misses = []
+    for query_text, hit in zip(unique, cached):
+        if hit:
+            yield lines(query_text, _from_cache(query_text, hit, start_time).dict())
+        else:
+            misses.append(query_text)
+
+    if not misses:
+        return
+
+    # One encode call for every miss; routing reuses these vectors
+    embeddings = await run_in_threadpool(_embed_batch, misses)
+
+    generation_slots = asyncio.Semaphore(settings.BATCH_GENERATION_CONCURRENCY)
+
+    async def answer(query_text: str, query_emb: List[float]):
+        try:
+            route = services.query_router.route_query(query_text, query_emb)
+            if route == "skip":
+                return query_text, _answer_skip(query_text, start_time).dict()
+
+            # Retrieval runs unthrottled; only LLM calls take a slot
+            results = await run_in_threadpool(_retrieve, query_emb, scope) if route == "rag" else None
+            async with generation_slots:
+                if results is None:
+                    response = await run_in_threadpool(_answer_chat, query_text, start_time, scope)
+                else:
+                    response = await run_in_threadpool(_answer_rag, query_text, query_emb, results, start_time, scope)
+            return query_text, response.dict()
+        except Exception as e:
+            return query_text, {"error": str(e)}
+
+    tasks = [asyncio.ensure_future(answer(q, emb)) for q, emb in zip(misses, embeddings)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            query_text, payload = await next_done
+            yield lines(query_text, payload)
+    finally:
+        # Client went away: stop the work nobody will read
+        for t in tasks:
+            t.cancel()
+
+_cache_warmer: Optional[CacheWarmer] = None
+
+def get_cache_warmer() -> CacheWarmer:
+    global _cache_warmer
+    if _cache_warmer is None:
+        _cache_warmer = CacheWarmer(
+            services.monitoring_service,
+            services.cache_service,
+            answer=_warm_answer,
+            is_cached=_is_cached,
+            busy=lambda: services.single_flight.stats()["in_flight"] > settings.CACHE_WARM_YIELD_INFLIGHT
+        )
+    return _cache_warmer
+
+def _warm_scope() -> RetrievalScope:
+    # The metrics log does not record tenants: warm the default namespace
+    return RetrievalScope(namespace=namespace_for_tenant(None))
+
+def _is_cached(queries: List[str]) -> List[bool]:
+    scope = _warm_scope()
+    scope = replace(scope, generation=services.cache_service.get_generation(scope.namespace))
+    return [hit is not None for hit in services.cache_service.get_cached_responses(queries, scope.cache_scope)]
+
+async def _warm_answer(query_text: str) -> str:
+    # Same pipeline as /query, so the answer lands under the same cache key;
+    # kept out of the metrics so warming does not feed its own popularity
+    with services.monitoring_service.suppressed(), services.admission.background():
+        return (await _run_query(query_text, time.time(), _warm_scope())).model_used
+
+@router.post("/cache/warm")
+async def warm_cache(request: Optional[CacheWarmRequest] = None):
+    """
+    Re-answer the most requested queries from the metrics history into the
+    cache (e.g. after a deploy, or after re-ingesting following a reset).
+    Runs in the background; poll GET /cache/warm for progress.
+    """
+    options = request.dict(exclude_none=True) if request else {}
+    return get_cache_warmer().start(**options)
+
+@router.get("/cache/warm")
+async def cache_warm_status():
+    return get_cache_warmer().status
@@ -1,10 +1,17 @@
-from typing import Optional
+from typing import Dict, List, Optional
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 class Settings(BaseSettings):
     # App Config
     APP_NAME: str = "RAG Production System"
     DEBUG: bool = False
+    STARTUP_BLOCKING: bool = False # finish building services before accepting traffic
+    STARTUP_WAIT_SECONDS: float = 30.0 # how long a request waits for startup before 503
+
+    # Production Server (gunicorn.conf.py)
+    SERVER_WORKERS: int = 2
+    SERVER_THREADS_PER_WORKER: int = 0 # torch/tokenizer threads per worker, 0 = cpu_count // workers
+    SERVER_PRELOAD: bool = True # load models in the master and share them with forked workers
     
     # OpenAI
     OPENAI_API_KEY: Optional[str] = None
@@ -19,24 +26,156 @@ class Settings(BaseSettings):
     PINECONE_API_KEY: Optional[str] = None
     PINECONE_ENV: str = "us-east-1"
     PINECONE_INDEX_NAME: str = "rag-agent"
+    PINECONE_HOST: Optional[str] = None # explicit index host (private endpoint or local test server)
+    PINECONE_POOL_SIZE: int = 16 # HTTP connections / query threads
+    PINECONE_QUERY_TIMEOUT_MS: int = 2000
+    PINECONE_HEDGE_ENABLED: bool = False # fire a backup query when the first one is slow
+    PINECONE_HEDGE_PERCENTILE: float = 95.0 # hedge after this percentile of recent latency
+    PINECONE_HEDGE_MIN_DELAY_MS: int = 20
+
+    # Vector Store
+    VECTOR_BACKEND: str = "pinecone" # options: pinecone, local
+    DEFAULT_NAMESPACE: str = "" # namespace used when no tenant is given
+    LOCAL_INDEX_FILTER_FIELDS: List[str] = ["source", "type", "page"] # bitmap-indexed metadata
+    LOCAL_INDEX_SNAPSHOT_PATH: Optional[str] = None # snapshot loaded into the local index at startup
+    SNAPSHOT_IMPORT_CONCURRENCY: int = 4 # parallel Pinecone upsert batches when importing
     
     # Database
     DATABASE_URL: Optional[str] = None
     POSTGRES_USER: Optional[str] = None
     POSTGRES_PASSWORD: Optional[str] = None
     POSTGRES_DB: Optional[str] = None
+
+    # Request Metrics Store
+    MONITORING_BACKEND: str = "auto" # postgres, sqlite or auto (postgres when DATABASE_URL is set)
+    MONITORING_DB_PATH: str = "data/metrics.sqlite"
+    MONITORING_BATCH_SIZE: int = 200 # records per insert
+    MONITORING_FLUSH_INTERVAL: float = 1.0 # seconds between flushes of a partial batch
+    MONITORING_BUFFER_LIMIT: int = 10000 # oldest unflushed records are dropped beyond this
     
     # Redis
     REDIS_URL: Optional[str] = None
+    # Re-uploading a document only invalidates answers that cited it (new documents
+    # and resets still invalidate the whole namespace)
+    CACHE_DEPENDENCY_TRACKING: bool = False
+
+    # Cache Warming (popular queries from the metrics store, re-answered into the cache)
+    CACHE_WARM_ON_STARTUP: bool = False # /readyz stays 503 until the startup warm finishes
+    CACHE_WARM_WINDOW_HOURS: float = 168.0 # request history considered
+    CACHE_WARM_MAX_QUERIES: int = 200
+    CACHE_WARM_HALF_LIFE_HOURS: float = 24.0 # recency weighting; 0 ranks by raw frequency
+    CACHE_WARM_CONCURRENCY: int = 2
+    CACHE_WARM_YIELD_INFLIGHT: int = 0 # warming pauses while more live queries than this are in flight
+    CACHE_WARM_MAX_SECONDS: float = 300.0 # no new queries are started after this
     
     # RAG Parameters
     CHUNK_SIZE: int = 1000
     CHUNK_OVERLAP: int = 200
-    DEFAULT_RETRIEVAL_TOP_K: int = 5
+    CHUNK_STRATEGY: str = "fixed" # fixed, sentence, semantic or small_to_big (used by /documents/upload)
+    INGEST_BATCH_SIZE: int = 256 # chunks embedded and upserted per step during upload
+    SEMANTIC_CHUNK_MAX_TOKENS: int = 256
+    SEMANTIC_CHUNK_MIN_TOKENS: int = 64 # a topic shift only closes chunks at least this long
+    SEMANTIC_BREAKPOINT_PERCENTILE: float = 25.0 # lowest adjacent-sentence similarities treated as shifts
+    # small_to_big: small child chunks are embedded, their parent window is sent to the LLM
+    SMALL_TO_BIG_PARENT_SIZE: int = 2000
+    SMALL_TO_BIG_CHILD_SIZE: int = 400
+    SMALL_TO_BIG_CHILD_OVERLAP: int = 50
+
+    # Chunk Docstore (text kept out of vector metadata; small_to_big turns it on)
+    DOCSTORE_ENABLED: bool = False # every API process must see the same DOCSTORE_PATH
+    DOCSTORE_PATH: str = "data/docstore.sqlite"
+
+    # PDF Extraction Cache (per-page text keyed by file content hash)
+    EXTRACTION_CACHE_ENABLED: bool = True
+    EXTRACTION_CACHE_PATH: str = "data/extraction_cache.sqlite"
+    EXTRACTION_CACHE_MAX_MB: float = 512 # compressed text; least recently used files go first
+    EXTRACTION_CACHE_PENDING_TTL: float = 3600 # seconds before pages of an unfinished extraction are dropped
+
+    # Ingest Dedup (MinHash + LSH)
+    DEDUP_ENABLED: bool = True
+    DEDUP_INDEX_PATH: str = "data/dedup_index.sqlite"
+    DEDUP_THRESHOLD: float = 0.85 # estimated Jaccard similarity of word 3-grams
+    DEDUP_NUM_PERM: int = 128
+    DEDUP_BANDS: int = 16 # 16 bands x 8 rows: ~99% recall at 0.85 similarity
+    DEFAULT_RETRIEVAL_TOP_K: int = 5 # fixed top_k when ADAPTIVE_RETRIEVAL is off
+    ADAPTIVE_RETRIEVAL: bool = True
+    RETRIEVAL_CANDIDATES: int = 20 # over-fetched before cutoff + MMR
+    RETRIEVAL_MIN_K: int = 1
+    RETRIEVAL_MAX_K: int = 8
+    RETRIEVAL_RELATIVE_CUTOFF: float = 0.8 # keep candidates scoring >= this fraction of the best
+    RETRIEVAL_MMR_LAMBDA: float = 0.7 # 1.0 = pure relevance, 0.0 = pure diversity
+    RETRIEVAL_DUPLICATE_SIMILARITY: float = 0.95 # candidates this similar to a chosen one are skipped
     EMBEDDING_PROVIDER: str = "local" # options: openai, local
     EMBEDDING_MODEL: str = "all-MiniLM-L6-v2" # or text-embedding-3-small
     LLM_PROVIDER: str = "groq" # options: openai, anthropic, groq
     LLM_MODEL: str = "llama-3.3-70b-versatile"
+    LLM_PROVIDERS: List[str] = [] # provider pool, e.g. ["groq", "openai"]; empty = [LLM_PROVIDER]
+    LLM_MODELS: Dict[str, str] = {"openai": "gpt-4o-mini", "anthropic": "claude-3-5-haiku-latest"} # else LLM_MODEL
+    LLM_MAX_CONCURRENCY: Dict[str, int] = {} # in-flight calls per provider
+    LLM_DEFAULT_MAX_CONCURRENCY: int = 8
+    LLM_EWMA_ALPHA: float = 0.2 # weight of the newest sample in latency/error averages
+    LLM_ERROR_PENALTY: float = 4.0 # how strongly recent errors push a provider down the ranking
+    LLM_LATENCY_PRIOR: float = 2.0 # seconds assumed for providers before any is measured
+    LLM_QUEUE_TIMEOUT: float = 2.0 # seconds to wait for a slot when all providers are saturated
+    LLM_TIMEOUTS: Dict[str, float] = {"groq": 15.0, "openai": 30.0, "anthropic": 30.0} # seconds per call
+    LLM_DEFAULT_TIMEOUT: float = 30.0
+    LLM_MAX_RETRIES: int = 1
+    LLM_BREAKER_FAILURES: int = 3 # consecutive failed/slow calls that open the circuit
+    LLM_BREAKER_SLOW_SECONDS: float = 10.0 # successful calls slower than this count as failures
+    LLM_BREAKER_RESET_SECONDS: float = 30.0 # how long the circuit stays open before a trial call
+    EXTRACTIVE_MAX_SENTENCES: int = 3 # sentences in the fallback answer
+
+    # Mock LLM provider (offline testing; any provider name starting with "mock")
+    MOCK_LLM_LATENCY_MS: float = 200.0
+    MOCK_LLM_JITTER_MS: float = 20.0
+    MOCK_LLM_ERROR_RATE: float = 0.0
+    MOCK_LLM_PROFILES: Dict[str, Dict[str, float]] = {} # per-name overrides, e.g. {"mock-slow": {"latency_ms": 900}}
+
+    # Query Routing
+    ROUTER_CENTROIDS_PATH: str = "data/router_centroids.npz"
+    ROUTER_MIN_CONFIDENCE: float = 0.35 # cosine to the best intent centroid
+    ROUTER_MIN_MARGIN: float = 0.05 # lead over the runner-up intent
+
+    # Context Assembly
+    CONTEXT_MAX_TOKENS: int = 3000
+    CONTEXT_DEDUP_THRESHOLD: float = 0.85 # word-shingle overlap above which passages are duplicates
+    CONTEXT_TOKENIZER: str = "cl100k_base"
+
+    # Conversation Memory
+    CONVERSATION_RECENT_TOKENS: int = 800 # newest chat_history turns sent verbatim
+    CONVERSATION_SUMMARY_TOKENS: int = 250 # cap on the summary of older turns
+    CONVERSATION_SUMMARY_TTL: int = 86400 # seconds a cached summary outlives its last turn
+
+    # Admission Control (limits per request gate and pipeline stage; waits are bounded)
+    ADMISSION_ENABLED: bool = True
+    ADMISSION_MAX_QUERIES: int = 20 # interactive requests in flight; each uses up to 2 of the 40 worker threads (lookup + speculative chain)
+    ADMISSION_QUERY_QUEUE: int = 64 # queries waiting beyond this are shed with 429
+    ADMISSION_MAX_INGESTS: int = 2 # concurrent uploads
+    ADMISSION_INGEST_QUEUE: int = 8
+    ADMISSION_STAGE_LIMITS: Dict[str, int] = {"embed": 4, "vector": 16, "llm": 8}
+    ADMISSION_DEFAULT_STAGE_LIMIT: int = 8
+    ADMISSION_STAGE_QUEUES: Dict[str, int] = {}
+    ADMISSION_DEFAULT_STAGE_QUEUE: int = 32
+    ADMISSION_QUEUE_TIMEOUT_MS: Dict[str, float] = {"llm": 5000} # by gate or stage; past it: 503
+    ADMISSION_DEFAULT_QUEUE_TIMEOUT_MS: float = 2000
+    ADMISSION_BACKGROUND_TIMEOUT_MS: float = 60000 # ingestion and warming wait longer instead of failing
+
+    # Batch Queries
+    BATCH_MAX_QUERIES: int = 100
+    BATCH_GENERATION_CONCURRENCY: int = 4 # parallel LLM calls per batch
+
+    # Request Coalescing
+    COALESCE_DISTRIBUTED_LOCK: bool = False # share in-flight work across workers via Redis
+    COALESCE_LOCK_TTL_MS: int = 30000
+    COALESCE_POLL_INTERVAL_MS: int = 50
+
+    # Admin Endpoints and Profiling
+    ADMIN_TOKEN: Optional[str] = None # X-Admin-Token for /api/admin; admin routes are off when unset
+    PROFILER_INTERVAL_MS: float = 10 # stack sampling period
+    PROFILER_MAX_SECONDS: float = 120
+    PROFILER_MAX_OVERHEAD: float = 0.05 # share of the interval a tick may take before sampling slows down
+    PROFILER_MAX_STACKS: int = 5000 # distinct stacks kept; the rest count as [truncated]
+    PROFILER_MAX_DEPTH: int = 128
 
     model_config = SettingsConfigDict(env_file=".env", extra="ignore")
 
@@ -1,11 +1,39 @@
-from fastapi import FastAPI
+import asyncio
+from contextlib import asynccontextmanager
+
+from fastapi import Depends, FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from app.api import query, documents, metrics
+from fastapi.responses import JSONResponse
+
+from app.config import settings
+from app.api import query, documents, metrics, admin
+from app.services.container import services, require_services
+from app.services.profiler import SampledRequests
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Build services after the server is accepting connections, so liveness
+    # checks pass while the embedding model is still loading.
+    startup = asyncio.create_task(services.start())
+    if settings.CACHE_WARM_ON_STARTUP:
+        asyncio.create_task(_warm_after_startup(startup))
+    if settings.STARTUP_BLOCKING:
+        await startup
+    yield
+    if not startup.done():
+        startup.cancel()
+    await services.stop()
+
+async def _warm_after_startup(startup: asyncio.Task):
+    await startup
+    if services.ready:
+        query.get_cache_warmer().start()
 
 app = FastAPI(
     title="RAG Production System API",
     description="API for Retrieval Augmented Generation System",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # CORS Configuration
@@ -21,12 +49,30 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(SampledRequests)
 
 # Include Routers
-app.include_router(query.router, prefix="/api", tags=["Query"])
-app.include_router(documents.router, prefix="/api/documents", tags=["Documents"])
+app.include_router(query.router, prefix="/api", tags=["Query"], dependencies=[Depends(require_services)])
+app.include_router(documents.router, prefix="/api/documents", tags=["Documents"], dependencies=[Depends(require_services)])
 app.include_router(metrics.router, prefix="/api/metrics", tags=["Metrics"])
+app.include_router(admin.router, prefix="/api/admin", tags=["Admin"], dependencies=[Depends(admin.require_admin)])
 
 @app.get("/")
 def read_root():
     return {"status": "ok", "message": "RAG Backend is running."}
+
+@app.get("/healthz")
+def liveness():
+    """Process is up and serving HTTP."""
+    return {"status": "ok"}
+
+@app.get("/readyz")
+def readiness():
+    """Services are built and the app can answer queries."""
+    status = services.status()
+    ready = status["ready"]
+    if settings.CACHE_WARM_ON_STARTUP:
+        # Hold traffic until popular questions are cached
+        status["cache_warm"] = query.get_cache_warmer().status
+        ready = ready and status["cache_warm"]["state"] in ("done", "failed", "skipped")
+    return JSONResponse(status_code=200 if ready else 503, content=status)
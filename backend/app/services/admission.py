@@ -0,0 +1,308 @@
+import asyncio
+import heapq
+import itertools
+import math
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List, Optional
+
+from fastapi import HTTPException
+
+from app.config import settings
+
+INTERACTIVE = 0
+BACKGROUND = 1 # ingestion and cache warming: served after every waiting interactive request
+
+# Priority of the current request; run_in_threadpool copies it into worker threads
+_priority: ContextVar[int] = ContextVar("admission_priority", default=INTERACTIVE)
+
+class Overloaded(HTTPException):
+    """A request shed by admission control (429 queue full, 503 queue deadline passed)."""
+
+    def __init__(self, gate: str, status_code: int, detail: str, retry_after: int):
+        super().__init__(status_code=status_code, detail=f"{detail} ({gate})",
+                         headers={"Retry-After": str(retry_after)})
+        self.gate = gate
+
+class _Limit:
+    """
+    Concurrency limit with a bounded priority wait queue. Shared accounting
+    for the thread (stage) and asyncio (request) flavours below: callers are
+    granted slots lowest priority value first, FIFO within a priority.
+    """
+
+    def __init__(self, name: str, limit: int, queue_size: int, queue_timeout_ms: float,
+                 background_timeout_ms: float):
+        self.name = name
+        self.limit = limit
+        self.queue_size = queue_size
+        self.timeouts = {INTERACTIVE: queue_timeout_ms / 1000, BACKGROUND: background_timeout_ms / 1000}
+        self.in_use = 0
+        self._waiters: List = [] # heap of [priority, seq, waiter, active]
+        self._seq = itertools.count()
+        self.ewma_hold: Optional[float] = None # seconds a slot is held
+        self.counters = {"admitted": 0, "queued": 0, "shed_queue_full": 0, "shed_queue_timeout": 0}
+        self._wait_total = 0.0
+
+    def _queued(self, priority: int = None) -> int:
+        return sum(1 for w in self._waiters if w[3] and (priority is None or w[0] == priority))
+
+    def _has_room(self, priority: int) -> bool:
+        # Background waiters never take queue room from interactive ones
+        return self._queued(INTERACTIVE if priority == INTERACTIVE else None) < self.queue_size
+
+    def _retry_after(self) -> int:
+        # Time for the current queue to drain at the observed service rate
+        hold = self.ewma_hold or 1.0
+        return max(1, math.ceil((self._queued() + 1) * hold / self.limit))
+
+    def _full(self):
+        self.counters["shed_queue_full"] += 1
+        raise Overloaded(self.name, 429, "Too many requests waiting", self._retry_after())
+
+    def _timed_out(self):
+        self.counters["shed_queue_timeout"] += 1
+        raise Overloaded(self.name, 503, "Timed out waiting for capacity", self._retry_after())
+
+    def _granted(self, waited: float):
+        self.counters["admitted"] += 1
+        self._wait_total += waited
+
+    def _observe_hold(self, seconds: float):
+        self.ewma_hold = seconds if self.ewma_hold is None else 0.2 * seconds + 0.8 * self.ewma_hold
+
+    def _head(self):
+        while self._waiters and not self._waiters[0][3]:
+            heapq.heappop(self._waiters)
+        return self._waiters[0] if self._waiters else None
+
+    def stats(self) -> Dict[str, Any]:
+        admitted = self.counters["admitted"]
+        return {
+            "limit": self.limit,
+            "in_use": self.in_use,
+            "queue_depth": self._queued(),
+            "queue_depth_interactive": self._queued(INTERACTIVE),
+            "queue_depth_background": self._queued(BACKGROUND),
+            "queue_size": self.queue_size,
+            "avg_wait_ms": round(self._wait_total / admitted * 1000, 2) if admitted else 0.0,
+            "ewma_hold_ms": round(self.ewma_hold * 1000, 2) if self.ewma_hold is not None else None,
+            **self.counters
+        }
+
+class StageLimiter(_Limit):
+    """Limit for one pipeline stage (embed, vector, llm), entered from worker threads."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._cond = threading.Condition()
+
+    @contextmanager
+    def slot(self, priority: int = None):
+        priority = _priority.get() if priority is None else priority
+        self.acquire(priority)
+        t0 = time.time()
+        try:
+            yield
+        finally:
+            self.release(time.time() - t0)
+
+    def try_acquire(self) -> bool:
+        """Take a slot only if one is free with nobody queued; never waits."""
+        with self._cond:
+            if self.in_use < self.limit and self._head() is None:
+                self.in_use += 1
+                self._granted(0.0)
+                return True
+            return False
+
+    def acquire(self, priority: int):
+        t0 = time.time()
+        with self._cond: # reentrant: try_acquire takes it again
+            if self.try_acquire():
+                return
+            if not self._has_room(priority):
+                self._full()
+
+            entry = [priority, next(self._seq), None, True]
+            heapq.heappush(self._waiters, entry)
+            self.counters["queued"] += 1
+            deadline = t0 + self.timeouts[priority]
+            while not (self.in_use < self.limit and self._head() is entry):
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    entry[3] = False
+                    self._cond.notify_all()
+                    self._timed_out()
+                self._cond.wait(remaining)
+            heapq.heappop(self._waiters)
+            self.in_use += 1
+            self._granted(time.time() - t0)
+            # The next waiter may fit too
+            self._cond.notify_all()
+
+    def release(self, held: float = 0.0):
+        with self._cond:
+            self.in_use -= 1
+            self._observe_hold(held)
+            self._cond.notify_all()
+
+class RequestGate(_Limit):
+    """Limit on whole requests in flight, awaited on the event loop before any work starts."""
+
+    async def acquire(self, priority: int):
+        t0 = time.time()
+        if self.in_use < self.limit and self._head() is None:
+            self.in_use += 1
+            self._granted(0.0)
+            return
+        if not self._has_room(priority):
+            self._full()
+
+        future = asyncio.get_running_loop().create_future()
+        entry = [priority, next(self._seq), future, True]
+        heapq.heappush(self._waiters, entry)
+        self.counters["queued"] += 1
+        try:
+            # release() hands the slot over by resolving the future
+            await asyncio.wait_for(asyncio.shield(future), self.timeouts[priority])
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            entry[3] = False
+            if future.done() and not future.cancelled():
+                # Granted just as we gave up: pass it on
+                self.release()
+            else:
+                future.cancel()
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            self._timed_out()
+        self._granted(time.time() - t0)
+
+    def release(self, held: float = 0.0):
+        if held:
+            self._observe_hold(held)
+        head = self._head()
+        if head is not None:
+            heapq.heappop(self._waiters)
+            head[3] = False
+            head[2].set_result(True) # the slot moves to the waiter; in_use is unchanged
+        else:
+            self.in_use -= 1
+
+class AdmissionController:
+    """
+    Admission control for the query and ingest paths.
+
+    Requests pass a gate before any work starts (interactive queries and
+    uploads have separate gates), then each expensive stage (embedding,
+    vector search, LLM generation) has its own concurrency limit shared by
+    every path. Waiters queue by priority, so ingestion and cache warming
+    only get a slot when no interactive request is waiting. A full queue
+    sheds with 429 and a passed queue deadline with 503, both carrying a
+    Retry-After estimated from the queue depth and observed hold times.
+    """
+
+    STAGES = ("embed", "vector", "llm")
+
+    def __init__(self):
+        self.enabled = settings.ADMISSION_ENABLED
+        timeouts = settings.ADMISSION_QUEUE_TIMEOUT_MS
+        background_timeout = settings.ADMISSION_BACKGROUND_TIMEOUT_MS
+        self.gates = {
+            "query": RequestGate("query", settings.ADMISSION_MAX_QUERIES, settings.ADMISSION_QUERY_QUEUE,
+                                 timeouts.get("query", settings.ADMISSION_DEFAULT_QUEUE_TIMEOUT_MS), background_timeout),
+            "ingest": RequestGate("ingest", settings.ADMISSION_MAX_INGESTS, settings.ADMISSION_INGEST_QUEUE,
+                                  background_timeout, background_timeout),
+        }
+        self.stages = {
+            name: StageLimiter(
+                name,
+                settings.ADMISSION_STAGE_LIMITS.get(name, settings.ADMISSION_DEFAULT_STAGE_LIMIT),
+                settings.ADMISSION_STAGE_QUEUES.get(name, settings.ADMISSION_DEFAULT_STAGE_QUEUE),
+                timeouts.get(name, settings.ADMISSION_DEFAULT_QUEUE_TIMEOUT_MS),
+                background_timeout
+            )
+            for name in self.STAGES
+        }
+
+    @asynccontextmanager
+    async def request(self, gate: str, priority: int = INTERACTIVE):
+        """Hold a request slot for the body of the block; sets the priority its stages use."""
+        release = await self.admit(gate, priority)
+        try:
+            yield
+        finally:
+            release()
+
+    async def admit(self, gate: str, priority: int = INTERACTIVE):
+        """Acquire a request slot and return its release callback (for streamed responses)."""
+        _priority.set(priority)
+        if not self.enabled:
+            return lambda: None
+        limiter = self.gates[gate]
+        await limiter.acquire(priority)
+        loop = asyncio.get_running_loop()
+        t0 = time.time()
+        released = False
+
+        def release_on_loop():
+            # Idempotent: a stream may release from both its generator and a background task
+            nonlocal released
+            if not released:
+                released = True
+                limiter.release(time.time() - t0)
+
+        def release():
+            # The gate's heap and waiter futures belong to the event loop: a
+            # call from a worker thread (sync background tasks) hops back to it
+            try:
+                on_loop = asyncio.get_running_loop() is loop
+            except RuntimeError:
+                on_loop = False
+            if on_loop:
+                release_on_loop()
+            else:
+                loop.call_soon_threadsafe(release_on_loop)
+        return release
+
+    @contextmanager
+    def stage(self, name: str):
+        """Hold a slot of one pipeline stage; called from worker threads."""
+        if not self.enabled:
+            yield
+            return
+        with self.stages[name].slot():
+            yield
+
+    def try_stage(self, name: str) -> Optional[Callable[[], None]]:
+        """
+        Take a stage slot only if one is free right now: its release callback,
+        or None. Never blocks, so it is safe on the event loop. For speculative
+        work, which must never queue ahead of (or hold a slot from) requests
+        whose work is known to be needed.
+        """
+        if not self.enabled:
+            return lambda: None
+        limiter = self.stages[name]
+        if not limiter.try_acquire():
+            return None
+        t0 = time.time()
+        return lambda: limiter.release(time.time() - t0)
+
+    @contextmanager
+    def background(self):
+        """Run the block's stages at background priority (work started outside a request)."""
+        token = _priority.set(BACKGROUND)
+        try:
+            yield
+        finally:
+            _priority.reset(token)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "requests": {name: gate.stats() for name, gate in self.gates.items()},
+            "stages": {name: stage.stats() for name, stage in self.stages.items()}
+        }
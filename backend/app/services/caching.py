@@ -1,9 +1,35 @@
-import redis
 import json
 import hashlib
-from typing import Optional, Dict
+import uuid
+from typing import Optional, Dict, List
 from app.config import settings
 
+# Compare-and-delete so a worker never releases a lock another worker re-acquired
+_RELEASE_LOCK_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+# Record an upsert batch: bump every uploaded source's version, and the whole
+# namespace's generation if any source is new to it (any answer may now cite it).
+# KEYS = [generation, source set, source version...], ARGV = source names
+_UPSERT_SOURCES_SCRIPT = """
+local added = redis.call('sadd', KEYS[2], unpack(ARGV))
+for i = 3, #KEYS do
+    redis.call('incr', KEYS[i])
+end
+if added > 0 then
+    redis.call('incr', KEYS[1])
+end
+return added
+"""
+
+def normalize_query(query: str) -> str:
+    """Normalize a query so equivalent questions share cache and in-flight keys."""
+    return query.strip().lower()
+
 class CacheService:
     def __init__(self):
         self.enabled = False
@@ -11,6 +37,7 @@ class CacheService:
         
         if settings.REDIS_URL:
             try:
+                import redis
                 self.redis = redis.from_url(settings.REDIS_URL, decode_responses=True)
                 self.redis.ping()
                 self.enabled = True
@@ -20,32 +47,190 @@ class CacheService:
         else:
             print("REDIS_URL not set. Caching disabled.")
 
-    def _generate_key(self, query: str) -> str:
-        """Generate a consistent cache key for a query."""
-        # Normalize: lower case, strip whitespace
-        normalized = query.strip().lower()
+    def _generate_key(self, query: str, scope: str = "") -> str:
+        """Generate a consistent cache key for a query within a retrieval scope."""
+        normalized = normalize_query(query)
+        if scope:
+            normalized = f"{normalized}\x00{scope}"
         return f"rag_cache:{hashlib.sha256(normalized.encode()).hexdigest()}"
 
-    def get_cached_response(self, query: str) -> Optional[Dict]:
+    def _generation_key(self, namespace: str) -> str:
+        return f"rag_gen:{namespace}"
+
+    def _sources_key(self, namespace: str) -> str:
+        return f"rag_sources:{namespace}"
+
+    def _source_version_key(self, namespace: str, source: str) -> str:
+        return f"rag_src_gen:{namespace}:{hashlib.sha256(source.encode()).hexdigest()}"
+
+    def get_generation(self, namespace: str) -> int:
+        """
+        Current index generation of a namespace. Folded into cache keys
+        (via RetrievalScope.generation), so bumping it invalidates every cached
+        answer for the namespace in O(1) without scanning keys.
+        """
+        if not self.enabled:
+            return 0
+
+        try:
+            return int(self.redis.get(self._generation_key(namespace)) or 0)
+        except Exception as e:
+            print(f"Cache generation error: {e}")
+            return 0
+
+    def bump_generation(self, namespace: str, sources: Optional[List[str]] = None):
+        """
+        Record a change to a namespace: an upsert batch of `sources`, or a
+        delete when `sources` is None. Called by VectorService after each write.
+        """
+        if not self.enabled:
+            return
+
+        try:
+            if sources is None:
+                pipe = self.redis.pipeline(transaction=True)
+                pipe.incr(self._generation_key(namespace))
+                pipe.delete(self._sources_key(namespace))
+                pipe.execute()
+            elif not settings.CACHE_DEPENDENCY_TRACKING:
+                self.redis.incr(self._generation_key(namespace))
+            elif sources:
+                unique = sorted(set(sources))
+                keys = [self._generation_key(namespace), self._sources_key(namespace)]
+                keys += [self._source_version_key(namespace, s) for s in unique]
+                self.redis.eval(_UPSERT_SOURCES_SCRIPT, len(keys), *keys, *unique)
+        except Exception as e:
+            print(f"Cache generation bump error: {e}")
+
+    def source_versions(self, namespace: str, sources: List[str]) -> Dict[str, int]:
+        """
+        Current versions of the given sources, to store alongside an answer
+        built from them. Read right after retrieval, before generation, so an
+        upload landing mid-answer is never recorded as already seen.
+        Empty when dependency tracking is off.
+        """
+        if not self.enabled or not settings.CACHE_DEPENDENCY_TRACKING:
+            return {}
+
+        keys = sorted({self._source_version_key(namespace, s) for s in sources if s})
+        if not keys:
+            return {}
+        try:
+            return {k: int(v or 0) for k, v in zip(keys, self.redis.mget(keys))}
+        except Exception as e:
+            print(f"Cache source version error: {e}")
+            return {}
+
+    def _drop_stale(self, responses: List[Optional[Dict]]) -> List[Optional[Dict]]:
+        """Treat answers whose cited sources were re-uploaded since as misses."""
+        keys = sorted({k for r in responses if r for k in r.get("deps", {})})
+        if not keys:
+            return responses
+
+        current = dict(zip(keys, (int(v or 0) for v in self.redis.mget(keys))))
+        return [
+            r if r is None or all(current[k] == v for k, v in r.get("deps", {}).items()) else None
+            for r in responses
+        ]
+
+    def get_cached_response(self, query: str, scope: str = "") -> Optional[Dict]:
         if not self.enabled:
             return None
             
-        key = self._generate_key(query)
+        key = self._generate_key(query, scope)
         try:
             data = self.redis.get(key)
             if data:
-                return json.loads(data)
+                return self._drop_stale([json.loads(data)])[0]
         except Exception as e:
             print(f"Cache get error: {e}")
             
         return None
 
-    def set_cached_response(self, query: str, response: Dict, ttl: int = 3600):
+    def get_cached_responses(self, queries: List[str], scope: str = "") -> List[Optional[Dict]]:
+        """Look up many queries in a single MGET round trip."""
+        if not self.enabled or not queries:
+            return [None] * len(queries)
+
+        try:
+            values = self.redis.mget([self._generate_key(q, scope) for q in queries])
+            return self._drop_stale([json.loads(v) if v else None for v in values])
+        except Exception as e:
+            print(f"Cache mget error: {e}")
+            return [None] * len(queries)
+
+    def set_cached_response(self, query: str, response: Dict, ttl: int = 3600, scope: str = "",
+                            deps: Optional[Dict[str, int]] = None):
+        """`deps` are the source versions from `source_versions()` the answer was built from."""
         if not self.enabled:
             return
             
-        key = self._generate_key(query)
+        key = self._generate_key(query, scope)
+        if deps:
+            response = {**response, "deps": deps}
         try:
             self.redis.setex(key, ttl, json.dumps(response))
         except Exception as e:
             print(f"Cache set error: {e}")
+
+    def _conversation_key(self, conversation_id: str) -> str:
+        return f"rag_conv:{hashlib.sha256(conversation_id.encode()).hexdigest()}"
+
+    def get_conversation_summary(self, conversation_id: str) -> Optional[Dict]:
+        if not self.enabled:
+            return None
+
+        try:
+            data = self.redis.get(self._conversation_key(conversation_id))
+            if data:
+                return json.loads(data)
+        except Exception as e:
+            print(f"Cache conversation get error: {e}")
+        return None
+
+    def set_conversation_summary(self, conversation_id: str, summary: Dict, ttl: int = 86400):
+        if not self.enabled:
+            return
+
+        try:
+            self.redis.setex(self._conversation_key(conversation_id), ttl, json.dumps(summary))
+        except Exception as e:
+            print(f"Cache conversation set error: {e}")
+
+    def _lock_key(self, name: str) -> str:
+        return f"rag_lock:{hashlib.sha256(name.encode()).hexdigest()}"
+
+    def acquire_lock(self, name: str, ttl_ms: int = 30000) -> Optional[str]:
+        """
+        Try to take a short-lived cross-worker lock.
+        Returns an ownership token, or None if the lock is held elsewhere.
+        """
+        if not self.enabled:
+            return None
+
+        token = uuid.uuid4().hex
+        try:
+            if self.redis.set(self._lock_key(name), token, nx=True, px=ttl_ms):
+                return token
+        except Exception as e:
+            print(f"Cache lock error: {e}")
+        return None
+
+    def release_lock(self, name: str, token: str):
+        if not self.enabled:
+            return
+
+        try:
+            self.redis.eval(_RELEASE_LOCK_SCRIPT, 1, self._lock_key(name), token)
+        except Exception as e:
+            print(f"Cache unlock error: {e}")
+
+    def is_locked(self, name: str) -> bool:
+        if not self.enabled:
+            return False
+
+        try:
+            return bool(self.redis.exists(self._lock_key(name)))
+        except Exception as e:
+            print(f"Cache lock check error: {e}")
+            return False
@@ -0,0 +1,78 @@
+from typing import Any, Dict
+import threading
+import time
+
+from app.config import settings
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker.
+
+    closed    -> calls go through; `failure_threshold` consecutive failures
+                 (errors, or calls slower than `slow_call_seconds`) open it.
+    open      -> `allow_request()` is False for `reset_seconds`, so callers
+                 fall back immediately instead of waiting on a sick provider.
+    half_open -> one trial call is let through; success closes the breaker,
+                 failure re-opens it for another `reset_seconds`.
+    """
+
+    def __init__(self,
+                 name: str,
+                 failure_threshold: int = None,
+                 slow_call_seconds: float = None,
+                 reset_seconds: float = None):
+        self.name = name
+        self.failure_threshold = failure_threshold or settings.LLM_BREAKER_FAILURES
+        self.slow_call_seconds = slow_call_seconds or settings.LLM_BREAKER_SLOW_SECONDS
+        self.reset_seconds = reset_seconds or settings.LLM_BREAKER_RESET_SECONDS
+
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+        self.counters = {"successes": 0, "failures": 0, "slow_calls": 0, "rejected": 0, "opened": 0}
+
+    def allow_request(self) -> bool:
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.time() - self.opened_at >= self.reset_seconds:
+                self.state = "half_open"
+                self._trial_in_flight = False
+            if self.state == "half_open" and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            self.counters["rejected"] += 1
+            return False
+
+    def record(self, success: bool, duration: float):
+        with self._lock:
+            slow = success and duration > self.slow_call_seconds
+            if slow:
+                self.counters["slow_calls"] += 1
+            if success and not slow:
+                self.counters["successes"] += 1
+                self.consecutive_failures = 0
+                self.state = "closed"
+                self._trial_in_flight = False
+                return
+
+            if not success:
+                self.counters["failures"] += 1
+            self.consecutive_failures += 1
+            if self.state == "half_open" or self.consecutive_failures >= self.failure_threshold:
+                if self.state != "open":
+                    self.counters["opened"] += 1
+                    print(f"Circuit '{self.name}' opened after {self.consecutive_failures} bad calls.")
+                self.state = "open"
+                self.opened_at = time.time()
+                self._trial_in_flight = False
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            **self.counters
+        }
@@ -0,0 +1,82 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+from app.config import settings
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls that share a key into a single execution.
+
+    The first caller for a key (the leader) starts the work as a task; callers
+    arriving while it is in flight await the same task instead of repeating it.
+    With a CacheService and `distributed=True`, a Redis lock extends this across
+    workers: a worker that loses the lock waits for the holder to finish, then
+    runs `fn` itself, which is expected to be answered from the shared cache.
+    """
+
+    def __init__(self, cache_service=None, distributed: bool = None,
+                 lock_ttl_ms: int = None, poll_interval_ms: int = None):
+        self.cache_service = cache_service
+        self.distributed = settings.COALESCE_DISTRIBUTED_LOCK if distributed is None else distributed
+        self.lock_ttl_ms = lock_ttl_ms or settings.COALESCE_LOCK_TTL_MS
+        self.poll_interval = (poll_interval_ms or settings.COALESCE_POLL_INTERVAL_MS) / 1000
+
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.leaders = 0
+        self.coalesced = 0
+        self.distributed_waits = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """
+        Run `fn` once per key among concurrent callers.
+        Returns (result, shared) where `shared` is True for callers that
+        piggy-backed on another caller's execution.
+        """
+        task = self._inflight.get(key)
+        shared = task is not None
+
+        if shared:
+            self.coalesced += 1
+        else:
+            self.leaders += 1
+            # Run as a detached task so one client disconnecting does not cancel
+            # the work the other waiters depend on.
+            task = asyncio.ensure_future(self._run(key, fn))
+            self._inflight[key] = task
+
+        result = await asyncio.shield(task)
+        return result, shared
+
+    async def _run(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        try:
+            if not (self.distributed and self.cache_service and self.cache_service.enabled):
+                return await fn()
+
+            # The Redis client is synchronous: its round trips run off the event loop
+            token = await asyncio.to_thread(self.cache_service.acquire_lock, key, ttl_ms=self.lock_ttl_ms)
+            if token:
+                try:
+                    return await fn()
+                finally:
+                    await asyncio.to_thread(self.cache_service.release_lock, key, token)
+
+            # Another worker holds the lock: wait for it to publish its result
+            self.distributed_waits += 1
+            deadline = time.time() + self.lock_ttl_ms / 1000
+            while time.time() < deadline and await asyncio.to_thread(self.cache_service.is_locked, key):
+                await asyncio.sleep(self.poll_interval)
+            return await fn()
+        finally:
+            self._inflight.pop(key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.leaders + self.coalesced
+        return {
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+            "distributed_waits": self.distributed_waits,
+            "in_flight": len(self._inflight),
+            "coalesce_rate": self.coalesced / total if total else 0.0,
+            "distributed": self.distributed
+        }
@@ -0,0 +1,168 @@
+import asyncio
+import time
+from typing import Any, Dict, Optional
+
+from fastapi import HTTPException
+
+from app.config import settings
+
+class ServiceContainer:
+    """
+    Owns the shared service instances used by the API routers.
+
+    Nothing heavy is built at import time: `start()` runs from the app lifespan,
+    constructs services in a worker thread (model loading blocks) and flips
+    `ready` once the required ones are up. Routers read services from here so
+    query and ingestion share one embedding model and one vector index.
+    """
+
+    REQUIRED = ("embed_service", "vector_service")
+
+    def __init__(self):
+        self.embed_service = None
+        self.vector_service = None
+        self.gen_service = None
+        self.cache_service = None
+        self.query_router = None
+        self.monitoring_service = None
+        self.single_flight = None
+        self.context_assembler = None
+        self.result_selector = None
+        self.extractive_answerer = None
+        self.conversation_memory = None
+        self.deduplicator = None
+        self.extraction_cache = None
+        self.admission = None
+
+        self.ready = False
+        self.started_at: Optional[float] = None
+        self.startup_seconds: Dict[str, float] = {}
+        self.errors: Dict[str, str] = {}
+        self._ready_event: Optional[asyncio.Event] = None
+
+    async def start(self):
+        self.started_at = time.time()
+        self._event().clear()
+        try:
+            await asyncio.to_thread(self._build)
+            if self.monitoring_service:
+                # Its flush task runs on the app's event loop, not the build thread
+                await self._start_async("monitoring_service", self.monitoring_service.start)
+        finally:
+            self.ready = all(getattr(self, name) is not None for name in self.REQUIRED)
+            self._event().set()
+        print(f"Services ready={self.ready} in {time.time() - self.started_at:.1f}s")
+
+    def _build(self):
+        # Imported here: these modules pull in the model and client SDKs
+        from app.services.embeddings import EmbeddingService
+        from app.services.retrieval import VectorService
+        from app.services.generation import GenerationService
+        from app.services.caching import CacheService
+        from app.services.coalescing import SingleFlight
+        from app.services.routing import Router as QueryRouter
+        from app.services.monitoring import MonitoringService
+        from app.services.selection import AdaptiveSelector
+        from app.services.extractive import ExtractiveAnswerer
+        from app.services.conversation import ConversationMemory
+        from app.services.dedup import ChunkDeduplicator
+        from app.services.extraction_cache import ExtractionCache
+        from app.services.admission import AdmissionController
+        from app.utils.context import ContextAssembler
+
+        self.admission = AdmissionController()
+        self.monitoring_service = self._timed("monitoring_service", MonitoringService)
+        self.cache_service = self._timed("cache_service", CacheService)
+        self.single_flight = SingleFlight(cache_service=self.cache_service)
+        self.context_assembler = ContextAssembler()
+        self.result_selector = AdaptiveSelector()
+        self.embed_service = self._timed("embed_service", lambda: EmbeddingService(provider="local"))
+        self.vector_service = self._timed("vector_service", VectorService)
+        if self.vector_service and settings.LOCAL_INDEX_SNAPSHOT_PATH and self.vector_service.backend == "local":
+            self._timed("index_snapshot", self._load_snapshot)
+        if self.vector_service and self.cache_service:
+            # Every index write moves the cache to a new generation
+            self.vector_service.on_change = self.cache_service.bump_generation
+        # Generation is optional: without keys the API answers with a notice instead
+        self.gen_service = self._timed("gen_service", GenerationService)
+        self.query_router = self._timed("query_router", lambda: QueryRouter(embed_service=self.embed_service))
+        self.extractive_answerer = ExtractiveAnswerer(self.embed_service, self.admission)
+        self.conversation_memory = ConversationMemory(
+            self.cache_service, self.gen_service, self.context_assembler.count_tokens,
+            admission=self.admission
+        )
+        if settings.DEDUP_ENABLED:
+            # Optional: uploads embed every chunk without it
+            self.deduplicator = self._timed("deduplicator", ChunkDeduplicator)
+        if settings.EXTRACTION_CACHE_ENABLED:
+            self.extraction_cache = self._timed("extraction_cache", ExtractionCache)
+
+    async def _start_async(self, name: str, start):
+        t0 = time.time()
+        try:
+            await start()
+        except Exception as e:
+            print(f"Failed to start {name}: {e}")
+            self.errors[name] = str(e)
+        finally:
+            self.startup_seconds[f"{name}_start"] = round(time.time() - t0, 3)
+
+    async def stop(self):
+        """Flush buffered request metrics on shutdown."""
+        if self.monitoring_service:
+            await self.monitoring_service.stop()
+
+    def _load_snapshot(self):
+        # Warm start: the local index would otherwise begin empty in every process
+        from app.services.snapshot import import_snapshot
+        count, seconds = import_snapshot(self.vector_service, settings.LOCAL_INDEX_SNAPSHOT_PATH)
+        print(f"Loaded {count} vectors from snapshot in {seconds:.1f}s")
+
+    def _timed(self, name: str, factory) -> Any:
+        t0 = time.time()
+        try:
+            return factory()
+        except Exception as e:
+            print(f"Failed to start {name}: {e}")
+            self.errors[name] = str(e)
+            return None
+        finally:
+            self.startup_seconds[name] = round(time.time() - t0, 3)
+
+    def _event(self) -> asyncio.Event:
+        if self._ready_event is None:
+            self._ready_event = asyncio.Event()
+        return self._ready_event
+
+    async def wait_until_ready(self, timeout: float = None):
+        """Block a request until startup finishes, or fail fast with 503."""
+        if self.ready:
+            return
+
+        timeout = settings.STARTUP_WAIT_SECONDS if timeout is None else timeout
+        try:
+            await asyncio.wait_for(self._event().wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+        if not self.ready:
+            failed = {name: self.errors[name] for name in self.REQUIRED if name in self.errors}
+            raise HTTPException(
+                status_code=503,
+                detail=f"Service unavailable: {failed}" if failed else "Service is starting up.",
+                headers={"Retry-After": "5"}
+            )
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "ready": self.ready,
+            "starting": self.started_at is not None and not self._event().is_set(),
+            "startup_seconds": self.startup_seconds,
+            "errors": self.errors
+        }
+
+services = ServiceContainer()
+
+async def require_services():
+    """FastAPI dependency for routes that need the shared services."""
+    await services.wait_until_ready()
@@ -0,0 +1,188 @@
+from typing import Callable, Dict, List, Optional
+import hashlib
+import json
+import re
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+
+from app.config import settings
+from app.services.admission import Overloaded
+
+_SENTENCE_SPLIT = re.compile(r'(?<=[.!?])\s+')
+
+# References back to earlier turns: pronouns, "what about ...", "the second one", "you said"
+_FOLLOW_UP = re.compile(
+    r"\b(it|its|they|them|their|this|that|these|those|he|she|him|her|his|ones|former|latter"
+    r"|above|previous|earlier|again|else|also|same|elaborate|you said|what about|how about)\b"
+    r"|^\s*(and|but|so|or|why|how come)\b",
+    re.IGNORECASE
+)
+
+def needs_history(query: str) -> bool:
+    """
+    Whether a query leans on earlier turns. Standalone questions are answered
+    without the conversation, so they share the response cache, coalescing
+    and warmed answers with every other user.
+    """
+    return len(query.split()) <= 3 or bool(_FOLLOW_UP.search(query))
+
+def history_key(history: str) -> str:
+    """Cache and coalescing key suffix for an answer built on this rendered conversation."""
+    return "|history:" + hashlib.sha256(history.encode()).hexdigest()[:16] if history else ""
+
+@dataclass
+class ConversationContext:
+    """What a query sees of its conversation: a summary plus the newest turns."""
+    summary: str = ""
+    recent: List[Dict] = field(default_factory=list)
+    # Turns older than the recent window that the cached summary does not cover yet
+    pending: List[Dict] = field(default_factory=list)
+    abridged: str = "" # stand-in for `pending` until the summary catches up
+    covered: int = 0 # turns covered by `summary`
+    cutoff: int = 0 # turns covered once `pending` is folded in
+    fingerprint: str = ""
+
+    def render(self) -> str:
+        parts = []
+        if self.summary:
+            parts.append(f"Summary of the earlier conversation: {self.summary}")
+        if self.abridged:
+            parts.append(f"Earlier turns (abridged):\n{self.abridged}")
+        if self.recent:
+            parts.append("Recent conversation:\n" + _format_turns(self.recent))
+        return "\n\n".join(parts)
+
+class ConversationMemory:
+    """
+    Bounded conversational context for chat_history.
+
+    The newest turns that fit CONVERSATION_RECENT_TOKENS are sent verbatim.
+    Older turns are folded into a rolling summary, cached per conversation id
+    with the number of turns it covers, so each new turn only summarizes the
+    turns that just aged out of the window instead of re-sending the history.
+    """
+
+    def __init__(self, cache_service, gen_service, count_tokens: Callable[[str], int],
+                 recent_tokens: int = None, summary_tokens: int = None, admission=None):
+        self.cache_service = cache_service
+        self.gen_service = gen_service
+        self.admission = admission
+        self.count_tokens = count_tokens
+        self.recent_tokens = recent_tokens or settings.CONVERSATION_RECENT_TOKENS
+        self.summary_tokens = summary_tokens or settings.CONVERSATION_SUMMARY_TOKENS
+
+    def prepare(self, conversation_id: Optional[str], history: List[Dict]) -> ConversationContext:
+        turns = [t for t in map(_normalize, history) if t["content"]]
+
+        cutoff = len(turns) - len(self._newest_within(turns, self.recent_tokens))
+        ctx = ConversationContext(cutoff=cutoff)
+        cached = self.cache_service.get_conversation_summary(conversation_id) if conversation_id else None
+        if cached and 0 < cached["covered"] <= len(turns) \
+                and cached["fingerprint"] == _fingerprint(turns[:cached["covered"]]):
+            ctx.summary = cached["summary"]
+            ctx.covered = cached["covered"]
+
+        # A summary may already cover turns that are still in the window
+        ctx.recent = turns[max(cutoff, ctx.covered):]
+        ctx.pending = turns[ctx.covered:cutoff]
+        ctx.abridged = self._abridge(ctx.pending)
+        ctx.fingerprint = _fingerprint(turns[:cutoff])
+        return ctx
+
+    def update(self, conversation_id: Optional[str], ctx: ConversationContext):
+        """
+        Fold the pending turns into the cached summary. Runs after the
+        response is sent, so the LLM call never adds to query latency.
+        """
+        if not conversation_id or not ctx.pending or not self.cache_service.enabled:
+            return
+
+        summary = self._summarize(ctx.summary, ctx.pending)
+        self.cache_service.set_conversation_summary(conversation_id, {
+            "summary": summary,
+            "covered": ctx.cutoff,
+            "fingerprint": ctx.fingerprint
+        }, ttl=settings.CONVERSATION_SUMMARY_TTL)
+
+    def _summarize(self, summary: str, turns: List[Dict]) -> str:
+        # Only the newest pending turns that fit the window are sent; on a cold
+        # cache with a long history the rest is kept in abridged form
+        newest = self._newest_within(turns, self.recent_tokens)
+        older = turns[:len(turns) - len(newest)]
+        previous = "\n".join(filter(None, [summary, self._abridge(older)]))
+
+        if self.gen_service:
+            answer = None
+            try:
+                # Background work sharing the llm stage's limits with queries
+                with self._llm_stage():
+                    answer = self.gen_service.summarize(
+                        previous, _format_turns(newest), words=int(self.summary_tokens * 0.75)
+                    )
+            except Overloaded:
+                pass
+            if answer:
+                return self._truncate(answer.strip(), self.summary_tokens)
+
+        # No LLM: append the first sentence of the newest turns that fit
+        return self._abridge(turns, base=summary)
+
+    @contextmanager
+    def _llm_stage(self):
+        if self.admission is None:
+            yield
+            return
+        with self.admission.background(), self.admission.stage("llm"):
+            yield
+
+    def _abridge(self, turns: List[Dict], base: str = "") -> str:
+        if not turns and not base:
+            return ""
+
+        lines = [f"{t['role'].capitalize()}: {_SENTENCE_SPLIT.split(t['content'].strip(), maxsplit=1)[0]}"
+                 for t in turns]
+        kept, budget = [], self.summary_tokens - self.count_tokens(base)
+        for line in reversed(lines):
+            tokens = self.count_tokens(line)
+            if tokens > budget:
+                break
+            budget -= tokens
+            kept.append(line)
+        return "\n".join(filter(None, [base] + kept[::-1]))
+
+    def _newest_within(self, turns: List[Dict], budget: int) -> List[Dict]:
+        """The longest suffix of `turns` that fits `budget` tokens."""
+        start = len(turns)
+        while start > 0:
+            tokens = self.count_tokens(_format_turns([turns[start - 1]]))
+            if tokens > budget:
+                break
+            budget -= tokens
+            start -= 1
+        return turns[start:]
+
+    def _truncate(self, text: str, max_tokens: int) -> str:
+        if self.count_tokens(text) <= max_tokens:
+            return text
+        # Models overshoot word limits; cut at a sentence boundary
+        kept, budget = [], max_tokens
+        for sentence in _SENTENCE_SPLIT.split(text):
+            tokens = self.count_tokens(sentence)
+            if tokens > budget:
+                break
+            budget -= tokens
+            kept.append(sentence)
+        # One overlong sentence: fall back to a character cut (~4 chars per token)
+        return " ".join(kept) or text[:max_tokens * 4]
+
+def _normalize(turn: Dict) -> Dict:
+    role = str(turn.get("role") or "user").lower()
+    return {"role": "assistant" if role in ("assistant", "bot", "ai") else "user",
+            "content": str(turn.get("content") or turn.get("text") or "")}
+
+def _format_turns(turns: List[Dict]) -> str:
+    return "\n".join(f"{t['role'].capitalize()}: {t['content']}" for t in turns)
+
+def _fingerprint(turns: List[Dict]) -> str:
+    # Detects edited or different histories reusing a conversation id
+    return hashlib.sha256(json.dumps(turns, sort_keys=True).encode()).hexdigest()
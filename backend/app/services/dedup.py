@@ -0,0 +1,272 @@
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import zlib
+from dataclasses import dataclass, field
+import numpy as np
+
+from app.config import settings
+from app.utils.chunking import Chunk
+
+_PRIME = (1 << 31) - 1 # Mersenne prime: a * x + b stays inside int64
+
+@dataclass
+class DedupPlan:
+    """Outcome of checking one upload against the index, applied by `commit()`."""
+    namespace: str
+    kept: List[Chunk] = field(default_factory=list)
+    # canonical chunk id -> its full source list, for canonicals stored by earlier uploads
+    attributions: Dict[str, List[str]] = field(default_factory=dict)
+    skipped: int = 0
+    matched: List[str] = field(default_factory=list) # canonical ids the skipped chunks resolved to
+    skipped_chars: int = 0
+    _signatures: Dict[str, np.ndarray] = field(default_factory=dict, repr=False)
+    _hashes: Dict[str, str] = field(default_factory=dict, repr=False)
+    _alive: Dict[str, bool] = field(default_factory=dict, repr=False) # index entries checked against the store
+
+class ChunkDeduplicator:
+    """
+    Ingest-time near-duplicate detection with MinHash + LSH.
+
+    Each chunk's word 3-gram set is reduced to a MinHash signature (one
+    vectorized pass over `num_perm` hash functions) and split into `bands`;
+    chunks sharing any band bucket are candidates, confirmed when their
+    estimated Jaccard similarity reaches `threshold`. Duplicates are not
+    embedded or upserted: their source is appended to the kept chunk's
+    `sources` metadata instead. Within one source only exact replays are
+    skipped: an edited re-upload replaces its earlier chunks, under a new
+    id when other documents share the old one. Signatures and buckets live
+    in SQLite so the index persists across uploads, restarts and workers;
+    matches are confirmed against the vector store (`exists`) before a
+    chunk is skipped, since it may not have outlived them.
+    """
+
+    def __init__(self, path: str = None, threshold: float = None, num_perm: int = None, bands: int = None):
+        self.path = path or settings.DEDUP_INDEX_PATH
+        self.threshold = threshold or settings.DEDUP_THRESHOLD
+        self.num_perm = num_perm or settings.DEDUP_NUM_PERM
+        self.bands = bands or settings.DEDUP_BANDS
+        if self.num_perm % self.bands:
+            raise ValueError("DEDUP_NUM_PERM must be a multiple of DEDUP_BANDS.")
+
+        # Fixed seed: signatures stored by earlier runs stay comparable
+        rng = np.random.default_rng(1)
+        self._a = rng.integers(1, _PRIME, size=self.num_perm, dtype=np.int64)
+        self._b = rng.integers(0, _PRIME, size=self.num_perm, dtype=np.int64)
+
+        self._lock = threading.Lock()
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._db = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        self._db.executescript("""
+            PRAGMA journal_mode=WAL;
+            CREATE TABLE IF NOT EXISTS signatures (
+                namespace TEXT NOT NULL,
+                chunk_id TEXT NOT NULL,
+                signature BLOB NOT NULL,
+                sources TEXT NOT NULL,
+                PRIMARY KEY (namespace, chunk_id)
+            );
+            CREATE TABLE IF NOT EXISTS buckets (
+                namespace TEXT NOT NULL,
+                bucket INTEGER NOT NULL,
+                chunk_id TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS buckets_lookup ON buckets (namespace, bucket);
+            CREATE INDEX IF NOT EXISTS buckets_chunk ON buckets (namespace, chunk_id);
+        """)
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(signatures)")}
+        if "content_hash" not in columns:
+            # Indexes built before same-source replays were told apart from edits
+            with self._db:
+                self._db.execute("ALTER TABLE signatures ADD COLUMN content_hash TEXT")
+        self.counters = {"chunks_checked": 0, "duplicates_skipped": 0, "chars_not_embedded": 0}
+
+    def signature(self, text: str) -> np.ndarray:
+        words = re.findall(r"\w+", text.lower())
+        shingles = {" ".join(words[i:i + 3]) for i in range(max(len(words) - 2, 1))} if words else {""}
+        x = np.fromiter((zlib.crc32(s.encode()) & _PRIME for s in shingles), dtype=np.int64, count=len(shingles))
+        return ((np.outer(x, self._a) + self._b) % _PRIME).min(axis=0).astype(np.uint32)
+
+    def _buckets(self, signature: np.ndarray) -> List[int]:
+        rows = signature.reshape(self.bands, -1)
+        return [
+            int.from_bytes(hashlib.blake2b(bytes([band]) + rows[band].tobytes(), digest_size=8).digest(),
+                           "big", signed=True)
+            for band in range(self.bands)
+        ]
+
+    @staticmethod
+    def content_hash(text: str) -> str:
+        return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+    def _similarity(self, a: np.ndarray, b: np.ndarray) -> float:
+        return float(np.mean(a == b))
+
+    def check(self, chunks: List[Chunk], namespace: str,
+              exists: Callable[[List[str]], Set[str]] = None) -> DedupPlan:
+        """
+        Split an upload into chunks to embed and duplicates to attribute.
+        Nothing is written until `commit()`, so a failed upsert leaves no
+        index entries pointing at vectors that were never stored.
+        `exists(ids)` returns the ids still held by the vector store.
+        """
+        plan = DedupPlan(namespace=namespace)
+        # Canonicals kept earlier in this same upload
+        batch: Dict[int, List[Tuple[Chunk, np.ndarray]]] = {}
+
+        for chunk in chunks:
+            sig = self.signature(chunk.content)
+            buckets = self._buckets(sig)
+            source = str(chunk.metadata.get("source", ""))
+            content_hash = self.content_hash(chunk.content)
+
+            match = (self._match_batch(sig, buckets, batch)
+                     or self._match_index(sig, buckets, namespace, source, content_hash, plan, exists))
+            if match is None:
+                shared = self._other_sources(plan, chunk.chunk_id, source)
+                if shared is not None:
+                    # An edit of a chunk other documents were deduplicated against:
+                    # theirs keeps the old text, this document's moves to a new id
+                    plan.attributions[chunk.chunk_id] = shared
+                    chunk.chunk_id = f"{chunk.chunk_id}_{content_hash[:8]}"
+                chunk.metadata["sources"] = [source]
+                plan.kept.append(chunk)
+                plan._signatures[chunk.chunk_id] = sig
+                plan._hashes[chunk.chunk_id] = content_hash
+                for bucket in buckets:
+                    batch.setdefault(bucket, []).append((chunk, sig))
+                continue
+
+            # Includes exact re-uploads of a source's own text: the vector is already stored
+            canonical_id, sources, canonical = match
+            # Attributions this upload already changed win over the stored list
+            sources = plan.attributions.get(canonical_id, sources)
+            plan.matched.append(canonical_id)
+            plan.skipped += 1
+            plan.skipped_chars += len(chunk.content)
+            if source in sources:
+                continue
+            sources.append(source)
+            if canonical is None:
+                plan.attributions[canonical_id] = sources
+
+        self.counters["chunks_checked"] += len(chunks)
+        self.counters["duplicates_skipped"] += plan.skipped
+        self.counters["chars_not_embedded"] += plan.skipped_chars
+        return plan
+
+    def _match_batch(self, sig: np.ndarray, buckets: List[int],
+                     batch: Dict[int, List[Tuple[Chunk, np.ndarray]]]) -> Optional[Tuple[str, List[str], Chunk]]:
+        for bucket in buckets:
+            for chunk, other in batch.get(bucket, []):
+                if self._similarity(sig, other) >= self.threshold:
+                    return chunk.chunk_id, chunk.metadata["sources"], chunk
+        return None
+
+    def _match_index(self, sig: np.ndarray, buckets: List[int], namespace: str, source: str,
+                     content_hash: str, plan: DedupPlan,
+                     exists: Callable[[List[str]], Set[str]] = None) -> Optional[Tuple[str, List[str], None]]:
+        placeholders = ",".join("?" * len(buckets))
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT DISTINCT s.chunk_id, s.signature, s.sources, s.content_hash FROM buckets b "
+                f"JOIN signatures s ON s.namespace = b.namespace AND s.chunk_id = b.chunk_id "
+                f"WHERE b.namespace = ? AND b.bucket IN ({placeholders})",
+                [namespace, *buckets]
+            ).fetchall()
+
+        candidates = []
+        for chunk_id, blob, sources, stored_hash in rows:
+            sources = json.loads(sources)
+            if source in sources and stored_hash != content_hash:
+                # The same document's earlier text: an edit replaces it rather than being dropped
+                continue
+            similarity = self._similarity(sig, np.frombuffer(blob, dtype=np.uint32))
+            if similarity >= self.threshold:
+                candidates.append((similarity, chunk_id, sources))
+        if not candidates:
+            return None
+
+        if exists:
+            # The vector store may have lost vectors the index still lists
+            # (a local index after a restart, a delete outside the API)
+            unchecked = [c[1] for c in candidates if c[1] not in plan._alive]
+            if unchecked:
+                found = exists(unchecked)
+                plan._alive.update((chunk_id, chunk_id in found) for chunk_id in unchecked)
+            candidates = [c for c in candidates if plan._alive[c[1]]]
+        if not candidates:
+            return None
+        _, chunk_id, sources = max(candidates, key=lambda c: c[0])
+        return chunk_id, sources, None
+
+    def _other_sources(self, plan: DedupPlan, chunk_id: str, source: str) -> Optional[List[str]]:
+        """The stored chunk's sources minus `source`, if other documents share it."""
+        if chunk_id in plan.attributions:
+            sources = plan.attributions[chunk_id]
+        else:
+            with self._lock:
+                row = self._db.execute(
+                    "SELECT sources FROM signatures WHERE namespace = ? AND chunk_id = ?",
+                    (plan.namespace, chunk_id)
+                ).fetchone()
+            if row is None or plan._alive.get(chunk_id) is False:
+                return None
+            sources = json.loads(row[0])
+        others = [s for s in sources if s != source]
+        return others or None
+
+    def commit(self, plan: DedupPlan):
+        """Record the kept chunks and new attributions once their vectors are stored."""
+        ns = plan.namespace
+        with self._lock, self._db:
+            for chunk in plan.kept:
+                # A re-used chunk id replaces whatever content it had before
+                self._db.execute("DELETE FROM buckets WHERE namespace = ? AND chunk_id = ?", (ns, chunk.chunk_id))
+                sig = plan._signatures[chunk.chunk_id]
+                self._db.execute(
+                    "INSERT OR REPLACE INTO signatures (namespace, chunk_id, signature, sources, content_hash) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (ns, chunk.chunk_id, sig.tobytes(), json.dumps(chunk.metadata["sources"]),
+                     plan._hashes[chunk.chunk_id])
+                )
+                self._db.executemany(
+                    "INSERT INTO buckets VALUES (?, ?, ?)",
+                    [(ns, bucket, chunk.chunk_id) for bucket in self._buckets(sig)]
+                )
+            for chunk_id, sources in plan.attributions.items():
+                self._db.execute(
+                    "UPDATE signatures SET sources = ? WHERE namespace = ? AND chunk_id = ?",
+                    (json.dumps(sources), ns, chunk_id)
+                )
+        # Entries whose vectors are gone would only be matched (and skipped against) again
+        self.forget(ns, [chunk_id for chunk_id, alive in plan._alive.items() if not alive])
+
+    def forget(self, namespace: str, chunk_ids: List[str]):
+        """Drop chunks whose vectors were deleted, so nothing is deduplicated against them."""
+        with self._lock, self._db:
+            for chunk_id in chunk_ids:
+                self._db.execute("DELETE FROM buckets WHERE namespace = ? AND chunk_id = ?", (namespace, chunk_id))
+                self._db.execute("DELETE FROM signatures WHERE namespace = ? AND chunk_id = ?", (namespace, chunk_id))
+
+    def clear(self, namespace: str):
+        """Forget a namespace (its vectors were deleted)."""
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM buckets WHERE namespace = ?", (namespace,))
+            self._db.execute("DELETE FROM signatures WHERE namespace = ?", (namespace,))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            indexed = self._db.execute("SELECT COUNT(*) FROM signatures").fetchone()[0]
+        return {
+            "indexed_chunks": indexed,
+            "threshold": self.threshold,
+            **self.counters,
+            # Rough: the embedding models' tokenizers average ~4 characters per token
+            "embedding_tokens_saved": self.counters["chars_not_embedded"] // 4
+        }
@@ -0,0 +1,75 @@
+from typing import Any, Dict, Iterable, List, Tuple
+import os
+import sqlite3
+import threading
+
+from app.config import settings
+
+# Keeps each IN (...) under SQLite's bound-parameter limit
+_LOOKUP_BATCH = 500
+
+class ChunkDocstore:
+    """
+    Chunk text keyed by (namespace, id), kept next to the API instead of in
+    vector metadata. Vectors then carry only their id and the small filter
+    fields, and the texts of a query's final results are read back in one
+    bulk lookup. Small-to-big parent windows are stored here under their own
+    ids. SQLite, so the store survives restarts and is shared by every
+    worker on the host.
+    """
+
+    def __init__(self, path: str = None):
+        self.path = path or settings.DOCSTORE_PATH
+        self._lock = threading.Lock()
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._db = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        self._db.executescript("""
+            PRAGMA journal_mode=WAL;
+            CREATE TABLE IF NOT EXISTS texts (
+                namespace TEXT NOT NULL,
+                id TEXT NOT NULL,
+                text TEXT NOT NULL,
+                PRIMARY KEY (namespace, id)
+            ) WITHOUT ROWID;
+        """)
+        self.counters = {"lookups": 0, "ids_requested": 0, "ids_missing": 0}
+
+    def put_many(self, namespace: str, items: Iterable[Tuple[str, str]]):
+        """Store (id, text) pairs, replacing earlier text under the same id."""
+        with self._lock, self._db:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO texts VALUES (?, ?, ?)",
+                ((namespace, str(item_id), text) for item_id, text in items)
+            )
+
+    def get_many(self, namespace: str, ids: List[str]) -> Dict[str, str]:
+        """id -> text for the ids that are stored; one query per 500 ids."""
+        ids = list(dict.fromkeys(ids))
+        found: Dict[str, str] = {}
+        with self._lock:
+            for i in range(0, len(ids), _LOOKUP_BATCH):
+                batch = ids[i:i + _LOOKUP_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                found.update(self._db.execute(
+                    f"SELECT id, text FROM texts WHERE namespace = ? AND id IN ({placeholders})",
+                    [namespace, *batch]
+                ).fetchall())
+        self.counters["lookups"] += 1
+        self.counters["ids_requested"] += len(ids)
+        self.counters["ids_missing"] += len(ids) - len(found)
+        return found
+
+    def delete_many(self, namespace: str, ids: List[str]):
+        with self._lock, self._db:
+            self._db.executemany("DELETE FROM texts WHERE namespace = ? AND id = ?",
+                                 ((namespace, str(item_id)) for item_id in ids))
+
+    def clear(self, namespace: str):
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM texts WHERE namespace = ?", (namespace,))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stored = self._db.execute("SELECT COUNT(*) FROM texts").fetchone()[0]
+        return {"stored_texts": stored, "path": self.path, **self.counters}
@@ -1,14 +1,30 @@
-from typing import List, Optional
+from typing import List, Optional, Dict, Any
 import time
 from tenacity import retry, stop_after_attempt, wait_exponential
 import os
 import warnings
+import numpy as np
 
 # Suppress HuggingFace warnings
 warnings.filterwarnings("ignore", category=FutureWarning)
 
 from app.config import settings
 
+# Local models loaded in this process, shared by every EmbeddingService. Under a
+# preloading server (see gunicorn.conf.py) forked workers inherit them copy-on-write.
+_LOCAL_MODELS: Dict[str, Any] = {}
+
+def load_local_model(model_name: str = None):
+    """Load (once per process) and return a SentenceTransformer model."""
+    model_name = model_name or settings.EMBEDDING_MODEL
+    if model_name not in _LOCAL_MODELS:
+        print(f"Loading local embedding model: {model_name}...")
+        from sentence_transformers import SentenceTransformer
+        # Using CPU by default, or CUDA if available
+        _LOCAL_MODELS[model_name] = SentenceTransformer(model_name)
+        print("Local model loaded.")
+    return _LOCAL_MODELS[model_name]
+
 class EmbeddingService:
     def __init__(self, provider: str = None):
         self.provider = provider or settings.EMBEDDING_PROVIDER
@@ -25,55 +41,53 @@ class EmbeddingService:
             self.client = OpenAI(api_key=settings.OPENAI_API_KEY)
             
         elif self.provider == "local":
-            print(f"Loading local embedding model: {settings.EMBEDDING_MODEL}...")
-            from sentence_transformers import SentenceTransformer
-            # Using CPU by default, or CUDA if available
-            self.local_model = SentenceTransformer(settings.EMBEDDING_MODEL)
-            print("Local model loaded.")
+            self.local_model = load_local_model(settings.EMBEDDING_MODEL)
             
         else:
             raise NotImplementedError(f"Provider {self.provider} not supported.")
 
     @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=2, max=10))
-    def get_embedding(self, text: str, model: str = None) -> List[float]:
+    def get_embedding(self, text: str, model: str = None) -> np.ndarray:
         """
-        Get embedding for a single string.
+        Get embedding for a single string, as a float32 vector.
         """
         if not text:
-            return []
+            return np.zeros(0, dtype=np.float32)
             
         if self.provider == "openai":
             return self._get_openai_embedding([text], model or settings.EMBEDDING_MODEL)[0]
         elif self.provider == "local":
             return self._get_local_embedding([text])[0]
-        return []
+        return np.zeros(0, dtype=np.float32)
 
     @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=2, max=10))
-    def get_embeddings(self, texts: List[str], model: str = None) -> List[List[float]]:
+    def get_embeddings(self, texts: List[str], model: str = None) -> np.ndarray:
         """
-        Get embeddings for a list of strings (batch processing).
+        Get embeddings for a list of strings (batch processing), as one
+        contiguous float32 array of shape (len(texts), dimension).
         """
         if not texts:
-            return []
+            return np.zeros((0, 0), dtype=np.float32)
             
         if self.provider == "openai":
              return self._get_openai_embedding(texts, model or settings.EMBEDDING_MODEL)
         elif self.provider == "local":
              return self._get_local_embedding(texts)
         
-        return []
+        return np.zeros((0, 0), dtype=np.float32)
 
-    def _get_openai_embedding(self, texts: List[str], model: str) -> List[List[float]]:
+    def _get_openai_embedding(self, texts: List[str], model: str) -> np.ndarray:
         response = self.client.embeddings.create(
             input=texts,
             model=model
         )
-        return [item.embedding for item in response.data]
+        return np.asarray([item.embedding for item in response.data], dtype=np.float32)
 
-    def _get_local_embedding(self, texts: List[str]) -> List[List[float]]:
-        # SentenceTransformers handles batching automatically
-        embeddings = self.local_model.encode(texts, convert_to_tensor=False)
-        return embeddings.tolist()
+    def _get_local_embedding(self, texts: List[str]) -> np.ndarray:
+        # SentenceTransformers handles batching automatically; keep its array
+        # as is (a list of Python floats takes ~8x the memory)
+        embeddings = self.local_model.encode(texts, convert_to_tensor=False, convert_to_numpy=True)
+        return np.ascontiguousarray(embeddings, dtype=np.float32)
 
     def estimate_cost(self, token_count: int, model: str = None) -> float:
         """
@@ -0,0 +1,132 @@
+from typing import Any, Dict, Iterator, Optional, Tuple
+import hashlib
+import os
+import secrets
+import sqlite3
+import threading
+import time
+import zlib
+
+from app.config import settings
+
+class ExtractionCache:
+    """
+    Extracted PDF text per page, keyed by the SHA-256 of the file's bytes, so
+    a byte-identical re-upload skips extraction. Pages are zlib-compressed
+    rows read back one at a time. Each extraction writes its pages under its
+    own pending key and renames them in one transaction once all are written,
+    so concurrent uploads of one file (in any worker) never see or delete
+    each other's partial pages, and an interrupted extraction is redone.
+    Least recently used files are dropped past EXTRACTION_CACHE_MAX_MB.
+    """
+
+    def __init__(self, path: str = None, max_mb: float = None):
+        self.path = path or settings.EXTRACTION_CACHE_PATH
+        self.max_bytes = (max_mb or settings.EXTRACTION_CACHE_MAX_MB) * 1024 * 1024
+        self._lock = threading.Lock()
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._db = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        self._db.executescript("""
+            PRAGMA journal_mode=WAL;
+            PRAGMA synchronous=NORMAL;
+            CREATE TABLE IF NOT EXISTS files (
+                hash TEXT PRIMARY KEY,
+                page_count INTEGER NOT NULL,
+                bytes INTEGER NOT NULL,
+                last_used REAL NOT NULL
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS pending (
+                key TEXT PRIMARY KEY,
+                started_at REAL NOT NULL
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS pages (
+                hash TEXT NOT NULL,
+                page INTEGER NOT NULL,
+                text BLOB NOT NULL,
+                PRIMARY KEY (hash, page)
+            ) WITHOUT ROWID;
+        """)
+        self.counters = {"hits": 0, "misses": 0, "pages_served": 0, "pages_stored": 0, "evicted": 0}
+
+    @staticmethod
+    def file_hash(file_path: str) -> str:
+        digest = hashlib.sha256()
+        with open(file_path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def lookup(self, file_hash: str) -> Optional[int]:
+        """Page count of a fully cached file, or None."""
+        with self._lock, self._db:
+            row = self._db.execute("SELECT page_count FROM files WHERE hash = ?", (file_hash,)).fetchone()
+            if row:
+                self._db.execute("UPDATE files SET last_used = ? WHERE hash = ?", (time.time(), file_hash))
+        self.counters["hits" if row else "misses"] += 1
+        return row[0] if row else None
+
+    def pages(self, file_hash: str, page_count: int) -> Iterator[Tuple[int, str]]:
+        """(page number from 1, text) for a cached file, one row in memory at a time."""
+        for page in range(1, page_count + 1):
+            with self._lock:
+                row = self._db.execute(
+                    "SELECT text FROM pages WHERE hash = ? AND page = ?", (file_hash, page)
+                ).fetchone()
+            if row is None:
+                # Evicted mid-read: the caller falls back to extraction
+                raise KeyError(f"Page {page} of {file_hash} is no longer cached")
+            self.counters["pages_served"] += 1
+            yield page, zlib.decompress(row[0]).decode("utf-8")
+
+    def begin(self, file_hash: str) -> str:
+        """Start an extraction: returns the pending key its pages are written under."""
+        key = f"{file_hash}.pending.{secrets.token_hex(8)}"
+        with self._lock, self._db:
+            self._db.execute("INSERT INTO pending VALUES (?, ?)", (key, time.time()))
+        return key
+
+    def put_page(self, key: str, page: int, text: str):
+        with self._lock, self._db:
+            self._db.execute("INSERT OR REPLACE INTO pages VALUES (?, ?, ?)",
+                             (key, page, zlib.compress(text.encode("utf-8"))))
+        self.counters["pages_stored"] += 1
+
+    def complete(self, file_hash: str, key: str, page_count: int):
+        """Publish a finished extraction under the file's hash, then trim to the size limit."""
+        with self._lock, self._db:
+            # Replaces an identical extraction another upload may have finished first
+            self._db.execute("DELETE FROM pages WHERE hash = ?", (file_hash,))
+            self._db.execute("UPDATE pages SET hash = ? WHERE hash = ?", (file_hash, key))
+            self._db.execute("DELETE FROM pending WHERE key = ?", (key,))
+            size = self._db.execute(
+                "SELECT COALESCE(SUM(LENGTH(text)), 0) FROM pages WHERE hash = ?", (file_hash,)
+            ).fetchone()[0]
+            self._db.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)",
+                             (file_hash, page_count, size, time.time()))
+            self._drop_abandoned()
+            self._evict()
+
+    def _drop_abandoned(self):
+        # Pages of extractions that never finished (failed uploads, killed workers)
+        cutoff = time.time() - settings.EXTRACTION_CACHE_PENDING_TTL
+        for (key,) in self._db.execute("SELECT key FROM pending WHERE started_at < ?", (cutoff,)).fetchall():
+            self._db.execute("DELETE FROM pages WHERE hash = ?", (key,))
+            self._db.execute("DELETE FROM pending WHERE key = ?", (key,))
+
+    def _evict(self):
+        total = self._db.execute("SELECT COALESCE(SUM(bytes), 0) FROM files").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for file_hash, size in self._db.execute("SELECT hash, bytes FROM files ORDER BY last_used").fetchall():
+            if total <= self.max_bytes:
+                break
+            self._db.execute("DELETE FROM files WHERE hash = ?", (file_hash,))
+            self._db.execute("DELETE FROM pages WHERE hash = ?", (file_hash,))
+            total -= size
+            self.counters["evicted"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            files, size = self._db.execute("SELECT COUNT(*), COALESCE(SUM(bytes), 0) FROM files").fetchone()
+        return {"files": files, "compressed_bytes": size, "path": self.path, **self.counters}
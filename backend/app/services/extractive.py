@@ -0,0 +1,49 @@
+from typing import List, Dict
+from contextlib import nullcontext
+import re
+import numpy as np
+
+from app.config import settings
+
+FALLBACK_PREFIX = "The answer service is temporarily unavailable. The most relevant passages from your documents are:"
+NO_CONTEXT_REPLY = "The answer service is temporarily unavailable. Please try again shortly."
+
+_SENTENCE_SPLIT = re.compile(r'(?<=[.!?])\s+')
+
+class ExtractiveAnswerer:
+    """
+    Builds an answer without the LLM: the retrieved sentences most similar to
+    the query, scored with one batched encode and one matrix-vector product.
+    Used while the generation circuit is open so latency stays bounded. The
+    encode takes an embed stage slot like any other, since a fallback burst
+    lands on the same model as query and ingest embeddings.
+    """
+
+    def __init__(self, embed_service, admission=None, max_sentences: int = None, min_chars: int = 20):
+        self.embed_service = embed_service
+        self.admission = admission
+        self.max_sentences = max_sentences or settings.EXTRACTIVE_MAX_SENTENCES
+        self.min_chars = min_chars
+
+    def answer(self, query_embedding: List[float], context_chunks: List[Dict]) -> str:
+        sentences = []
+        seen = set()
+        for chunk in context_chunks:
+            for sentence in _SENTENCE_SPLIT.split(chunk.get("text", "")):
+                sentence = " ".join(sentence.split())
+                if len(sentence) >= self.min_chars and sentence not in seen:
+                    seen.add(sentence)
+                    sentences.append(sentence)
+
+        if not sentences or query_embedding is None or not len(query_embedding):
+            return NO_CONTEXT_REPLY
+
+        with self.admission.stage("embed") if self.admission else nullcontext():
+            vectors = np.asarray(self.embed_service.get_embeddings(sentences), dtype=np.float32)
+        vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        q = np.asarray(query_embedding, dtype=np.float32)
+        scores = vectors @ (q / max(np.linalg.norm(q), 1e-12))
+
+        best = np.argsort(-scores)[:self.max_sentences]
+        bullets = "\n".join(f"- {sentences[i]}" for i in best)
+        return f"{FALLBACK_PREFIX}\n{bullets}"
@@ -1,68 +1,296 @@
-from typing import List, Dict, Generator
+from typing import List, Dict, Callable, Generator, Optional, Tuple, Any
 import os
-from langchain_groq import ChatGroq
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import StrOutputParser
+import statistics
+import threading
+import time
 
 from app.config import settings
+from app.services.circuit_breaker import CircuitBreaker
 
-class GenerationService:
-    def __init__(self):
-        self.provider = settings.LLM_PROVIDER
-        
-        if self.provider == "groq":
-            if not settings.GROQ_API_KEY:
-                 # Fallback check
-                 key = os.getenv("GROQ_API_KEY")
-                 if not key:
-                     raise ValueError("GROQ_API_KEY not set.")
-            
-            # Initialize ChatGroq
-            self.llm = ChatGroq(
-                temperature=0, 
-                model_name=settings.LLM_MODEL, # e.g. llama3-8b-8192
-                api_key=settings.GROQ_API_KEY
-            )
-        else:
-            raise NotImplementedError(f"Provider {self.provider} not supported yet.")
+ERROR_REPLY = "Sorry, I encountered an error generating the response."
 
-        self.prompt = ChatPromptTemplate.from_template(
-            """You are a helpful and accurate assistant. 
-            Answer the question based ONLY on the following context. 
+PROMPT_TEMPLATE = """You are a helpful and accurate assistant.
+            Answer the question based ONLY on the following context.
             If the answer is not in the context, say "I don't have enough information to answer that."
-
+            {history}
             Context:
             {context}
 
             Question: {question}
             """
-        )
-        self.chain = self.prompt | self.llm | StrOutputParser()
 
-    def generate_response(self, query: str, context_chunks: List[Dict]) -> str:
+# Folds turns that aged out of the recent window into a conversation's rolling summary
+SUMMARY_TEMPLATE = """You maintain a running summary of a conversation.
+            Rewrite the summary below so it also covers the newer turns, in at most {words} words.
+            Keep names, facts, decisions and open questions. Do not answer or comment on the turns.
+            Reply with only the new summary.
+
+            Previous summary:
+            {summary}
+
+            Newer turns:
+            {turns}
+            """
+
+def _history_block(history: str) -> str:
+    # Empty for single-turn queries so their prompt is unchanged
+    return f"\n            Conversation so far:\n{history}\n" if history else ""
+
+class ProviderSlot:
+    """
+    One configured LLM backend plus the live signals used to route to it:
+    EWMA latency and error rate, a concurrency cap and a circuit breaker.
+    """
+
+    def __init__(self, name: str, chain: Any, max_concurrency: int, timeout: float, summary_chain: Any = None):
+        self.name = name
+        self.chain = chain
+        self.summary_chain = summary_chain or chain
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        self.breaker = CircuitBreaker(name=name)
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._lock = threading.Lock()
+
+        self.ewma_latency: Optional[float] = None # seconds, successful calls only
+        self.ewma_error = 0.0
+        self.in_flight = 0
+        self.calls = 0
+
+    def score(self, prior: float) -> float:
+        """
+        Expected cost of sending the next call here (lower is better).
+        `prior` is the pool's typical latency: an unmeasured provider is
+        assumed to be typical, and errors cost a multiple of it, so a
+        provider that has never succeeded still ranks behind healthy ones.
+        """
+        latency = self.ewma_latency if self.ewma_latency is not None else prior
+        load = self.in_flight / self.max_concurrency
+        return latency * (1 + load) + settings.LLM_ERROR_PENALTY * self.ewma_error * prior
+
+    def try_acquire(self, timeout: float = None) -> bool:
+        acquired = self._slots.acquire(timeout=timeout) if timeout else self._slots.acquire(blocking=False)
+        if acquired:
+            with self._lock:
+                self.in_flight += 1
+        return acquired
+
+    def release(self):
+        with self._lock:
+            self.in_flight -= 1
+        self._slots.release()
+
+    def observe(self, success: bool, duration: float):
+        alpha = settings.LLM_EWMA_ALPHA
+        with self._lock:
+            self.calls += 1
+            self.ewma_error = alpha * (0.0 if success else 1.0) + (1 - alpha) * self.ewma_error
+            if success:
+                self.ewma_latency = duration if self.ewma_latency is None else \
+                    alpha * duration + (1 - alpha) * self.ewma_latency
+        self.breaker.record(success=success, duration=duration)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "ewma_latency_ms": self.ewma_latency * 1000 if self.ewma_latency is not None else None,
+            "ewma_error_rate": self.ewma_error,
+            "in_flight": self.in_flight,
+            "max_concurrency": self.max_concurrency,
+            "calls": self.calls,
+            "breaker": self.breaker.stats()
+        }
+
+class GenerationService:
+    """
+    Generates answers through a pool of LLM providers.
+
+    Each call goes to the available provider with the lowest expected cost
+    (EWMA latency scaled by load and recent error rate). Providers whose
+    circuit is open or whose concurrency cap is reached are skipped, and a
+    failed call fails over to the next provider.
+    """
+
+    def __init__(self, providers: List[str] = None):
+        names = providers or settings.LLM_PROVIDERS or [settings.LLM_PROVIDER]
+        self.providers: List[ProviderSlot] = []
+        errors = {}
+
+        for name in names:
+            try:
+                chain, summary_chain = self._build_chains(name)
+                self.providers.append(ProviderSlot(
+                    name=name,
+                    chain=chain,
+                    summary_chain=summary_chain,
+                    max_concurrency=settings.LLM_MAX_CONCURRENCY.get(name, settings.LLM_DEFAULT_MAX_CONCURRENCY),
+                    timeout=settings.LLM_TIMEOUTS.get(name, settings.LLM_DEFAULT_TIMEOUT)
+                ))
+            except Exception as e:
+                print(f"LLM provider '{name}' unavailable: {e}")
+                errors[name] = str(e)
+
+        if not self.providers:
+            raise ValueError(f"No LLM provider could be configured: {errors}")
+
+        self.provider = self.providers[0].name
+        # Kept for callers that read a single breaker (the primary provider's)
+        self.breaker = self.providers[0].breaker
+
+    def _build_chains(self, name: str):
+        """(answer chain, summary chain) for one provider, sharing its model client."""
+        if name.startswith("mock"):
+            from app.services.mock_llm import MockLLM
+            mock = MockLLM(name=name, **settings.MOCK_LLM_PROFILES.get(name, {}))
+            return mock, mock
+
+        # LangChain imports are deferred so importing this module stays cheap
+        from langchain_core.prompts import ChatPromptTemplate
+        from langchain_core.output_parsers import StrOutputParser
+
+        timeout = settings.LLM_TIMEOUTS.get(name, settings.LLM_DEFAULT_TIMEOUT)
+        model = settings.LLM_MODELS.get(name, settings.LLM_MODEL)
+
+        if name == "groq":
+            api_key = settings.GROQ_API_KEY or os.getenv("GROQ_API_KEY")
+            if not api_key:
+                raise ValueError("GROQ_API_KEY not set.")
+            from langchain_groq import ChatGroq
+            llm = ChatGroq(
+                temperature=0,
+                model_name=model, # e.g. llama3-8b-8192
+                api_key=api_key,
+                # Fail within the provider's budget instead of the SDK defaults
+                timeout=timeout,
+                max_retries=settings.LLM_MAX_RETRIES
+            )
+        elif name == "openai":
+            api_key = settings.OPENAI_API_KEY or os.getenv("OPENAI_API_KEY")
+            if not api_key:
+                raise ValueError("OPENAI_API_KEY not set.")
+            from langchain_openai import ChatOpenAI
+            llm = ChatOpenAI(
+                temperature=0,
+                model=model,
+                api_key=api_key,
+                timeout=timeout,
+                max_retries=settings.LLM_MAX_RETRIES
+            )
+        elif name == "anthropic":
+            api_key = settings.ANTHROPIC_API_KEY or os.getenv("ANTHROPIC_API_KEY")
+            if not api_key:
+                raise ValueError("ANTHROPIC_API_KEY not set.")
+            from langchain_anthropic import ChatAnthropic
+            llm = ChatAnthropic(
+                temperature=0,
+                model=model,
+                api_key=api_key,
+                timeout=timeout,
+                max_retries=settings.LLM_MAX_RETRIES
+            )
+        else:
+            raise NotImplementedError(f"Provider {name} not supported yet.")
+
+        parser = StrOutputParser()
+        return (ChatPromptTemplate.from_template(PROMPT_TEMPLATE) | llm | parser,
+                ChatPromptTemplate.from_template(SUMMARY_TEMPLATE) | llm | parser)
+
+    def generate_response(self, query: str, context_chunks: List[Dict], history: str = "") -> str:
         """
         Generate answer from context.
         """
+        response = self.try_generate(query, context_chunks, history)
+        return response if response is not None else ERROR_REPLY
+
+    def try_generate(self, query: str, context_chunks: List[Dict], history: str = "") -> Optional[str]:
+        """
+        Generate answer from context, or return None when every provider failed
+        or is unavailable, so the caller can fall back without waiting.
+        """
+        return self.generate_with_provider(query, context_chunks, history)[0]
+
+    def generate_with_provider(self, query: str, context_chunks: List[Dict],
+                               history: str = "") -> Tuple[Optional[str], Optional[str]]:
+        """
+        Like try_generate, but also returns the name of the provider that answered.
+        `history` is the rendered conversation (see ConversationMemory), if any.
+        """
         # Format context
         # context_chunks is list of dicts with 'text' and 'metadata'
         context_text = "\n\n".join([c.get('text', '') for c in context_chunks])
-        
-        try:
-            response = self.chain.invoke({
-                "context": context_text,
-                "question": query
-            })
-            return response
-        except Exception as e:
-            print(f"Generation error: {e}")
-            return "Sorry, I encountered an error generating the response."
-            
-    def generate_stream(self, query: str, context_chunks: List[Dict]) -> Generator[str, None, None]:
+        inputs = {"context": context_text, "question": query, "history": _history_block(history)}
+        return self._invoke(lambda slot: slot.chain, inputs)
+
+    def summarize(self, summary: str, turns: str, words: int) -> Optional[str]:
+        """
+        Fold newer conversation turns into a rolling summary with the summary
+        prompt (not the answer-from-context one); None when every provider failed.
+        """
+        inputs = {"summary": summary or "(none yet)", "turns": turns, "words": words}
+        return self._invoke(lambda slot: slot.summary_chain, inputs)[0]
+
+    def _invoke(self, chain_of: Callable[[ProviderSlot], Any],
+                inputs: Dict[str, Any]) -> Tuple[Optional[str], Optional[str]]:
+        for slot in self._acquire_order():
+            start = time.time()
+            try:
+                response = chain_of(slot).invoke(inputs)
+                slot.observe(success=True, duration=time.time() - start)
+                return response, slot.name
+            except Exception as e:
+                print(f"Generation error ({slot.name}): {e}")
+                slot.observe(success=False, duration=time.time() - start)
+            finally:
+                slot.release()
+
+        return None, None
+
+    def _acquire_order(self) -> Generator[ProviderSlot, None, None]:
+        """
+        Yield providers in routing order, each with a concurrency slot held.
+        The caller must release the slot it was given.
+        """
+        measured = [p.ewma_latency for p in self.providers if p.ewma_latency is not None]
+        prior = statistics.median(measured) if measured else settings.LLM_LATENCY_PRIOR
+        ranked = sorted(self.providers, key=lambda p: p.score(prior))
+        waiting = []
+        for slot in ranked:
+            if slot.try_acquire():
+                if slot.breaker.allow_request():
+                    yield slot
+                    continue
+                slot.release()
+            elif slot.breaker.state == "closed":
+                waiting.append(slot)
+
+        # Every healthy provider was saturated: queue briefly on each in turn
+        for slot in waiting:
+            if slot.try_acquire(timeout=settings.LLM_QUEUE_TIMEOUT):
+                if slot.breaker.allow_request():
+                    yield slot
+                    continue
+                slot.release()
+
+    def generate_stream(self, query: str, context_chunks: List[Dict], history: str = "") -> Generator[str, None, None]:
         context_text = "\n\n".join([c.get('text', '') for c in context_chunks])
-         
-        try:
-            for chunk in self.chain.stream({"context": context_text, "question": query}):
-                yield chunk
-        except Exception as e:
-            print(f"Stream error: {e}")
-            yield "Error generating response."
+        inputs = {"context": context_text, "question": query, "history": _history_block(history)}
+
+        for slot in self._acquire_order():
+            start = time.time()
+            try:
+                for chunk in slot.chain.stream(inputs):
+                    yield chunk
+                slot.observe(success=True, duration=time.time() - start)
+                return
+            except Exception as e:
+                print(f"Stream error ({slot.name}): {e}")
+                slot.observe(success=False, duration=time.time() - start)
+                yield "Error generating response."
+                return
+            finally:
+                slot.release()
+
+        yield "Error generating response."
+
+    def stats(self) -> List[Dict[str, Any]]:
+        return [p.stats() for p in self.providers]
@@ -0,0 +1,122 @@
+from typing import Any, Callable, Dict, Optional
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+import threading
+import time
+import numpy as np
+
+from app.config import settings
+
+class DeadlineExceeded(TimeoutError):
+    pass
+
+class HedgedCaller:
+    """
+    Runs blocking calls on a bounded thread pool with a per-call deadline and
+    optional request hedging.
+
+    Deadline: the caller gets its answer or a DeadlineExceeded within
+    `timeout_ms`, even if the underlying call hangs (the stray attempt finishes
+    in the background, but no request worker waits on it).
+
+    Hedging: if the first attempt has not returned after the recent
+    `percentile` attempt latency, a second identical attempt is fired and the
+    first successful result wins. Only use it for idempotent reads.
+    """
+
+    def __init__(self,
+                 max_workers: int = None,
+                 timeout_ms: int = None,
+                 hedge: bool = None,
+                 hedge_percentile: float = None,
+                 hedge_min_delay_ms: int = None,
+                 window: int = 500,
+                 name: str = "hedged"):
+        self.timeout = (timeout_ms or settings.PINECONE_QUERY_TIMEOUT_MS) / 1000
+        self.hedge = settings.PINECONE_HEDGE_ENABLED if hedge is None else hedge
+        self.hedge_percentile = hedge_percentile or settings.PINECONE_HEDGE_PERCENTILE
+        self.hedge_min_delay = (hedge_min_delay_ms or settings.PINECONE_HEDGE_MIN_DELAY_MS) / 1000
+        self._pool = ThreadPoolExecutor(
+            max_workers=max_workers or settings.PINECONE_POOL_SIZE, thread_name_prefix=name
+        )
+
+        # Per-attempt latencies drive the hedge delay; per-call latencies are what callers saw
+        self._attempts = deque(maxlen=window)
+        self._calls = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.counters = {"calls": 0, "hedged": 0, "hedge_wins": 0, "timeouts": 0, "errors": 0,
+                         "abandoned": 0} # attempts still running when their caller gave up
+
+    def hedge_delay(self) -> Optional[float]:
+        """Seconds to wait before hedging, or None while there is too little history."""
+        samples = list(self._attempts)
+        if len(samples) < 20:
+            return None
+        return max(float(np.percentile(samples, self.hedge_percentile)), self.hedge_min_delay)
+
+    def call(self, fn: Callable[[], Any]) -> Any:
+        start = time.perf_counter()
+        deadline = start + self.timeout
+        self._count("calls")
+
+        futures = [self._submit(fn)]
+        delay = self.hedge_delay() if self.hedge else None
+        if delay is not None and delay < self.timeout:
+            done, _ = wait(futures, timeout=delay)
+            if not done:
+                self._count("hedged")
+                futures.append(self._submit(fn))
+
+        pending = set(futures)
+        error: Optional[BaseException] = None
+        while pending:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            for f in done:
+                if f.exception() is None:
+                    if len(futures) > 1 and f is futures[1]:
+                        self._count("hedge_wins")
+                    for other in pending:
+                        other.cancel()
+                    self._calls.append(time.perf_counter() - start)
+                    return f.result()
+                error = f.exception()
+
+        self._calls.append(time.perf_counter() - start)
+        for f in pending:
+            # Queued attempts free their pool slot; running ones can't be stopped
+            if not f.cancel():
+                self._count("abandoned")
+        if pending or error is None:
+            self._count("timeouts")
+            raise DeadlineExceeded(f"Call exceeded {self.timeout * 1000:.0f} ms deadline")
+        self._count("errors")
+        raise error
+
+    def _submit(self, fn: Callable[[], Any]):
+        t0 = time.perf_counter()
+        future = self._pool.submit(fn)
+        # Cancelled attempts never ran: their wait is not a latency sample
+        future.add_done_callback(lambda f: f.cancelled() or self._attempts.append(time.perf_counter() - t0))
+        return future
+
+    def _count(self, key: str):
+        with self._lock:
+            self.counters[key] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        calls = list(self._calls)
+        percentiles = {}
+        if calls:
+            p50, p95, p99 = np.percentile(calls, [50, 95, 99])
+            percentiles = {"p50_ms": p50 * 1000, "p95_ms": p95 * 1000, "p99_ms": p99 * 1000}
+        delay = self.hedge_delay()
+        return {
+            **self.counters,
+            **percentiles,
+            "hedge_enabled": self.hedge,
+            "hedge_delay_ms": delay * 1000 if delay is not None else None,
+            "timeout_ms": self.timeout * 1000
+        }
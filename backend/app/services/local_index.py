@@ -0,0 +1,282 @@
+from typing import List, Dict, Any, Optional
+from dataclasses import dataclass, field
+import numpy as np
+
+@dataclass
+class LocalMatch:
+    id: str
+    score: float
+    metadata: Dict[str, Any] = field(default_factory=dict)
+    values: List[float] = field(default_factory=list)
+
+@dataclass
+class LocalQueryResult:
+    matches: List[LocalMatch]
+
+@dataclass
+class LocalFetchResult:
+    vectors: Dict[str, LocalMatch]
+
+def _bit(row: int):
+    # np.packbits uses big-endian bit order inside each byte
+    return row >> 3, np.uint8(0x80 >> (row & 7))
+
+class _Namespace:
+    """
+    Vectors, metadata and packed bitmap indexes for one namespace.
+    Rows are never moved; deletes clear the row's bit in `alive`.
+    """
+
+    def __init__(self, dimension: int, indexed_fields: List[str]):
+        self.dimension = dimension
+        self.indexed_fields = indexed_fields
+        self.size = 0
+        self.capacity = 0
+        self.vectors = np.zeros((0, dimension), dtype=np.float32)
+        self.ids: List[Optional[str]] = []
+        self.metadata: List[Optional[Dict[str, Any]]] = []
+        self.row_of: Dict[str, int] = {}
+        self.alive = np.zeros(0, dtype=np.uint8)
+        # field -> value -> packed bitmap of rows holding that value
+        self.bitmaps: Dict[str, Dict[Any, np.ndarray]] = {f: {} for f in indexed_fields}
+
+    def _grow(self, needed: int):
+        if needed <= self.capacity:
+            return
+        capacity = max(needed, self.capacity * 2, 64)
+        capacity = (capacity + 7) // 8 * 8
+
+        vectors = np.zeros((capacity, self.dimension), dtype=np.float32)
+        vectors[:self.size] = self.vectors[:self.size]
+        self.vectors = vectors
+
+        extra = capacity // 8 - len(self.alive)
+        self.alive = np.pad(self.alive, (0, extra))
+        for values in self.bitmaps.values():
+            for value in values:
+                values[value] = np.pad(values[value], (0, extra))
+        self.capacity = capacity
+
+    def _set_bits(self, row: int, metadata: Dict[str, Any], on: bool):
+        byte, mask = _bit(row)
+        for f in self.indexed_fields:
+            if f not in metadata or not _indexable(metadata[f]):
+                continue
+            values = self.bitmaps[f]
+            value = metadata[f]
+            if on:
+                if value not in values:
+                    values[value] = np.zeros(self.capacity // 8, dtype=np.uint8)
+                values[value][byte] |= mask
+            elif value in values:
+                values[value][byte] &= ~mask
+
+    def upsert(self, vid: str, vector: np.ndarray, metadata: Dict[str, Any]):
+        row = self.row_of.get(vid)
+        if row is None:
+            row = self.size
+            self._grow(row + 1)
+            self.size += 1
+            self.ids.append(vid)
+            self.metadata.append(None)
+            self.row_of[vid] = row
+        else:
+            self._set_bits(row, self.metadata[row], on=False)
+
+        self.vectors[row] = vector
+        self.metadata[row] = metadata
+        self._set_bits(row, metadata, on=True)
+        byte, mask = _bit(row)
+        self.alive[byte] |= mask
+
+    def update_metadata(self, vid: str, metadata: Dict[str, Any]) -> bool:
+        row = self.row_of.get(vid)
+        if row is None:
+            return False
+        self._set_bits(row, self.metadata[row], on=False)
+        self.metadata[row] = {**self.metadata[row], **metadata}
+        self._set_bits(row, self.metadata[row], on=True)
+        return True
+
+    def delete(self, vid: str):
+        row = self.row_of.pop(vid, None)
+        if row is None:
+            return
+        self._set_bits(row, self.metadata[row], on=False)
+        byte, mask = _bit(row)
+        self.alive[byte] &= ~mask
+        self.ids[row] = None
+        self.metadata[row] = None
+
+    def count(self) -> int:
+        return len(self.row_of)
+
+    def match_mask(self, flt: Optional[Dict]) -> np.ndarray:
+        """Packed bitmap of live rows satisfying a Pinecone-style filter."""
+        mask = self.alive.copy()
+        if flt:
+            mask &= self._eval(flt)
+        return mask
+
+    def _eval(self, flt: Dict) -> np.ndarray:
+        mask = np.full(self.capacity // 8, 0xFF, dtype=np.uint8)
+        for key, cond in flt.items():
+            if key == "$and":
+                for sub in cond:
+                    mask &= self._eval(sub)
+            elif key == "$or":
+                any_mask = np.zeros_like(mask)
+                for sub in cond:
+                    any_mask |= self._eval(sub)
+                mask &= any_mask
+            else:
+                if not isinstance(cond, dict):
+                    cond = {"$eq": cond}
+                for op, value in cond.items():
+                    if op == "$eq":
+                        mask &= self._value_bitmap(key, value)
+                    elif op == "$ne":
+                        mask &= ~self._value_bitmap(key, value)
+                    elif op == "$in":
+                        mask &= self._any_bitmap(key, value)
+                    elif op == "$nin":
+                        mask &= ~self._any_bitmap(key, value)
+                    else:
+                        raise ValueError(f"Unsupported filter operator for local index: {op}")
+        return mask
+
+    def _any_bitmap(self, key: str, values: List[Any]) -> np.ndarray:
+        mask = np.zeros(self.capacity // 8, dtype=np.uint8)
+        for value in values:
+            mask |= self._value_bitmap(key, value)
+        return mask
+
+    def _value_bitmap(self, key: str, value: Any) -> np.ndarray:
+        if key in self.bitmaps:
+            bitmap = self.bitmaps[key].get(value)
+            return bitmap if bitmap is not None else np.zeros(self.capacity // 8, dtype=np.uint8)
+
+        # Not indexed: fall back to scanning metadata
+        rows = np.zeros(self.capacity, dtype=bool)
+        for row in range(self.size):
+            meta = self.metadata[row]
+            if meta is not None and meta.get(key) == value:
+                rows[row] = True
+        return np.packbits(rows)
+
+def _indexable(value: Any) -> bool:
+    return isinstance(value, (str, int, float, bool))
+
+class LocalVectorIndex:
+    """
+    In-process vector index exposing the subset of the Pinecone Index API
+    that VectorService uses (upsert / query / update / delete / describe_index_stats).
+
+    Vectors are stored L2-normalized so the dot product is the cosine score.
+    Metadata fields listed in `indexed_fields` get packed bitmap indexes,
+    maintained on write, so a filtered query only scores matching rows.
+    """
+
+    def __init__(self, indexed_fields: List[str] = None):
+        self.indexed_fields = list(indexed_fields or [])
+        self.namespaces: Dict[str, _Namespace] = {}
+
+    def _namespace(self, namespace: str, dimension: int = None) -> Optional[_Namespace]:
+        ns = self.namespaces.get(namespace or "")
+        if ns is None and dimension is not None:
+            ns = _Namespace(dimension, self.indexed_fields)
+            self.namespaces[namespace or ""] = ns
+        return ns
+
+    def upsert(self, vectors: List[Dict], namespace: str = ""):
+        if not vectors:
+            return {"upserted_count": 0}
+
+        matrix = np.asarray([v["values"] for v in vectors], dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix /= np.where(norms == 0, 1, norms)
+
+        ns = self._namespace(namespace, dimension=matrix.shape[1])
+        if matrix.shape[1] != ns.dimension:
+            raise ValueError(f"Vector dimension {matrix.shape[1]} does not match index dimension {ns.dimension}")
+
+        for v, row in zip(vectors, matrix):
+            ns.upsert(v["id"], row, dict(v.get("metadata") or {}))
+        return {"upserted_count": len(vectors)}
+
+    def query(self, vector: List[float], top_k: int = 5, include_metadata: bool = True,
+              include_values: bool = False, filter: Optional[Dict] = None,
+              namespace: str = "") -> LocalQueryResult:
+        ns = self._namespace(namespace)
+        if ns is None or ns.count() == 0:
+            return LocalQueryResult(matches=[])
+
+        rows = np.flatnonzero(np.unpackbits(ns.match_mask(filter), count=ns.size))
+        if len(rows) == 0:
+            return LocalQueryResult(matches=[])
+
+        q = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(q)
+        if norm:
+            q = q / norm
+
+        scores = ns.vectors[rows] @ q
+        k = min(top_k, len(rows))
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best])]
+
+        matches = []
+        for i in best:
+            row = rows[i]
+            matches.append(LocalMatch(
+                id=ns.ids[row],
+                score=float(scores[i]),
+                metadata=ns.metadata[row] if include_metadata else {},
+                values=ns.vectors[row].tolist() if include_values else []
+            ))
+        return LocalQueryResult(matches=matches)
+
+    def fetch(self, ids: List[str], namespace: str = "") -> LocalFetchResult:
+        ns = self._namespace(namespace)
+        vectors = {}
+        for vid in ids:
+            row = ns.row_of.get(vid) if ns is not None else None
+            if row is not None:
+                vectors[vid] = LocalMatch(id=vid, score=0.0, metadata=ns.metadata[row],
+                                          values=ns.vectors[row].tolist())
+        return LocalFetchResult(vectors=vectors)
+
+    def update(self, id: str, set_metadata: Dict[str, Any] = None, namespace: str = ""):
+        ns = self._namespace(namespace)
+        if ns is not None:
+            ns.update_metadata(id, dict(set_metadata or {}))
+        return {}
+
+    def delete(self, ids: List[str] = None, delete_all: bool = False, namespace: str = ""):
+        if delete_all:
+            self.namespaces.pop(namespace or "", None)
+            return
+        ns = self._namespace(namespace)
+        if ns is None:
+            return
+        for vid in ids or []:
+            ns.delete(vid)
+
+    def scan(self, namespace: str = "", batch_size: int = 100):
+        """Yield every stored vector as batches of {id, values, metadata} dicts."""
+        ns = self._namespace(namespace)
+        if ns is None:
+            return
+        rows = np.flatnonzero(np.unpackbits(ns.alive, count=ns.size))
+        for start in range(0, len(rows), batch_size):
+            yield [
+                {"id": ns.ids[row], "values": ns.vectors[row], "metadata": ns.metadata[row]}
+                for row in rows[start:start + batch_size]
+            ]
+
+    def describe_index_stats(self) -> Dict[str, Any]:
+        namespaces = {name: {"vector_count": ns.count()} for name, ns in self.namespaces.items()}
+        return {
+            "namespaces": namespaces,
+            "total_vector_count": sum(n["vector_count"] for n in namespaces.values())
+        }
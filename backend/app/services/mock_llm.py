@@ -0,0 +1,45 @@
+from typing import Dict, Generator
+import random
+import re
+import time
+
+from app.config import settings
+
+class MockLLM:
+    """
+    Offline stand-in for a chat model, used as the "mock" provider.
+
+    Same `invoke` / `stream` surface as the LangChain chains GenerationService
+    builds, with configurable latency and error rate so provider routing,
+    failover and circuit breaking can be exercised without API keys.
+    """
+
+    def __init__(self, name: str = "mock", latency_ms: float = None, jitter_ms: float = None,
+                 error_rate: float = None, seed: int = None):
+        self.name = name
+        self.latency_ms = settings.MOCK_LLM_LATENCY_MS if latency_ms is None else latency_ms
+        self.jitter_ms = settings.MOCK_LLM_JITTER_MS if jitter_ms is None else jitter_ms
+        self.error_rate = settings.MOCK_LLM_ERROR_RATE if error_rate is None else error_rate
+        self._random = random.Random(seed)
+
+    def invoke(self, inputs: Dict[str, str]) -> str:
+        delay = max(self._random.gauss(self.latency_ms, self.jitter_ms), 0) / 1000
+        time.sleep(delay)
+        if self._random.random() < self.error_rate:
+            raise RuntimeError(f"{self.name}: injected failure")
+
+        if "turns" in inputs:
+            # The summary prompt: keep the previous summary, add the newest turn's opening
+            newest = inputs["turns"].strip().splitlines()[-1] if inputs["turns"].strip() else ""
+            previous = "" if inputs.get("summary") == "(none yet)" else inputs.get("summary", "")
+            return " ".join(filter(None, [previous, newest[:200]]))
+
+        context = inputs.get("context", "").strip()
+        if not context:
+            return f"[{self.name}] You asked: {inputs.get('question', '')}"
+        first_sentence = re.split(r'(?<=[.!?])\s+', context, maxsplit=1)[0]
+        return f"[{self.name}] Based on the context: {first_sentence}"
+
+    def stream(self, inputs: Dict[str, str]) -> Generator[str, None, None]:
+        for word in self.invoke(inputs).split(" "):
+            yield word + " "
@@ -1,63 +1,364 @@
-import json
+import asyncio
 import os
+import sqlite3
+import threading
 import time
-from typing import Dict, Any
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.config import settings
+
+COLUMNS = ("ts", "query", "response", "latency_ms", "tokens", "cost", "model", "retrieval_count", "saved_ms")
+
+# {p} / {p2} are the store's bind parameters; the rest of the SQL runs on both
+# Postgres and SQLite (3.25+ for window functions).
+_SUMMARY_SQL = """
+    SELECT {key} COUNT(*), AVG(latency_ms), MAX(latency_ms), SUM(tokens), SUM(cost), AVG(retrieval_count),
+           AVG(saved_ms)
+    FROM request_metrics WHERE ts >= {p} {group}
+"""
+_P95_SQL = """
+    SELECT {key} MIN(latency_ms) FROM (
+        SELECT model, latency_ms, CUME_DIST() OVER ({partition} ORDER BY latency_ms) AS cd
+        FROM request_metrics WHERE ts >= {p}
+    ) ranked WHERE cd >= 0.95 {group}
+"""
+# Request counts per normalized query and hour of age (p = now, p2 = window start)
+_QUERY_COUNTS_SQL = """
+    SELECT LOWER(TRIM(query)), CAST(({p} - ts) / 3600 AS INTEGER), COUNT(*), MAX(query)
+    FROM request_metrics WHERE ts >= {p2} AND model <> 'router-skip'
+    GROUP BY 1, 2
+"""
+
+def _queries(p: str, p2: str) -> Dict[str, str]:
+    by_model = dict(key="model,", group="GROUP BY model", partition="PARTITION BY model", p=p)
+    overall = dict(key="", group="", partition="", p=p)
+    return {
+        "query_counts": _QUERY_COUNTS_SQL.format(p=p, p2=p2),
+        "recent": f"SELECT {', '.join(COLUMNS)} FROM request_metrics ORDER BY ts DESC LIMIT {p}",
+        "summary_by_model": _SUMMARY_SQL.format(**by_model),
+        "summary": _SUMMARY_SQL.format(**overall),
+        "p95_by_model": _P95_SQL.format(**by_model),
+        "p95": _P95_SQL.format(**overall),
+    }
+
+# Set while logging is suppressed; copied into worker threads by run_in_threadpool
+_suppressed: ContextVar[bool] = ContextVar("monitoring_suppressed", default=False)
+
+def to_row(record: Dict[str, Any]) -> Tuple:
+    """A metrics.jsonl record (or log_request fields) as a request_metrics row."""
+    return (
+        float(record.get("timestamp") or time.time()),
+        str(record.get("query", "")),
+        str(record.get("response", "")),
+        float(record.get("latency_ms") or 0.0),
+        int(record.get("tokens") or 0),
+        float(record.get("cost") or 0.0),
+        str(record.get("model") or "unknown"),
+        int(record.get("retrieval_count") or 0),
+        float(record.get("saved_ms") or 0.0),
+    )
+
+def _from_row(row) -> Dict[str, Any]:
+    record = dict(zip(COLUMNS, row))
+    record["timestamp"] = record.pop("ts")
+    return record
+
+class PostgresMetricsStore:
+    """request_metrics in Postgres; batches go in with COPY over an asyncpg pool."""
+
+    name = "postgres"
+
+    def __init__(self, dsn: str):
+        # SQLAlchemy-style URLs are common in .env files
+        self.dsn = dsn.replace("postgresql+asyncpg://", "postgresql://")
+        self.pool = None
+        self._sql = _queries("$1", "$2")
+
+    async def open(self):
+        import asyncpg
+        self.pool = await asyncpg.create_pool(self.dsn, min_size=1, max_size=4)
+        async with self.pool.acquire() as conn:
+            await conn.execute("""
+                CREATE TABLE IF NOT EXISTS request_metrics (
+                    id BIGSERIAL PRIMARY KEY,
+                    ts DOUBLE PRECISION NOT NULL,
+                    query TEXT NOT NULL,
+                    response TEXT NOT NULL,
+                    latency_ms DOUBLE PRECISION NOT NULL,
+                    tokens INTEGER NOT NULL,
+                    cost DOUBLE PRECISION NOT NULL,
+                    model TEXT NOT NULL,
+                    retrieval_count INTEGER NOT NULL
+                );
+                -- Added after the table was first created
+                ALTER TABLE request_metrics ADD COLUMN IF NOT EXISTS saved_ms DOUBLE PRECISION NOT NULL DEFAULT 0;
+                CREATE INDEX IF NOT EXISTS request_metrics_ts ON request_metrics (ts);
+                CREATE INDEX IF NOT EXISTS request_metrics_model_ts ON request_metrics (model, ts);
+            """)
+
+    async def insert_many(self, rows: List[Tuple]):
+        async with self.pool.acquire() as conn:
+            await conn.copy_records_to_table("request_metrics", records=rows, columns=COLUMNS)
+
+    async def fetch(self, query: str, *args) -> List[Tuple]:
+        async with self.pool.acquire() as conn:
+            return [tuple(r) for r in await conn.fetch(self._sql[query], *args)]
+
+    async def count(self) -> int:
+        async with self.pool.acquire() as conn:
+            return await conn.fetchval("SELECT COUNT(*) FROM request_metrics")
+
+    async def close(self):
+        if self.pool:
+            await self.pool.close()
+
+class SQLiteMetricsStore:
+    """Local fallback: same schema in a SQLite file, queried from worker threads."""
+
+    name = "sqlite"
+
+    def __init__(self, path: str):
+        self.path = path
+        self._db = None
+        self._lock = threading.Lock()
+        self._sql = _queries("?", "?")
+
+    def _open(self):
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._db = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        self._db.executescript("""
+            PRAGMA journal_mode=WAL;
+            CREATE TABLE IF NOT EXISTS request_metrics (
+                id INTEGER PRIMARY KEY,
+                ts REAL NOT NULL,
+                query TEXT NOT NULL,
+                response TEXT NOT NULL,
+                latency_ms REAL NOT NULL,
+                tokens INTEGER NOT NULL,
+                cost REAL NOT NULL,
+                model TEXT NOT NULL,
+                retrieval_count INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS request_metrics_ts ON request_metrics (ts);
+            CREATE INDEX IF NOT EXISTS request_metrics_model_ts ON request_metrics (model, ts);
+        """)
+        # Added after the table was first created (SQLite has no ADD COLUMN IF NOT EXISTS)
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(request_metrics)")}
+        if "saved_ms" not in columns:
+            self._db.execute("ALTER TABLE request_metrics ADD COLUMN saved_ms REAL NOT NULL DEFAULT 0")
+
+    def _insert(self, rows: List[Tuple]):
+        placeholders = ", ".join("?" * len(COLUMNS))
+        with self._lock, self._db:
+            self._db.executemany(
+                f"INSERT INTO request_metrics ({', '.join(COLUMNS)}) VALUES ({placeholders})", rows
+            )
+
+    def _fetch(self, sql: str, args: Tuple) -> List[Tuple]:
+        with self._lock:
+            return self._db.execute(sql, args).fetchall()
+
+    async def open(self):
+        await asyncio.to_thread(self._open)
+
+    async def insert_many(self, rows: List[Tuple]):
+        await asyncio.to_thread(self._insert, rows)
+
+    async def fetch(self, query: str, *args) -> List[Tuple]:
+        return await asyncio.to_thread(self._fetch, self._sql[query], args)
+
+    async def count(self) -> int:
+        rows = await asyncio.to_thread(self._fetch, "SELECT COUNT(*) FROM request_metrics", ())
+        return rows[0][0]
+
+    async def close(self):
+        if self._db:
+            self._db.close()
+
+def create_store(backend: str = None):
+    """The configured metrics store (not yet opened)."""
+    backend = backend or settings.MONITORING_BACKEND
+    if backend == "auto":
+        backend = "postgres" if settings.DATABASE_URL else "sqlite"
+    if backend == "postgres":
+        if not settings.DATABASE_URL:
+            raise ValueError("MONITORING_BACKEND=postgres needs DATABASE_URL.")
+        return PostgresMetricsStore(settings.DATABASE_URL)
+    if backend == "sqlite":
+        return SQLiteMetricsStore(settings.MONITORING_DB_PATH)
+    raise ValueError(f"Unknown MONITORING_BACKEND: {backend}")
 
 class MonitoringService:
-    def __init__(self, log_file: str = "metrics.jsonl"):
-        self.log_file = log_file
-        # Ensure directory exists
-        log_dir = os.path.dirname(log_file)
-        if log_dir and not os.path.exists(log_dir):
+    """
+    Request metrics in an indexed SQL table (Postgres, or SQLite locally).
+
+    `log_request` only appends to an in-memory buffer, so the query path never
+    waits on the database; a task on the app's event loop flushes the buffer
+    in batches every MONITORING_FLUSH_INTERVAL seconds, or as soon as a full
+    batch is waiting. The dashboard's recent and summary reads are SQL queries
+    over the ts / (model, ts) indexes.
+    """
+
+    def __init__(self, store=None):
+        self.store = store or create_store()
+        self.batch_size = settings.MONITORING_BATCH_SIZE
+        self.flush_interval = settings.MONITORING_FLUSH_INTERVAL
+        self._buffer = deque(maxlen=settings.MONITORING_BUFFER_LIMIT)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self.available = False
+        self.counters = {"logged": 0, "written": 0, "dropped": 0, "flushes": 0, "errors": 0}
+
+    async def start(self):
+        """Open the store and start flushing; falls back to SQLite if Postgres is unreachable."""
+        try:
+            await self.store.open()
+        except Exception as e:
+            if self.store.name != "postgres" or settings.MONITORING_BACKEND == "postgres":
+                raise
+            print(f"Metrics store: Postgres unavailable ({e}), using SQLite at {settings.MONITORING_DB_PATH}")
+            self.store = create_store("sqlite")
+            await self.store.open()
+        self.available = True
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        self._task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        """Flush what is buffered and close the store."""
+        if self._task:
+            self._task.cancel()
             try:
-                os.makedirs(log_dir)
-            except:
+                await self._task
+            except asyncio.CancelledError:
                 pass
+        if self.available:
+            await self.flush()
+            await self.store.close()
+            self.available = False
 
-    def log_request(self, 
-                    query: str, 
-                    response: str, 
-                    latency_ms: float, 
-                    tokens: int = 0, 
+    def log_request(self,
+                    query: str,
+                    response: str,
+                    latency_ms: float,
+                    tokens: int = 0,
                     cost: float = 0.0,
                     model: str = "unknown",
-                    retrieval_count: int = 0):
+                    retrieval_count: int = 0,
+                    saved_ms: float = 0.0):
         """
-        Log metrics to JSONL file.
-        In production, this would write to Postgres or Prometheus/Grafana.
+        Queue one request's metrics. Safe to call from any thread; the row is
+        written by the next batch flush. `saved_ms` is the latency the
+        pipeline's overlapped stages saved over running them in sequence.
         """
-        record = {
-            "timestamp": time.time(),
-            "query": query,
-            # Truncate response for logging
-            "response": response[:100] + "..." if len(response) > 100 else response,
-            "latency_ms": latency_ms,
-            "tokens": tokens,
-            "cost": cost,
-            "model": model,
-            "retrieval_count": retrieval_count
+        if _suppressed.get():
+            return
+        # Truncate response for logging
+        response = response[:100] + "..." if len(response) > 100 else response
+        if len(self._buffer) == self._buffer.maxlen:
+            self.counters["dropped"] += 1
+        self._buffer.append((time.time(), query, response, float(latency_ms),
+                             int(tokens or 0), float(cost or 0.0), model, int(retrieval_count or 0),
+                             float(saved_ms or 0.0)))
+        self.counters["logged"] += 1
+
+        if len(self._buffer) >= self.batch_size and self._loop and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    async def _flush_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self.flush()
+
+    async def flush(self):
+        while self._buffer:
+            rows = []
+            while self._buffer and len(rows) < self.batch_size:
+                rows.append(self._buffer.popleft())
+            try:
+                await self.store.insert_many(rows)
+                self.counters["written"] += len(rows)
+                self.counters["flushes"] += 1
+            except Exception as e:
+                # Metrics are best effort: a failed batch is dropped, not retried forever
+                print(f"Monitoring Flush Error: {e}")
+                self.counters["errors"] += 1
+                self.counters["dropped"] += len(rows)
+                return
+
+    async def get_recent_metrics(self, limit: int = 50) -> list:
+        """Newest records first, for the dashboard."""
+        if not self.available:
+            return []
+        return [_from_row(row) for row in await self.store.fetch("recent", limit)]
+
+    async def get_summary(self, window_seconds: float = 3600) -> Dict[str, Any]:
+        """Request count, latency (avg / p95 / max), tokens and cost per model over a window."""
+        if not self.available:
+            return {"available": False}
+        since = time.time() - window_seconds
+
+        def _stats(row, p95) -> Dict[str, Any]:
+            count, avg, worst, tokens, cost, retrieved, saved = row
+            return {
+                "requests": count,
+                "avg_latency_ms": round(avg or 0.0, 1),
+                "p95_latency_ms": round(p95 or 0.0, 1),
+                "max_latency_ms": round(worst or 0.0, 1),
+                "tokens": tokens or 0,
+                "cost": round(cost or 0.0, 6),
+                "avg_retrieval_count": round(retrieved or 0.0, 2),
+                "avg_saved_ms": round(saved or 0.0, 1)
+            }
+
+        overall = (await self.store.fetch("summary", since))[0]
+        overall_p95 = (await self.store.fetch("p95", since))[0][0]
+        p95 = dict(await self.store.fetch("p95_by_model", since))
+        models = {row[0]: _stats(row[1:], p95.get(row[0]))
+                  for row in await self.store.fetch("summary_by_model", since)}
+        return {
+            "available": True,
+            "window_seconds": window_seconds,
+            **_stats(overall, overall_p95),
+            "models": dict(sorted(models.items(), key=lambda m: -m[1]["requests"]))
         }
-        
+
+    @contextmanager
+    def suppressed(self):
+        """Skip logging in this context (and threads it starts), e.g. for cache warming."""
+        token = _suppressed.set(True)
         try:
-            with open(self.log_file, "a", encoding="utf-8") as f:
-                f.write(json.dumps(record) + "\n")
-        except Exception as e:
-            print(f"Monitoring Log Error: {e}")
+            yield
+        finally:
+            _suppressed.reset(token)
 
-    def get_recent_metrics(self, limit: int = 50) -> list:
+    async def get_top_queries(self, window_seconds: float, limit: int,
+                              half_life_seconds: float = 0) -> Tuple[List[Dict[str, Any]], float]:
         """
-        Read recent metrics for dashboard.
+        Most requested queries in the window, grouped by normalized text.
+        With a half-life, each request counts 0.5 ** (age / half_life), so
+        recent demand outranks old. Returns (top queries, weight of all traffic).
         """
-        if not os.path.exists(self.log_file):
-            return []
-            
-        lines = []
-        try:
-            # Read last N lines (inefficient for large files, use shell tail or deque in prod)
-            with open(self.log_file, "r", encoding="utf-8") as f:
-                lines = f.readlines()
-        except:
-            return []
-            
-        records = [json.loads(line) for line in lines[-limit:]]
-        return list(reversed(records))
+        if not self.available:
+            return [], 0.0
+        now = time.time()
+        queries: Dict[str, Dict[str, Any]] = {}
+        for key, age_hours, count, text in await self.store.fetch("query_counts", now, now - window_seconds):
+            weight = count * 0.5 ** (age_hours * 3600 / half_life_seconds) if half_life_seconds else count
+            entry = queries.setdefault(key, {"query": text.strip(), "requests": 0, "weight": 0.0})
+            entry["requests"] += count
+            entry["weight"] += weight
+        total = sum(q["weight"] for q in queries.values())
+        return sorted(queries.values(), key=lambda q: -q["weight"])[:limit], total
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": self.store.name, "buffered": len(self._buffer), **self.counters}
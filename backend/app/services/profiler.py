@@ -0,0 +1,179 @@
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Any, Dict, Optional, Tuple
+
+from app.config import settings
+
+# Path prefixes (relative to backend/ or site-packages) a stack must pass through to be kept
+FOCUS = {
+    "app": ("app/",),
+    "request": ("app/api/",),
+    "embedding": ("app/services/embeddings.py", "sentence_transformers/"),
+    "chunking": ("app/utils/chunking.py",),
+    "all": ("",),
+}
+
+_BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))) + os.sep
+
+class ProfileSession:
+    def __init__(self, seconds: float, interval_ms: float, fraction: Optional[float], focus: str):
+        self.seconds = seconds
+        self.interval = interval_ms / 1000
+        self.fraction = fraction
+        self.focus = focus
+        self.prefixes = FOCUS[focus]
+        self.stacks: Counter = Counter()
+        self.ticks = 0
+        self.samples = 0
+        self.truncated = 0
+        self.sampler_seconds = 0.0
+        self.started_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.done = threading.Event()
+
+    def summary(self) -> Dict[str, Any]:
+        elapsed = (self.finished_at or time.time()) - self.started_at
+        return {
+            "mode": "requests" if self.fraction else "window",
+            "fraction": self.fraction,
+            "focus": self.focus,
+            "seconds": round(elapsed, 2),
+            "ticks": self.ticks,
+            "samples": self.samples,
+            "distinct_stacks": len(self.stacks),
+            "truncated_samples": self.truncated,
+            "interval_ms": round(self.interval * 1000, 2), # after any overhead back-off
+            # Share of one core spent walking stacks
+            "overhead": round(self.sampler_seconds / elapsed, 4) if elapsed else 0.0,
+            "running": not self.done.is_set()
+        }
+
+    def collapsed(self) -> str:
+        """Brendan Gregg's collapsed format, one `root;...;leaf count` per line (flamegraph.pl, speedscope)."""
+        return "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common())
+
+class SamplingProfiler:
+    """
+    Low-overhead stack sampler for a live worker. A background thread reads
+    every thread's current frame (sys._current_frames) each interval and
+    counts the collapsed stacks; nothing is hooked into the profiled code, so
+    it costs nothing when off and one stack walk per thread per tick when on.
+
+    Either profiles a fixed window, or (with `fraction`) only ticks while one
+    of the sampled fraction of requests is in flight. If a tick costs more
+    than PROFILER_MAX_OVERHEAD of its interval, the interval doubles. One
+    session at a time per process; each worker profiles itself.
+    """
+
+    def __init__(self):
+        self.session: Optional[ProfileSession] = None
+        self._labels: Dict[Any, Tuple[str, str]] = {} # code object -> (frame label, path)
+        self._active_requests = 0
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self.session is not None and not self.session.done.is_set()
+
+    def start(self, seconds: float, interval_ms: float = None, fraction: float = None,
+              focus: str = "app") -> ProfileSession:
+        with self._lock:
+            if self.running:
+                raise RuntimeError("A profile is already running")
+            session = self.session = ProfileSession(
+                seconds, interval_ms or settings.PROFILER_INTERVAL_MS, fraction, focus
+            )
+        threading.Thread(target=self._run, args=(session,), name="profiler", daemon=True).start()
+        return session
+
+    def stop(self):
+        if self.session:
+            self.session.done.set()
+
+    @contextmanager
+    def request(self):
+        """Wraps each HTTP request: counts it as in flight if it is picked for sampling."""
+        session = self.session
+        if not (session and session.fraction and not session.done.is_set() and random.random() < session.fraction):
+            yield
+            return
+        with self._lock:
+            self._active_requests += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._active_requests -= 1
+
+    def _run(self, session: ProfileSession):
+        me = threading.get_ident()
+        deadline = time.monotonic() + session.seconds
+        while not session.done.wait(session.interval):
+            if time.monotonic() >= deadline:
+                break
+            if session.fraction and not self._active_requests:
+                continue
+            t0 = time.perf_counter()
+            self._sample(session, me)
+            cost = time.perf_counter() - t0
+            session.sampler_seconds += cost
+            session.ticks += 1
+            if cost > session.interval * settings.PROFILER_MAX_OVERHEAD:
+                # Sample less often rather than slow the worker down
+                session.interval = min(session.interval * 2, 1.0)
+        session.finished_at = time.time()
+        session.done.set()
+
+    def _sample(self, session: ProfileSession, me: int):
+        for ident, frame in sys._current_frames().items():
+            if ident == me:
+                continue
+            labels = []
+            keep = False
+            while frame is not None and len(labels) < settings.PROFILER_MAX_DEPTH:
+                label, path = self._label(frame.f_code)
+                labels.append(label)
+                keep = keep or path.startswith(session.prefixes)
+                frame = frame.f_back
+            if not keep:
+                continue
+            stack = ";".join(reversed(labels))
+            if stack not in session.stacks and len(session.stacks) >= settings.PROFILER_MAX_STACKS:
+                session.truncated += 1
+                stack = "[truncated]"
+            session.stacks[stack] += 1
+            session.samples += 1
+
+    def _label(self, code) -> Tuple[str, str]:
+        cached = self._labels.get(code)
+        if cached is None:
+            filename = code.co_filename
+            if filename.startswith(_BACKEND_DIR):
+                path = filename[len(_BACKEND_DIR):]
+            elif "site-packages" + os.sep in filename:
+                path = filename.split("site-packages" + os.sep, 1)[1]
+            else:
+                path = os.path.basename(filename)
+            path = path.replace(os.sep, "/")
+            cached = self._labels[code] = (f"{code.co_qualname} ({path}:{code.co_firstlineno})", path)
+        return cached
+
+profiler = SamplingProfiler()
+
+class SampledRequests:
+    """ASGI middleware marking requests for the profiler's `fraction` mode; a pass-through otherwise."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith("/api/admin"):
+            await self.app(scope, receive, send)
+            return
+        with profiler.request():
+            await self.app(scope, receive, send)
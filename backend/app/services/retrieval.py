@@ -1,18 +1,88 @@
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Callable, Generator, Set
+import json
+import re
 import time
-from pinecone import Pinecone, ServerlessSpec
+import numpy as np
+from dataclasses import dataclass
 from app.config import settings
 from app.utils.chunking import Chunk
 
+_TENANT_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+def namespace_for_tenant(tenant: Optional[str]) -> str:
+    """Map a tenant id to its vector namespace (the default namespace when unset)."""
+    if not tenant:
+        return settings.DEFAULT_NAMESPACE
+    if not _TENANT_PATTERN.match(tenant):
+        raise ValueError("Invalid tenant id. Use 1-64 letters, digits, '-' or '_'.")
+    return f"tenant-{tenant}"
+
+def build_filter(source: Optional[List[str]] = None,
+                 doc_type: Optional[List[str]] = None,
+                 page: Optional[List[int]] = None) -> Optional[Dict]:
+    """Build a Pinecone metadata filter from the API's source/type/page fields."""
+    clauses = []
+    for field, values in (("source", source), ("type", doc_type), ("page", page)):
+        if values:
+            clauses.append({field: {"$in": list(values)}})
+
+    if not clauses:
+        return None
+    if len(clauses) == 1:
+        return clauses[0]
+    return {"$and": clauses}
+
+@dataclass(frozen=True)
+class RetrievalScope:
+    """
+    Where a query searches: a namespace plus an optional metadata filter,
+    and the namespace's index generation when the query started.
+    """
+    namespace: str = ""
+    filter: Optional[Dict] = None
+    generation: int = 0
+
+    @property
+    def cache_scope(self) -> str:
+        # Answers are only reusable for the same namespace, filter and index generation
+        if not self.namespace and not self.filter and not self.generation:
+            return ""
+        return json.dumps([self.namespace, self.filter, self.generation], sort_keys=True)
+
 class VectorService:
-    def __init__(self):
-        if not settings.PINECONE_API_KEY:
-            raise ValueError("PINECONE_API_KEY is not set in configuration.")
-            
-        self.pc = Pinecone(api_key=settings.PINECONE_API_KEY)
+    def __init__(self, backend: str = None):
+        self.backend = backend or settings.VECTOR_BACKEND
         self.index_name = settings.PINECONE_INDEX_NAME
         self.index = None
-        
+        self.pc = None
+        self.caller = None
+        # Called as on_change(namespace, sources) after every upsert, and with
+        # sources=None after a delete or bulk load (the container points it at the cache)
+        self.on_change: Optional[Callable[[str, Optional[List[str]]], None]] = None
+        # With a docstore, chunk text stays out of vector metadata
+        self.docstore = None
+        if settings.DOCSTORE_ENABLED or settings.CHUNK_STRATEGY == "small_to_big":
+            from app.services.docstore import ChunkDocstore
+            self.docstore = ChunkDocstore()
+
+        if self.backend == "local":
+            from app.services.local_index import LocalVectorIndex
+            self.index = LocalVectorIndex(indexed_fields=settings.LOCAL_INDEX_FILTER_FIELDS)
+            return
+        if self.backend != "pinecone":
+            raise NotImplementedError(f"Vector backend {self.backend} not supported.")
+
+        if not settings.PINECONE_API_KEY:
+            raise ValueError("PINECONE_API_KEY is not set in configuration.")
+
+        # Imported here so the app starts without paying for the Pinecone SDK import
+        from pinecone import Pinecone
+        from app.services.hedging import HedgedCaller
+        # One pooled HTTP connection per query thread, so no attempt waits on a connection
+        self.pc = Pinecone(api_key=settings.PINECONE_API_KEY, connection_pool_maxsize=settings.PINECONE_POOL_SIZE)
+        # Queries run through a bounded pool with a deadline (and optional hedging)
+        self.caller = HedgedCaller(name="pinecone")
+
         # We don't connect to the index immediately in constructor to allow for 
         # index creation scripts to run first, but we can try lazy loading.
 
@@ -21,6 +91,10 @@ class VectorService:
         Check if index exists, create if not. 
         Note: 384 is default for all-MiniLM-L6-v2.
         """
+        if self.backend == "local":
+            return
+
+        from pinecone import ServerlessSpec
         existing_indexes = [i.name for i in self.pc.list_indexes()]
         
         if self.index_name not in existing_indexes:
@@ -44,66 +118,280 @@ class VectorService:
 
     def get_index(self):
         if not self.index:
-            self.index = self.pc.Index(self.index_name)
+            kwargs = {}
+            if settings.PINECONE_HOST:
+                kwargs["host"] = settings.PINECONE_HOST
+            self.index = self.pc.Index(self.index_name, **kwargs)
         return self.index
 
-    def upsert_chunks(self, chunks: List[Chunk], embeddings: List[List[float]]):
+    def upsert_chunks(self, chunks: List[Chunk], embeddings: Any, namespace: str = None):
         """
         Upsert chunks and their embeddings to Pinecone.
+        `embeddings` is a float32 array (one row per chunk) or a list of vectors.
         """
+        namespace = settings.DEFAULT_NAMESPACE if namespace is None else namespace
         index = self.get_index()
-        vectors = []
+        sources = set()
         
-        for chunk, embedding in zip(chunks, embeddings):
-            # Pinecone expects (id, values, metadata)
-            # Metadata values must be strings, numbers, booleans, or list of strings
-            
-            # Clean metadata to ensure compatibility
-            clean_metadata = {
-                "text": chunk.content, # Storing text in metadata for retrieval
-                "chunk_index": int(chunk.metadata.get("chunk_index", 0)),
-                "source": str(chunk.metadata.get("source", "")),
-                "page": str(chunk.metadata.get("page", "")) if chunk.metadata.get("page") else ""
-            }
-            
-            vectors.append({
-                "id": chunk.chunk_id,
-                "values": embedding,
-                "metadata": clean_metadata
-            })
-            
-        # Batch upload (Pinecone suggests batches of 100 or so)
+        # Batch upload (Pinecone suggests batches of 100 or so); request
+        # payloads are built one batch at a time
         batch_size = 100
-        for i in range(0, len(vectors), batch_size):
-            batch = vectors[i:i+batch_size]
-            index.upsert(vectors=batch)
-            
-        return len(vectors)
+        for i in range(0, len(chunks), batch_size):
+            if self.docstore:
+                # Text first, so a vector is never visible before its text
+                self.store_texts(chunks[i:i + batch_size], namespace)
+            batch = []
+            for chunk, embedding in zip(chunks[i:i + batch_size], embeddings[i:i + batch_size]):
+                # Pinecone expects (id, values, metadata)
+                # Metadata values must be strings, numbers, booleans, or list of strings
+                meta = chunk.metadata
+                
+                # Clean metadata to ensure compatibility
+                clean_metadata = {
+                    "chunk_index": int(meta.get("chunk_index", 0)),
+                    "source": str(meta.get("source", "")),
+                    "type": str(meta.get("type", "")),
+                    # Numeric so page filters can use $eq/$in with ints
+                    "page": int(meta["page"]) if meta.get("page") else ""
+                }
+                if not self.docstore:
+                    clean_metadata["text"] = chunk.content # Storing text in metadata for retrieval
+                if meta.get("parent_id"):
+                    # Small-to-big: the window sent to the LLM instead of this chunk
+                    clean_metadata["parent_id"] = str(meta["parent_id"])
+                    clean_metadata["parent_index"] = int(meta.get("parent_index", 0))
+                if meta.get("sources"):
+                    # Every document this text appeared in (set by ingest dedup)
+                    clean_metadata["sources"] = [str(s) for s in meta["sources"]]
+                sources.add(clean_metadata["source"])
+                
+                batch.append({
+                    "id": chunk.chunk_id,
+                    "values": self._wire_vector(embedding),
+                    "metadata": clean_metadata
+                })
+            index.upsert(vectors=batch, namespace=namespace)
+
+        if self.on_change and chunks:
+            self.on_change(namespace, sorted(sources))
+        return len(chunks)
+
+    def store_texts(self, chunks: List[Chunk], namespace: str = None):
+        """Write chunk (or small-to-big parent) texts to the docstore under their ids."""
+        namespace = settings.DEFAULT_NAMESPACE if namespace is None else namespace
+        self.docstore.put_many(namespace, ((c.chunk_id, c.content) for c in chunks))
+
+    def _wire_vector(self, vector: Any) -> Any:
+        # The local index takes array rows as they are; Pinecone's JSON/REST
+        # client needs plain floats, converted only at this boundary
+        if self.backend == "local" or not isinstance(vector, np.ndarray):
+            return vector
+        return vector.tolist()
 
-    def query(self, query_embedding: List[float], top_k: int = 5, filter: Optional[Dict] = None) -> List[Dict]:
+    def query(self, query_embedding: List[float], top_k: int = 5, filter: Optional[Dict] = None,
+              namespace: str = None, include_values: bool = False, hydrate: bool = True) -> List[Dict]:
         """
         Query the vector database.
+        With `include_values`, each match also carries its vector under 'values'.
+        With `hydrate=False`, docstore texts are left to a later `hydrate()` call,
+        so candidates that get dropped are never read.
         """
         index = self.get_index()
+        namespace = settings.DEFAULT_NAMESPACE if namespace is None else namespace
         
-        result = index.query(
-            vector=query_embedding,
-            top_k=top_k,
-            include_metadata=True,
-            filter=filter
-        )
-        
+        # An attempt the caller stopped waiting for gives up its thread and
+        # connection at the same deadline, not the SDK's 30 s default
+        timeout = {"timeout": self.caller.timeout} if self.caller else {}
+
+        def run():
+            return index.query(
+                vector=self._wire_vector(query_embedding),
+                top_k=top_k,
+                include_metadata=True,
+                include_values=include_values,
+                filter=filter,
+                namespace=namespace,
+                **timeout
+            )
+
+        result = self.caller.call(run) if self.caller else run()
+
         matches = []
         for match in result.matches:
-            matches.append({
+            item = {
                 "id": match.id,
                 "score": match.score,
                 "metadata": match.metadata,
                 "text": match.metadata.get("text", "")
-            })
-            
-        return matches
+            }
+            if include_values:
+                item["values"] = match.values
+            matches.append(item)
+
+        return self.hydrate(matches, namespace) if hydrate else matches
+
+    def hydrate(self, matches: List[Dict], namespace: str = None) -> List[Dict]:
+        """
+        Fill in match texts from the docstore with one bulk lookup. Small-to-big
+        children are replaced by their parent window, once per parent (the best
+        scoring child's match is kept, in the order given).
+        """
+        if not self.docstore or not matches:
+            return matches
+        namespace = settings.DEFAULT_NAMESPACE if namespace is None else namespace
+
+        results, parents = [], set()
+        for match in matches:
+            parent_id = match["metadata"].get("parent_id")
+            if parent_id:
+                if parent_id in parents:
+                    continue
+                parents.add(parent_id)
+            results.append(match)
+
+        texts = self.docstore.get_many(namespace, [r["id"] for r in results] + list(parents))
+        for r in results:
+            parent_id = r["metadata"].get("parent_id")
+            if parent_id and parent_id in texts:
+                r["text"] = texts[parent_id]
+                # Neighbouring parents merge in context assembly like neighbouring chunks
+                r["metadata"] = {**r["metadata"], "chunk_index": r["metadata"].get("parent_index", 0),
+                                 "matched_chunk": r["id"]}
+            else:
+                # Vectors written before the docstore still carry their text
+                r["text"] = texts.get(r["id"], r["text"])
+        return results
+
+    def latency_stats(self) -> Dict[str, Any]:
+        stats = {"backend": self.backend}
+        if self.docstore:
+            stats["docstore"] = self.docstore.stats()
+        if self.caller:
+            stats.update(self.caller.stats())
+        return stats
+
+    def upsert_vectors(self, vectors: List[Dict], namespace: str = None) -> int:
+        """
+        Upsert pre-built {id, values, metadata} dicts, e.g. from a snapshot.
+        Does not call on_change; bulk loaders report once when done.
+        """
+        namespace = settings.DEFAULT_NAMESPACE if namespace is None else namespace
+        index = self.get_index()
+        if self.docstore:
+            vectors = self._move_texts(vectors, namespace)
+        for i in range(0, len(vectors), 100):
+            index.upsert(vectors=vectors[i:i + 100], namespace=namespace)
+        return len(vectors)
+
+    def _move_texts(self, vectors: List[Dict], namespace: str) -> List[Dict]:
+        # Snapshot rows carry text (and parent_text) in metadata: move them to the docstore
+        texts, slim = [], []
+        for v in vectors:
+            metadata = dict(v.get("metadata") or {})
+            text = metadata.pop("text", None)
+            parent_text = metadata.pop("parent_text", None)
+            if text is not None:
+                texts.append((v["id"], text))
+            if parent_text is not None and metadata.get("parent_id"):
+                texts.append((metadata["parent_id"], parent_text))
+            slim.append({**v, "metadata": metadata})
+        self.docstore.put_many(namespace, texts)
+        return slim
+
+    def _with_texts(self, vectors: List[Dict], namespace: str) -> List[Dict]:
+        # The reverse for export: snapshots stay self-contained
+        parent_ids = [(v.get("metadata") or {}).get("parent_id") for v in vectors]
+        texts = self.docstore.get_many(namespace, [v["id"] for v in vectors] + [p for p in parent_ids if p])
+        full = []
+        for v, parent_id in zip(vectors, parent_ids):
+            metadata = dict(v.get("metadata") or {})
+            metadata["text"] = texts.get(v["id"], metadata.get("text", ""))
+            if parent_id and parent_id in texts:
+                metadata["parent_text"] = texts[parent_id]
+            full.append({**v, "metadata": metadata})
+        return full
+
+    def iter_vectors(self, namespace: str = None, batch_size: int = 100) -> Generator[List[Dict], None, None]:
+        """Stream every stored vector of a namespace as {id, values, metadata} batches."""
+        namespace = settings.DEFAULT_NAMESPACE if namespace is None else namespace
+        index = self.get_index()
+        for batch in self._scan(index, namespace, batch_size):
+            yield self._with_texts(batch, namespace) if self.docstore else batch
+
+    def _scan(self, index, namespace: str, batch_size: int) -> Generator[List[Dict], None, None]:
+        if self.backend == "local":
+            yield from index.scan(namespace=namespace, batch_size=batch_size)
+            return
+
+        # Serverless indexes page through ids; vectors are fetched page by page
+        for ids in index.list(namespace=namespace, limit=batch_size):
+            fetched = index.fetch(ids=list(ids), namespace=namespace)
+            yield [
+                {"id": v.id, "values": v.values, "metadata": v.metadata or {}}
+                for v in fetched.vectors.values()
+            ]
+
+    def set_sources(self, attributions: Dict[str, List[str]], namespace: str = None):
+        """
+        Overwrite the `sources` metadata of stored chunks (chunk id -> sources).
+        `source` follows the first entry, so a chunk its original document
+        moved away from is credited to the documents still sharing it.
+        """
+        namespace = settings.DEFAULT_NAMESPACE if namespace is None else namespace
+        index = self.get_index()
+        for chunk_id, sources in attributions.items():
+            index.update(id=chunk_id, set_metadata={"sources": sources, "source": sources[0]}, namespace=namespace)
+
+    def existing_ids(self, ids: List[str], namespace: str = None) -> Set[str]:
+        """The subset of `ids` the index still holds."""
+        namespace = settings.DEFAULT_NAMESPACE if namespace is None else namespace
+        index = self.get_index()
+        found = set()
+        for i in range(0, len(ids), 100):
+            found.update(index.fetch(ids=ids[i:i + 100], namespace=namespace).vectors)
+        return found
+
+    def delete_stale(self, source: str, keep_ids: Set[str], namespace: str = None) -> List[str]:
+        """
+        Delete a re-ingested document's vectors that the new upload did not
+        write (chunks that no longer exist, or ids from an older chunking
+        scheme). Chunk ids start with the source name, so only that id prefix
+        is listed. Vectors other documents are attributed to are kept.
+        """
+        namespace = settings.DEFAULT_NAMESPACE if namespace is None else namespace
+        index = self.get_index()
+        stale = []
+        for batch in self._scan_prefix(index, namespace, f"{source}_"):
+            for v in batch:
+                meta = v["metadata"]
+                if v["id"] in keep_ids or meta.get("source") != source:
+                    continue
+                if set(meta.get("sources") or [source]) - {source}:
+                    continue
+                stale.append(v["id"])
+        for i in range(0, len(stale), 1000):
+            index.delete(ids=stale[i:i + 1000], namespace=namespace)
+        if stale:
+            if self.docstore:
+                self.docstore.delete_many(namespace, stale)
+            if self.on_change:
+                self.on_change(namespace, [source])
+        return stale
+
+    def _scan_prefix(self, index, namespace: str, prefix: str, batch_size: int = 100):
+        if self.backend == "local":
+            for batch in index.scan(namespace=namespace, batch_size=1000):
+                yield [v for v in batch if v["id"].startswith(prefix)]
+            return
+        for ids in index.list(prefix=prefix, namespace=namespace, limit=batch_size):
+            fetched = index.fetch(ids=list(ids), namespace=namespace)
+            yield [{"id": v.id, "metadata": v.metadata or {}} for v in fetched.vectors.values()]
 
-    def delete_all(self):
+    def delete_all(self, namespace: str = None):
         index = self.get_index()
-        index.delete(delete_all=True)
+        namespace = settings.DEFAULT_NAMESPACE if namespace is None else namespace
+        index.delete(delete_all=True, namespace=namespace)
+        if self.docstore:
+            self.docstore.clear(namespace)
+        if self.on_change:
+            self.on_change(namespace, None)
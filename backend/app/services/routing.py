@@ -1,21 +1,147 @@
-from typing import Literal
+from typing import Literal, List, Dict, Optional
+import hashlib
+import json
+import os
+import numpy as np
+
+from app.config import settings
+
+Route = Literal["rag", "chat", "skip"]
+
+# Seed utterances per intent. Their mean embeddings become the intent centroids.
+INTENT_EXAMPLES: Dict[str, List[str]] = {
+    "rag": [
+        "pricing?",
+        "What does the document say about pricing?",
+        "How does the refund policy work?",
+        "Summarize the uploaded report.",
+        "What are the main findings of the paper?",
+        "Who is the author of this document?",
+        "Explain the installation steps.",
+        "What are the requirements for eligibility?",
+        "List the key dates mentioned in the contract.",
+        "What is the definition of the term used in section 3?",
+    ],
+    "chat": [
+        "hi",
+        "hello",
+        "hey there",
+        "good morning",
+        "good evening",
+        "how are you doing today?",
+        "what's up?",
+        "nice to meet you",
+        "who are you?",
+        "tell me a joke",
+    ],
+    "skip": [
+        "thanks",
+        "thank you so much",
+        "ok",
+        "okay cool",
+        "got it",
+        "bye",
+        "goodbye",
+        "see you later",
+        "great",
+        "never mind",
+    ],
+}
 
 class Router:
-    def route_query(self, query: str) -> Literal["rag", "chat", "skip"]:
+    """
+    Classifies queries into rag / chat / skip.
+
+    With an EmbeddingService, routing compares the query embedding (the same one
+    used for retrieval, so no extra model call) against precomputed intent
+    centroids in one matrix-vector product. Low-confidence decisions fall back
+    to "rag", since a needless retrieval is cheaper than a wrong answer.
+    Without embeddings the original keyword rules are used.
+    """
+
+    def __init__(self, embed_service=None, centroids_path: str = None):
+        self.intents: List[str] = list(INTENT_EXAMPLES.keys())
+        self.centroids: Optional[np.ndarray] = None
+        self.centroids_path = centroids_path or settings.ROUTER_CENTROIDS_PATH
+
+        if embed_service is not None:
+            try:
+                self.centroids = self._load_or_build_centroids(embed_service)
+            except Exception as e:
+                print(f"Router centroid setup failed: {e}. Using keyword rules.")
+
+    def route_query(self, query: str, query_embedding: Optional[List[float]] = None) -> Route:
         """
         Determine how to handle the query.
         """
+        if query_embedding is not None and len(query_embedding) and self.centroids is not None:
+            return self.route_embedding(query_embedding)
+        return self._route_by_rules(query)
+
+    def route_embedding(self, query_embedding: List[float]) -> Route:
+        q = np.asarray(query_embedding, dtype=np.float32)
+        norm = np.linalg.norm(q)
+        if norm == 0:
+            return "rag"
+
+        scores = self.centroids @ (q / norm)
+        order = np.argsort(scores)[::-1]
+        best, runner_up = scores[order[0]], scores[order[1]]
+
+        if best < settings.ROUTER_MIN_CONFIDENCE or best - runner_up < settings.ROUTER_MIN_MARGIN:
+            return "rag"
+        return self.intents[order[0]]
+
+    def _route_by_rules(self, query: str) -> Route:
         normalized = query.lower().strip()
-        
+
         # Rule 1: Greetings
         greetings = ["hi", "hello", "hey", "good morning", "good evening"]
         if normalized in greetings:
             return "chat"
-            
+
         # Rule 2: Very short queries (unlikely to need retrieval)
         # Exception: "metrics?" or "status" might be commands, but for now treat as chat
         if len(normalized.split()) < 2 and normalized not in ["help", "info"]:
             return "chat"
-            
+
         # Default
         return "rag"
+
+    def _load_or_build_centroids(self, embed_service) -> np.ndarray:
+        # Centroids depend on the embedding model and the seed set; cache them on disk
+        fingerprint = hashlib.sha256(
+            json.dumps([settings.EMBEDDING_MODEL, INTENT_EXAMPLES], sort_keys=True).encode()
+        ).hexdigest()
+
+        if self.centroids_path and os.path.exists(self.centroids_path):
+            try:
+                stored = np.load(self.centroids_path)
+                if str(stored["fingerprint"]) == fingerprint:
+                    return stored["centroids"]
+            except Exception as e:
+                print(f"Could not read router centroids: {e}")
+
+        # One batched encode for every seed utterance
+        texts = [t for intent in self.intents for t in INTENT_EXAMPLES[intent]]
+        vectors = np.asarray(embed_service.get_embeddings(texts), dtype=np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+
+        centroids = []
+        start = 0
+        for intent in self.intents:
+            count = len(INTENT_EXAMPLES[intent])
+            centroid = vectors[start:start + count].mean(axis=0)
+            centroids.append(centroid / np.linalg.norm(centroid))
+            start += count
+        centroids = np.stack(centroids)
+
+        if self.centroids_path:
+            try:
+                os.makedirs(os.path.dirname(self.centroids_path) or ".", exist_ok=True)
+                with open(self.centroids_path, "wb") as f:
+                    np.savez(f, centroids=centroids, fingerprint=fingerprint)
+            except Exception as e:
+                print(f"Could not save router centroids: {e}")
+
+        return centroids
@@ -0,0 +1,99 @@
+from typing import List, Dict
+import numpy as np
+
+from app.config import settings
+
+class AdaptiveSelector:
+    """
+    Chooses how many and which retrieved candidates go to the LLM.
+
+    Candidates are over-fetched with their vectors, then:
+    1. Relative score cutoff: drop candidates scoring below `relative_cutoff`
+       times the best score, so one clear hit is not padded with weak ones.
+    2. Maximal Marginal Relevance on the survivors, using one candidate
+       similarity matrix and a running max-similarity vector, so each greedy
+       step is a single vectorized update. Candidates nearly identical to an
+       already selected one are never picked.
+
+    The result size lands between `min_k` and `max_k`.
+    """
+
+    def __init__(self,
+                 min_k: int = None,
+                 max_k: int = None,
+                 relative_cutoff: float = None,
+                 mmr_lambda: float = None,
+                 duplicate_similarity: float = None):
+        self.min_k = min_k or settings.RETRIEVAL_MIN_K
+        self.max_k = max_k or settings.RETRIEVAL_MAX_K
+        self.relative_cutoff = relative_cutoff or settings.RETRIEVAL_RELATIVE_CUTOFF
+        self.mmr_lambda = mmr_lambda or settings.RETRIEVAL_MMR_LAMBDA
+        self.duplicate_similarity = duplicate_similarity or settings.RETRIEVAL_DUPLICATE_SIMILARITY
+
+    def select(self, query_embedding: List[float], candidates: List[Dict]) -> List[Dict]:
+        """
+        `candidates` are VectorService.query results fetched with include_values=True.
+        Returns the chosen subset ordered by score, without the 'values' field.
+        """
+        if not candidates:
+            return []
+
+        with_values = [c for c in candidates if c.get("values")]
+        if len(with_values) < len(candidates):
+            # Without vectors MMR is impossible; fall back to the score cutoff alone
+            return self._strip(self._cutoff(candidates)[:self.max_k])
+
+        scores = np.asarray([c["score"] for c in candidates], dtype=np.float32)
+        keep = self._cutoff_mask(scores)
+        idx = np.flatnonzero(keep)
+
+        vectors = np.asarray([candidates[i]["values"] for i in idx], dtype=np.float32)
+        vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+        q = np.asarray(query_embedding, dtype=np.float32)
+        relevance = vectors @ (q / max(np.linalg.norm(q), 1e-12))
+        similarity = vectors @ vectors.T
+
+        chosen = self._mmr(relevance, similarity)
+        selected = [candidates[idx[i]] for i in chosen]
+        selected.sort(key=lambda c: c["score"], reverse=True)
+        return self._strip(selected)
+
+    def _cutoff_mask(self, scores: np.ndarray) -> np.ndarray:
+        best = scores.max()
+        keep = scores >= best * self.relative_cutoff if best > 0 else np.ones_like(scores, dtype=bool)
+        # Always keep the top min_k, however weak
+        keep[np.argsort(-scores)[:self.min_k]] = True
+        return keep
+
+    def _cutoff(self, candidates: List[Dict]) -> List[Dict]:
+        ordered = sorted(candidates, key=lambda c: c["score"], reverse=True)
+        scores = np.asarray([c["score"] for c in ordered], dtype=np.float32)
+        return [c for c, k in zip(ordered, self._cutoff_mask(scores)) if k]
+
+    def _mmr(self, relevance: np.ndarray, similarity: np.ndarray) -> List[int]:
+        n = len(relevance)
+        limit = min(self.max_k, n)
+        available = np.ones(n, dtype=bool)
+        max_sim = np.full(n, -np.inf, dtype=np.float32)
+        chosen: List[int] = []
+
+        while len(chosen) < limit:
+            redundancy = np.where(np.isfinite(max_sim), max_sim, 0.0)
+            mmr = self.mmr_lambda * relevance - (1 - self.mmr_lambda) * redundancy
+            # Near-duplicates of chosen passages are only used to reach min_k
+            blocked = ~available | ((max_sim >= self.duplicate_similarity) & (len(chosen) >= self.min_k))
+            mmr[blocked] = -np.inf
+            best = int(np.argmax(mmr))
+            if not np.isfinite(mmr[best]):
+                break
+
+            chosen.append(best)
+            available[best] = False
+            max_sim = np.maximum(max_sim, similarity[best])
+
+        return chosen
+
+    @staticmethod
+    def _strip(results: List[Dict]) -> List[Dict]:
+        return [{k: v for k, v in r.items() if k != "values"} for r in results]
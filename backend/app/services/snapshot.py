@@ -0,0 +1,214 @@
+from typing import Any, Dict, Generator, List, Tuple
+import json
+import mmap
+import os
+import secrets
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+from app.config import settings
+
+FORMAT = "rag-snapshot"
+VERSION = 1
+
+# Variable-length columns: <name>.bin holds the concatenated UTF-8 values and
+# <name>.off the uint64 start offsets (count + 1 entries).
+_COLUMNS = ("ids", "text", "meta")
+
+class SnapshotWriter:
+    """
+    Appends vectors to a columnar snapshot directory batch by batch, so an
+    export never holds more than one batch in memory. Files are written to a
+    sibling temporary directory that replaces `path` on close(), so a failed
+    export leaves any earlier snapshot there intact.
+
+        manifest.json    format, version, count, dimension, namespace
+        vectors.f32      float32 row-major (count x dimension)
+        ids / text / meta  .bin + .off pairs (meta is JSON without 'text')
+    """
+
+    def __init__(self, path: str):
+        self.path = os.path.normpath(path)
+        self._tmp = f"{self.path}.tmp-{secrets.token_hex(4)}"
+        os.makedirs(self._tmp)
+        self.count = 0
+        self.dimension = None
+        self._vectors = open(os.path.join(self._tmp, "vectors.f32"), "wb")
+        self._bins = {c: open(os.path.join(self._tmp, f"{c}.bin"), "wb") for c in _COLUMNS}
+        self._offs = {c: open(os.path.join(self._tmp, f"{c}.off"), "wb") for c in _COLUMNS}
+        self._positions = {c: 0 for c in _COLUMNS}
+        for c in _COLUMNS:
+            np.zeros(1, dtype=np.uint64).tofile(self._offs[c])
+
+    def append(self, vectors: List[Dict[str, Any]]):
+        """`vectors` are Pinecone-style dicts: id, values, metadata (text inside metadata)."""
+        if not vectors:
+            return
+
+        matrix = np.asarray([v["values"] for v in vectors], dtype=np.float32)
+        if self.dimension is None:
+            self.dimension = matrix.shape[1]
+        elif matrix.shape[1] != self.dimension:
+            raise ValueError(f"Vector dimension {matrix.shape[1]} does not match snapshot dimension {self.dimension}")
+        matrix.tofile(self._vectors)
+
+        for v in vectors:
+            metadata = dict(v.get("metadata") or {})
+            text = metadata.pop("text", "")
+            self._write("ids", str(v["id"]))
+            self._write("text", text)
+            self._write("meta", json.dumps(metadata, separators=(",", ":")))
+        self.count += len(vectors)
+
+    def _write(self, column: str, value: str):
+        data = value.encode("utf-8")
+        self._bins[column].write(data)
+        self._positions[column] += len(data)
+        np.array([self._positions[column]], dtype=np.uint64).tofile(self._offs[column])
+
+    def _close_files(self):
+        for f in [self._vectors, *self._bins.values(), *self._offs.values()]:
+            f.close()
+
+    def abort(self):
+        """Discard the partial export; `path` is left as it was."""
+        self._close_files()
+        shutil.rmtree(self._tmp, ignore_errors=True)
+
+    def close(self, namespace: str = "") -> Dict[str, Any]:
+        self._close_files()
+        manifest = {
+            "format": FORMAT,
+            "version": VERSION,
+            "count": self.count,
+            "dimension": self.dimension or 0,
+            "namespace": namespace,
+            "exported_at": time.time()
+        }
+        # Written last: a snapshot without a manifest is incomplete
+        with open(os.path.join(self._tmp, "manifest.json"), "w") as f:
+            json.dump(manifest, f, indent=2)
+
+        # A directory can't be replaced over a non-empty one: move the old one aside first
+        old = None
+        if os.path.exists(self.path):
+            old = f"{self.path}.old-{secrets.token_hex(4)}"
+            os.replace(self.path, old)
+        os.replace(self._tmp, self.path)
+        if old:
+            shutil.rmtree(old, ignore_errors=True)
+        return manifest
+
+class SnapshotReader:
+    """Memory-maps a snapshot; rows are decoded only when a batch is read."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, "manifest.json")) as f:
+            self.manifest = json.load(f)
+        if self.manifest.get("format") != FORMAT or self.manifest.get("version") != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} {FORMAT} directory.")
+
+        self.count = self.manifest["count"]
+        self.dimension = self.manifest["dimension"]
+        self.vectors = np.memmap(os.path.join(path, "vectors.f32"), dtype=np.float32, mode="r",
+                                 shape=(self.count, self.dimension)) if self.count else np.zeros((0, self.dimension), np.float32)
+        self._offs = {c: np.memmap(os.path.join(path, f"{c}.off"), dtype=np.uint64, mode="r") for c in _COLUMNS}
+        self._files = []
+        self._bins = {c: self._map(os.path.join(path, f"{c}.bin")) for c in _COLUMNS}
+
+    def _map(self, filename: str):
+        f = open(filename, "rb")
+        self._files.append(f)
+        if os.path.getsize(filename) == 0:
+            return b""
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __len__(self) -> int:
+        return self.count
+
+    def _column(self, column: str, start: int, end: int) -> List[str]:
+        offs = self._offs[column][start:end + 1].astype(np.int64)
+        blob = self._bins[column][offs[0]:offs[-1]]
+        base = offs[0]
+        return [blob[a - base:b - base].decode("utf-8") for a, b in zip(offs[:-1], offs[1:])]
+
+    def batches(self, batch_size: int = 100) -> Generator[List[Dict[str, Any]], None, None]:
+        """Yield Pinecone-style vector dicts; 'values' are float32 rows of the memory map."""
+        for start in range(0, self.count, batch_size):
+            end = min(start + batch_size, self.count)
+            ids = self._column("ids", start, end)
+            texts = self._column("text", start, end)
+            metas = self._column("meta", start, end)
+            yield [
+                {"id": vid, "values": self.vectors[start + i], "metadata": {**json.loads(meta), "text": text}}
+                for i, (vid, text, meta) in enumerate(zip(ids, texts, metas))
+            ]
+
+    def close(self):
+        for b in self._bins.values():
+            if isinstance(b, mmap.mmap):
+                b.close()
+        for f in self._files:
+            f.close()
+
+def export_snapshot(vector_service, path: str, namespace: str = None, batch_size: int = 100) -> Dict[str, Any]:
+    """Stream every vector of a namespace into a snapshot directory."""
+    namespace = settings.DEFAULT_NAMESPACE if namespace is None else namespace
+    writer = SnapshotWriter(path)
+    try:
+        for batch in vector_service.iter_vectors(namespace=namespace, batch_size=batch_size):
+            writer.append(batch)
+    except Exception:
+        writer.abort()
+        raise
+    if writer.count == 0:
+        # An empty snapshot would silently wipe whatever it is later imported over
+        writer.abort()
+        raise ValueError(f"Namespace {namespace!r} has no vectors to export.")
+    return writer.close(namespace)
+
+def import_snapshot(vector_service, path: str, namespace: str = None,
+                    batch_size: int = 100, concurrency: int = 4) -> Tuple[int, float]:
+    """
+    Load a snapshot into the vector store without re-embedding.
+    Pinecone batches are upserted by `concurrency` threads, with at most
+    2 x concurrency batches read ahead so memory stays bounded.
+    Returns (vectors loaded, seconds).
+    """
+    reader = SnapshotReader(path)
+    namespace = reader.manifest["namespace"] if namespace is None else namespace
+    t0 = time.time()
+
+    def batches():
+        for batch in reader.batches(batch_size):
+            if vector_service.backend != "local":
+                # Pinecone's JSON encoder needs plain lists
+                batch = [{**v, "values": v["values"].tolist()} for v in batch]
+            yield batch
+
+    try:
+        if concurrency <= 1 or vector_service.backend == "local":
+            for batch in batches():
+                vector_service.upsert_vectors(batch, namespace=namespace)
+        else:
+            in_flight = threading.BoundedSemaphore(concurrency * 2)
+            futures = []
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                for batch in batches():
+                    in_flight.acquire()
+                    future = pool.submit(vector_service.upsert_vectors, batch, namespace)
+                    future.add_done_callback(lambda _: in_flight.release())
+                    futures.append(future)
+                for future in futures:
+                    future.result()
+    finally:
+        reader.close()
+
+    # One cache invalidation for the whole load
+    if vector_service.on_change:
+        vector_service.on_change(namespace, None)
+    return len(reader), time.time() - t0
@@ -0,0 +1,112 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from app.config import settings
+
+class CacheWarmer:
+    """
+    Refills the response cache with the most requested queries from the
+    metrics store, so the first users after a deploy or reset do not pay
+    full LLM latency for popular questions.
+
+    `answer(query)` runs the normal query pipeline (which caches its result)
+    and returns the model label it answered with. Warming is low priority:
+    at most `concurrency` queries run at once, and no new one starts while
+    `busy()` reports live traffic.
+    """
+
+    def __init__(self, monitoring_service, cache_service, answer: Callable[[str], Awaitable[str]],
+                 is_cached: Callable[[List[str]], List[bool]], busy: Callable[[], bool] = None):
+        self.monitoring_service = monitoring_service
+        self.cache_service = cache_service
+        self.answer = answer
+        self.is_cached = is_cached
+        self.busy = busy or (lambda: False)
+        self.status: Dict[str, Any] = {"state": "idle"}
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self, **options) -> Dict[str, Any]:
+        """Begin a warm in the background; a no-op while one is running."""
+        if not self.running:
+            self.status = {"state": "starting"}
+            self._task = asyncio.create_task(self.run(**options))
+        return self.status
+
+    async def wait(self):
+        if self._task:
+            await asyncio.shield(self._task)
+
+    async def run(self, window_hours: float = None, max_queries: int = None,
+                  half_life_hours: float = None, concurrency: int = None,
+                  max_seconds: float = None) -> Dict[str, Any]:
+        window_hours = window_hours or settings.CACHE_WARM_WINDOW_HOURS
+        max_queries = max_queries or settings.CACHE_WARM_MAX_QUERIES
+        half_life_hours = settings.CACHE_WARM_HALF_LIFE_HOURS if half_life_hours is None else half_life_hours
+        concurrency = concurrency or settings.CACHE_WARM_CONCURRENCY
+        max_seconds = max_seconds or settings.CACHE_WARM_MAX_SECONDS
+
+        t0 = time.time()
+        status = self.status = {"state": "running", "started_at": t0}
+        if not (self.cache_service and self.cache_service.enabled):
+            status.update(state="skipped", reason="Cache is disabled (REDIS_URL not set).")
+            return status
+
+        try:
+            top, total_weight = await self.monitoring_service.get_top_queries(
+                window_hours * 3600, max_queries, half_life_hours * 3600
+            )
+            cached = await asyncio.to_thread(self.is_cached, [q["query"] for q in top])
+            todo = [q for q, hit in zip(top, cached) if not hit]
+            warm_weight = sum(q["weight"] for q, hit in zip(top, cached) if hit)
+            status.update(
+                candidates=len(top), already_cached=len(top) - len(todo), total=len(todo),
+                done=0, warmed=0, not_cacheable=0, failed=0, timed_out=0,
+                # Share of the window's (weighted) traffic a cache hit would now serve
+                projected_hit_rate_before=round(warm_weight / total_weight, 4) if total_weight else 0.0
+            )
+            print(f"Cache warm: {len(todo)} of {len(top)} popular queries to answer")
+
+            slots = asyncio.Semaphore(concurrency)
+            deadline = t0 + max_seconds
+
+            async def warm(entry: Dict[str, Any]):
+                nonlocal warm_weight
+                async with slots:
+                    while self.busy() and time.time() < deadline:
+                        # Live traffic first
+                        await asyncio.sleep(0.2)
+                    if time.time() >= deadline:
+                        status["timed_out"] += 1
+                        return
+                    try:
+                        model = await self.answer(entry["query"])
+                    except Exception as e:
+                        print(f"Cache warm error for {entry['query']!r}: {e}")
+                        status["failed"] += 1
+                        return
+                    finally:
+                        status["done"] += 1
+                    if model.endswith(("-rag", "-chat", "cache-hit")):
+                        status["warmed"] += 1
+                        warm_weight += entry["weight"]
+                    else:
+                        # Skipped, degraded or LLM-less answers are never cached
+                        status["not_cacheable"] += 1
+
+            await asyncio.gather(*(warm(q) for q in todo))
+            status.update(
+                state="done",
+                projected_hit_rate_after=round(warm_weight / total_weight, 4) if total_weight else 0.0
+            )
+        except Exception as e:
+            print(f"Cache warm failed: {e}")
+            status.update(state="failed", error=str(e))
+        finally:
+            status.update(finished_at=time.time(), seconds=round(time.time() - t0, 2))
+        print(f"Cache warm {status['state']}: {status}")
+        return status
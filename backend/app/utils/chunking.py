@@ -1,18 +1,67 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Callable, Optional, Tuple
 import re
-from dataclasses import dataclass
+from collections import ChainMap
+import numpy as np
 try:
     from app.utils.preprocessing import Document
 except ImportError:
     # Fallback for when running scripts directly
     from utils.preprocessing import Document
 
-@dataclass
+_NO_METADATA: Dict[str, Any] = {}
+
 class Chunk:
-    content: str
-    metadata: Dict[str, Any]
-    chunk_id: str
+    """
+    A piece of a document, kept compact for large ingests.
+
+    The text is a [start, end) span of the parent document's content rather
+    than a copy, and `metadata` layers the chunk's own fields (chunk_index,
+    sources, ...) over one dict shared by every chunk of the document. Writes
+    to `metadata` land in the chunk's own layer. `Chunk(content, metadata,
+    chunk_id)` still builds a standalone chunk.
+    """
+    __slots__ = ("chunk_id", "_buffer", "_start", "_end", "_own", "_shared")
+
+    def __init__(self, content: str = "", metadata: Optional[Dict[str, Any]] = None, chunk_id: str = "", *,
+                 buffer: Optional[str] = None, start: int = 0, end: Optional[int] = None,
+                 shared: Optional[Dict[str, Any]] = None):
+        self.chunk_id = chunk_id
+        if buffer is None:
+            buffer, start, end = content, 0, len(content)
+        self._buffer = buffer
+        self._start = start
+        self._end = len(buffer) if end is None else end
+        self._own = metadata if metadata is not None else {}
+        self._shared = shared if shared is not None else _NO_METADATA
+
+    @property
+    def content(self) -> str:
+        # A full-range slice returns the buffer itself, no copy
+        return self._buffer[self._start:self._end]
+
+    @property
+    def metadata(self) -> ChainMap:
+        return ChainMap(self._own, self._shared)
+
+    def __repr__(self) -> str:
+        return f"Chunk(chunk_id={self.chunk_id!r}, span=({self._start}, {self._end}))"
+
+_SENTENCE_END = re.compile(r'(?<=[.!?])\s+')
+
+def _sentence_spans(text: str) -> List[Tuple[int, int]]:
+    """[start, end) of each piece `re.split` on sentence terminators would return."""
+    spans, start = [], 0
+    for m in _SENTENCE_END.finditer(text):
+        spans.append((start, m.start()))
+        start = m.end()
+    spans.append((start, len(text)))
+    return spans
     
+def _id_base(document: Document) -> str:
+    # A page-streamed document is chunked page by page: ids restart per page
+    page = document.metadata.get("page")
+    return f"{document.metadata['source']}_p{page}" if page else document.metadata['source']
+
 class ChunkingStrategy:
     def chunk(self, document: Document) -> List[Chunk]:
         raise NotImplementedError
@@ -26,23 +75,23 @@ class FixedSizeChunking(ChunkingStrategy):
         text = document.content
         chunks = []
         start = 0
+        # One metadata dict for every chunk of this document
+        shared = {**document.metadata, "strategy": "fixed_size"}
         
         # Simple character-based sliding window
         # In production, you'd likely want token-based splitting (e.g., using tiktoken)
         while start < len(text):
             end = min(start + self.chunk_size, len(text))
-            chunk_text = text[start:end]
             
             # Simple unique ID generation
-            chunk_id = f"{document.metadata['source']}_{len(chunks)}"
-            
-            chunk_metadata = document.metadata.copy()
-            chunk_metadata["chunk_index"] = len(chunks)
-            chunk_metadata["strategy"] = "fixed_size"
+            chunk_id = f"{_id_base(document)}_{len(chunks)}"
             
             chunks.append(Chunk(
-                content=chunk_text,
-                metadata=chunk_metadata,
+                buffer=text,
+                start=start,
+                end=end,
+                metadata={"chunk_index": len(chunks)},
+                shared=shared,
                 chunk_id=chunk_id
             ))
             
@@ -53,30 +102,190 @@ class FixedSizeChunking(ChunkingStrategy):
 class SentenceChunking(ChunkingStrategy):
     def chunk(self, document: Document) -> List[Chunk]:
         # Simple regex split on sentence terminators
-        sentences = re.split(r'(?<=[.!?])\s+', document.content)
+        text = document.content
+        shared = {**document.metadata, "strategy": "sentence"}
         chunks = []
         
-        for i, sentence in enumerate(sentences):
-            if not sentence.strip():
+        for i, (start, end) in enumerate(_sentence_spans(text)):
+            if not text[start:end].strip():
                 continue
                 
-            chunk_id = f"{document.metadata['source']}_sent_{i}"
-            chunk_metadata = document.metadata.copy()
-            chunk_metadata["chunk_index"] = i
-            chunk_metadata["strategy"] = "sentence"
-            
             chunks.append(Chunk(
-                content=sentence,
-                metadata=chunk_metadata,
-                chunk_id=chunk_id
+                buffer=text,
+                start=start,
+                end=end,
+                metadata={"chunk_index": i},
+                shared=shared,
+                chunk_id=f"{_id_base(document)}_sent_{i}"
             ))
             
         return chunks
 
+class SemanticChunking(ChunkingStrategy):
+    """
+    Packs consecutive sentences into chunks of up to `max_tokens`, closing a
+    chunk early where the topic shifts.
+
+    A shift is a pair of adjacent sentences whose embedding similarity falls in
+    the lowest `breakpoint_percentile` of the document. All sentences are
+    encoded in one batch and the similarities come from one vectorized
+    row-wise product, so boundary detection is a single model call per document.
+    Without `embed_fn` this is plain token-budget packing. A sentence longer
+    than `max_tokens` (unpunctuated PDF text) is first cut at the budget, with
+    `overlap_tokens` repeated across cuts, so the embedder never truncates it.
+    """
+
+    def __init__(self,
+                 embed_fn: Optional[Callable[[List[str]], Any]] = None,
+                 max_tokens: int = 256,
+                 min_tokens: int = 64,
+                 breakpoint_percentile: float = 25.0,
+                 count_tokens: Callable[[str], int] = None,
+                 overlap_tokens: int = 32):
+        self.embed_fn = embed_fn
+        self.max_tokens = max_tokens
+        self.min_tokens = min_tokens
+        self.overlap_tokens = min(overlap_tokens, max_tokens // 2)
+        self.breakpoint_percentile = breakpoint_percentile
+        # ~4 characters per token; close enough for packing decisions
+        self.count_tokens = count_tokens or (lambda text: len(text) // 4 + 1)
+
+    def chunk(self, document: Document) -> List[Chunk]:
+        text = document.content
+        spans = []
+        for start, end in _sentence_spans(text):
+            piece = text[start:end]
+            stripped = piece.strip()
+            if stripped:
+                lead = len(piece) - len(piece.lstrip())
+                spans.extend(self._split_long(text, start + lead, start + lead + len(stripped)))
+        if not spans:
+            return []
+
+        sentences = [text[a:b] for a, b in spans]
+        breaks = self._semantic_breaks(sentences)
+        tokens = [self.count_tokens(s) for s in sentences]
+        del sentences
+
+        # Groups are (first sentence, last sentence) index pairs
+        groups: List[Tuple[int, int]] = []
+        first, current_tokens = 0, 0
+        for i in range(len(spans)):
+            full = i > first and current_tokens + tokens[i] > self.max_tokens
+            shift = i > first and breaks[i] and current_tokens >= self.min_tokens
+            if full or shift:
+                groups.append((first, i - 1))
+                first, current_tokens = i, 0
+            current_tokens += tokens[i]
+        groups.append((first, len(spans) - 1))
+
+        shared = {**document.metadata, "strategy": "semantic"}
+        return [
+            Chunk(
+                buffer=text,
+                start=spans[a][0],
+                end=spans[b][1],
+                metadata={"chunk_index": i},
+                shared=shared,
+                chunk_id=f"{_id_base(document)}_sem_{i}"
+            )
+            for i, (a, b) in enumerate(groups)
+        ]
+
+    def _split_long(self, text: str, start: int, end: int) -> List[Tuple[int, int]]:
+        """Cut one sentence span into pieces of at most `max_tokens`, overlapping by `overlap_tokens`."""
+        pieces = []
+        while True:
+            tokens = self.count_tokens(text[start:end])
+            if tokens <= self.max_tokens:
+                pieces.append((start, end))
+                return pieces
+            # Estimate the cut from the span's own characters per token, then shrink until it fits
+            cut = start + max(1, (end - start) * self.max_tokens // tokens)
+            while cut - start > 1 and self.count_tokens(text[start:cut]) > self.max_tokens:
+                cut = start + (cut - start) * 9 // 10
+            space = text.rfind(" ", start + 1, cut + 1)
+            if space > start:
+                cut = space
+            pieces.append((start, cut))
+
+            # The next piece starts `overlap_tokens` back, on a word boundary
+            back = cut - (cut - start) * self.overlap_tokens // self.max_tokens
+            space = text.find(" ", back, cut)
+            next_start = space if start < space < cut else max(back, start + 1)
+            while next_start < end and text[next_start].isspace():
+                next_start += 1
+            start = next_start
+
+    def _semantic_breaks(self, sentences: List[str]) -> np.ndarray:
+        """breaks[i] is True when sentence i starts a new topic."""
+        breaks = np.zeros(len(sentences), dtype=bool)
+        if self.embed_fn is None or len(sentences) < 3:
+            return breaks
+
+        vectors = np.asarray(self.embed_fn(sentences), dtype=np.float32)
+        vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        # Cosine similarity of each sentence with the next one
+        similarity = np.einsum("ij,ij->i", vectors[:-1], vectors[1:])
+        threshold = np.percentile(similarity, self.breakpoint_percentile)
+        breaks[1:] = similarity <= threshold
+        return breaks
+
+class ParentChildChunking(ChunkingStrategy):
+    """
+    Small-to-big: the document is cut into parent windows of `parent_size`
+    characters, and each parent into overlapping child chunks. Children are
+    what gets embedded (short text matches queries precisely); each carries
+    its `parent_id`, so retrieval can hand the LLM the enclosing parent window.
+    """
+
+    def __init__(self, parent_size: int = 2000, child_size: int = 400, child_overlap: int = 50):
+        self.parent_size = parent_size
+        self.child_size = child_size
+        self.child_overlap = child_overlap
+
+    def chunk(self, document: Document) -> List[Chunk]:
+        return self.chunk_with_parents(document)[0]
+
+    def chunk_with_parents(self, document: Document) -> Tuple[List[Chunk], List[Chunk]]:
+        """(children to embed, parent windows to store by id)."""
+        text = document.content
+        id_base = _id_base(document)
+        shared = {**document.metadata, "strategy": "small_to_big"}
+        parents, children = [], []
+
+        for p, p_start in enumerate(range(0, len(text), self.parent_size)):
+            p_end = min(p_start + self.parent_size, len(text))
+            parent_id = f"{id_base}_parent_{p}"
+            parents.append(Chunk(buffer=text, start=p_start, end=p_end,
+                                 metadata={"chunk_index": p}, shared=shared, chunk_id=parent_id))
+
+            # Children never cross a parent boundary
+            start = p_start
+            while start < p_end:
+                end = min(start + self.child_size, p_end)
+                children.append(Chunk(
+                    buffer=text,
+                    start=start,
+                    end=end,
+                    metadata={"chunk_index": len(children), "parent_id": parent_id, "parent_index": p},
+                    shared=shared,
+                    chunk_id=f"{id_base}_child_{len(children)}"
+                ))
+                if end == p_end:
+                    break
+                start += self.child_size - self.child_overlap
+
+        return children, parents
+
 # Factory/Router
 def get_chunker(strategy_name: str = "fixed", **kwargs) -> ChunkingStrategy:
     if strategy_name == "sentence":
         return SentenceChunking()
+    elif strategy_name == "small_to_big":
+        return ParentChildChunking(**kwargs)
+    elif strategy_name == "semantic":
+        return SemanticChunking(**kwargs)
     elif strategy_name == "fixed":
         return FixedSizeChunking(**kwargs)
     else:
@@ -0,0 +1,154 @@
+from typing import List, Dict, Any, Tuple
+import re
+from dataclasses import dataclass
+
+from app.config import settings
+
+@dataclass
+class AssembledContext:
+    passages: List[Dict[str, Any]]
+    original_tokens: int = 0
+    final_tokens: int = 0
+    merged: int = 0
+    duplicates_removed: int = 0
+    truncated: int = 0
+
+    @property
+    def tokens_saved(self) -> int:
+        return max(self.original_tokens - self.final_tokens, 0)
+
+class ContextAssembler:
+    """
+    Turns retrieved chunks into the passages actually sent to the LLM.
+
+    1. Merges overlapping/adjacent chunks from the same source (the fixed-size
+       chunker repeats CHUNK_OVERLAP characters between neighbours).
+    2. Drops near-duplicate passages, including ones already contained in a
+       better-scoring passage (word-shingle overlap).
+    3. Orders by score and greedily packs passages into a token budget.
+    """
+
+    def __init__(self,
+                 max_tokens: int = None,
+                 dedup_threshold: float = None,
+                 max_overlap: int = None,
+                 encoding_name: str = None):
+        self.max_tokens = max_tokens or settings.CONTEXT_MAX_TOKENS
+        self.dedup_threshold = dedup_threshold or settings.CONTEXT_DEDUP_THRESHOLD
+        # Look a little past the configured overlap in case chunk edges shifted
+        self.max_overlap = max_overlap or settings.CHUNK_OVERLAP * 2
+        self.encoding_name = encoding_name or settings.CONTEXT_TOKENIZER
+        self._encoding = None
+
+    def count_tokens(self, text: str) -> int:
+        if self._encoding is None:
+            try:
+                import tiktoken
+                self._encoding = tiktoken.get_encoding(self.encoding_name)
+            except Exception as e:
+                print(f"tiktoken unavailable ({e}), estimating tokens from length.")
+                self._encoding = False
+
+        if self._encoding:
+            return len(self._encoding.encode(text))
+        return len(text) // 4
+
+    def assemble(self, chunks: List[Dict]) -> AssembledContext:
+        """
+        `chunks` are dicts with 'text', 'metadata' and optionally 'score'.
+        """
+        result = AssembledContext(passages=[])
+        if not chunks:
+            return result
+
+        result.original_tokens = sum(self.count_tokens(c.get("text", "")) for c in chunks)
+
+        passages = self._merge_neighbours(chunks, result)
+        passages = self._dedup(passages, result)
+        passages.sort(key=lambda p: p.get("score", 0.0), reverse=True)
+
+        budget = self.max_tokens
+        for passage in passages:
+            tokens = self.count_tokens(passage["text"])
+            if tokens > budget:
+                result.truncated += 1
+                continue
+            budget -= tokens
+            result.passages.append(passage)
+
+        result.final_tokens = self.max_tokens - budget
+        return result
+
+    def _merge_neighbours(self, chunks: List[Dict], result: AssembledContext) -> List[Dict]:
+        # chunk_index counts within a page for page-streamed PDFs
+        by_source: Dict[Tuple[str, Any], List[Dict]] = {}
+        loose = []
+        for c in chunks:
+            meta = c.get("metadata") or {}
+            if "chunk_index" in meta and meta.get("source"):
+                by_source.setdefault((meta["source"], meta.get("page") or None), []).append(c)
+            else:
+                loose.append(dict(c))
+
+        merged = []
+        for source_chunks in by_source.values():
+            source_chunks.sort(key=lambda c: int(c["metadata"]["chunk_index"]))
+            current = None
+            for c in source_chunks:
+                idx = int(c["metadata"]["chunk_index"])
+                if current is not None and idx - current["_last_index"] <= 1:
+                    if idx != current["_last_index"]:
+                        current["text"] = self._join_overlapping(current["text"], c.get("text", ""))
+                        current["metadata"]["merged_chunks"].append(idx)
+                    current["_last_index"] = idx
+                    current["score"] = max(current.get("score", 0.0), c.get("score", 0.0))
+                    result.merged += 1
+                    continue
+
+                if current is not None:
+                    merged.append(current)
+                meta = dict(c["metadata"])
+                meta["merged_chunks"] = [idx]
+                current = {"text": c.get("text", ""), "metadata": meta,
+                           "score": c.get("score", 0.0), "_last_index": idx}
+            if current is not None:
+                merged.append(current)
+
+        for p in merged:
+            p.pop("_last_index", None)
+        return merged + loose
+
+    def _join_overlapping(self, left: str, right: str) -> str:
+        """Concatenate two neighbouring chunks, dropping the text they share."""
+        limit = min(len(left), len(right), self.max_overlap)
+        # Ignore tiny matches (a shared space or letter is not an overlap)
+        for k in range(limit, 15, -1):
+            if left.endswith(right[:k]):
+                return left + right[k:]
+        return left + "\n" + right
+
+    def _dedup(self, passages: List[Dict], result: AssembledContext) -> List[Dict]:
+        # Keep the best-scoring copy of each near-duplicate group
+        ordered = sorted(passages, key=lambda p: p.get("score", 0.0), reverse=True)
+        kept: List[Dict] = []
+        kept_shingles: List[set] = []
+        for p in ordered:
+            shingles = _shingles(p["text"])
+            if any(_containment(shingles, other) >= self.dedup_threshold for other in kept_shingles):
+                result.duplicates_removed += 1
+                continue
+            kept.append(p)
+            kept_shingles.append(shingles)
+        return kept
+
+def _shingles(text: str, size: int = 3) -> set:
+    words = re.findall(r"\w+", text.lower())
+    if len(words) < size:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+def _containment(a: set, b: set) -> float:
+    """Share of the smaller shingle set found in the larger one."""
+    if not a or not b:
+        return 0.0
+    return len(a & b) / min(len(a), len(b))
@@ -1,13 +1,9 @@
 import os
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Iterator, Optional, Tuple
 from dataclasses import dataclass
 from pathlib import Path
 
-# File handling libraries
-import pypdf
-import docx
-
-@dataclass
+@dataclass(slots=True)
 class Document:
     content: str
     metadata: Dict[str, Any]
@@ -15,7 +11,11 @@ class Document:
 class FileLoader:
     """
     Handles loading of various file formats: PDF, DOCX, TXT, MD.
+    With an `extraction_cache`, PDF text is extracted once per distinct file.
     """
+
+    def __init__(self, extraction_cache=None):
+        self.extraction_cache = extraction_cache
     
     def load_file(self, file_path: str) -> Optional[Document]:
         """
@@ -41,31 +41,91 @@ class FileLoader:
             print(f"Error loading file {file_path}: {e}")
             return None
 
+    def iter_pages(self, file_path: str) -> Iterator[Document]:
+        """
+        A PDF as one Document per non-empty page (with `page`, counted from 1),
+        so only the current page's text is held; other formats as one Document.
+        """
+        path = Path(file_path)
+        if not path.exists():
+            raise FileNotFoundError(f"File not found: {file_path}")
+        if path.suffix.lower() != '.pdf':
+            doc = self.load_file(file_path)
+            if doc:
+                yield doc
+            return
+
+        metadata = {
+            "source": os.path.basename(file_path),
+            "file_path": file_path,
+            "type": "pdf"
+        }
+        for page, page_count, text in self._pdf_pages(file_path):
+            if text.strip():
+                yield Document(content=text, metadata={**metadata, "page_count": page_count, "page": page})
+
     def _load_pdf(self, file_path: str) -> Document:
-        text_content = []
         metadata = {
             "source": os.path.basename(file_path),
             "file_path": file_path,
             "type": "pdf",
             "page_count": 0
         }
-        
-        with open(file_path, 'rb') as f:
-            reader = pypdf.PdfReader(f)
-            metadata["page_count"] = len(reader.pages)
-            
-            for i, page in enumerate(reader.pages):
-                text = page.extract_text()
-                if text:
-                    # We could store page numbers in chunks later, 
-                    # but for raw loading we treat it as a stream or join with markers.
-                    # For now, let's join with a pagebreak marker to allow chunking keying.
-                    text_content.append(text)
+        text_content = []
+        for _, page_count, text in self._pdf_pages(file_path):
+            metadata["page_count"] = page_count
+            if text:
+                text_content.append(text)
         
         full_text = "\n\n".join(text_content)
         return Document(content=full_text, metadata=metadata)
 
+    def _pdf_pages(self, file_path: str) -> Iterator[Tuple[int, int, str]]:
+        """(page number, page count, text) per page, from the extraction cache when the file is in it."""
+        cache = self.extraction_cache
+        served = 0
+        if cache:
+            file_hash = cache.file_hash(file_path)
+            page_count = cache.lookup(file_hash)
+            if page_count is not None:
+                try:
+                    for page, text in cache.pages(file_hash, page_count):
+                        served = page
+                        yield page, page_count, text
+                    return
+                except KeyError:
+                    # Evicted while reading: extract the pages not yet served
+                    pass
+
+        import pypdf
+        with open(file_path, 'rb') as f:
+            try:
+                reader = pypdf.PdfReader(f)
+                if reader.is_encrypted and not reader.decrypt(""):
+                    raise ValueError("Encrypted PDFs are not supported.")
+                page_count = len(reader.pages)
+            except ValueError:
+                raise
+            except Exception as e:
+                # Malformed files are the client's problem, not a server error
+                raise ValueError(f"Could not read PDF: {e}") from e
+
+            pending = cache.begin(file_hash) if cache else None
+            for page, pdf_page in enumerate(reader.pages, start=1):
+                try:
+                    text = pdf_page.extract_text() or ""
+                except Exception as e:
+                    raise ValueError(f"Could not extract text from PDF page {page}: {e}") from e
+                if cache:
+                    cache.put_page(pending, page, text)
+                if page > served:
+                    yield page, page_count, text
+            if cache:
+                # Only a fully extracted file is served from the cache
+                cache.complete(file_hash, pending, page_count)
+
     def _load_docx(self, file_path: str) -> Document:
+        import docx
         doc = docx.Document(file_path)
         text_content = [para.text for para in doc.paragraphs if para.text.strip()]
         
@@ -0,0 +1,48 @@
+"""
+Production server config: gunicorn master + uvicorn workers.
+
+    gunicorn -c gunicorn.conf.py app.main:app
+
+The master loads the embedding model before forking, so every worker shares
+the weights copy-on-write instead of holding its own copy. The GC is frozen
+after preload so collections in workers don't touch (and un-share) the pages
+holding those objects. Each worker gets an even slice of the CPUs for torch
+and tokenizers threads to avoid oversubscription.
+"""
+import gc
+import os
+import sys
+
+from app.config import settings
+
+workers = settings.SERVER_WORKERS
+threads_per_worker = settings.SERVER_THREADS_PER_WORKER or max(1, (os.cpu_count() or 1) // workers)
+
+# Thread pools read these when torch / tokenizers initialise, which happens
+# during preload below, so they must be set first.
+os.environ.setdefault("OMP_NUM_THREADS", str(threads_per_worker))
+os.environ.setdefault("MKL_NUM_THREADS", str(threads_per_worker))
+os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = settings.SERVER_PRELOAD
+timeout = 120
+graceful_timeout = 30
+keepalive = 5
+
+if preload_app and settings.EMBEDDING_PROVIDER == "local":
+    from app.services.embeddings import load_local_model
+    load_local_model(settings.EMBEDDING_MODEL)
+
+    # Everything allocated so far moves to the permanent generation
+    gc.collect()
+    gc.freeze()
+
+def post_fork(server, worker):
+    # Only needed when the master already imported torch; otherwise the
+    # environment variables above apply when the worker imports it.
+    torch = sys.modules.get("torch")
+    if torch is not None:
+        torch.set_num_threads(threads_per_worker)
+    server.log.info(f"Worker {worker.pid} using {threads_per_worker} torch thread(s)")
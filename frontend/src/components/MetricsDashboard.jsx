@@ -6,11 +6,14 @@ import { API_URL } from '../config';
 
 export default function MetricsDashboard() {
     const [metrics, setMetrics] = useState([]);
-    const [summary, setSummary] = useState({ total: 0, avgLatency: 0, cost: 0 });
+    const [summary, setSummary] = useState({ total: 0, avgLatency: 0, p95Latency: 0, cost: 0 });
 
     const fetchMetrics = async () => {
         try {
-            const res = await axios.get(`${API_URL}/metrics/recent?limit=50`);
+            const [res, agg] = await Promise.all([
+                axios.get(`${API_URL}/metrics/recent?limit=50`),
+                axios.get(`${API_URL}/metrics/summary?window=3600`)
+            ]);
             const data = res.data; // List of records
 
             // Transform for chart
@@ -22,15 +25,13 @@ export default function MetricsDashboard() {
             }));
             setMetrics(chartData);
 
-            // Calculate summary
-            const total = data.length;
-            const totalLat = data.reduce((acc, curr) => acc + curr.latency_ms, 0);
-            const totalCost = data.reduce((acc, curr) => acc + (curr.cost || 0), 0);
-
+            // Aggregates are computed server-side over the last hour
+            const s = agg.data;
             setSummary({
-                total,
-                avgLatency: total ? Math.round(totalLat / total) : 0,
-                cost: totalCost
+                total: s.requests || 0,
+                avgLatency: Math.round(s.avg_latency_ms || 0),
+                p95Latency: Math.round(s.p95_latency_ms || 0),
+                cost: s.cost || 0
             });
 
         } catch (e) {
@@ -51,19 +52,19 @@ export default function MetricsDashboard() {
                     title="Total Requests"
                     value={summary.total}
                     icon={<BarChart2 className="text-blue-500" />}
-                    desc="Last 50 requests"
+                    desc="Last hour"
                 />
                 <Card
                     title="Avg Latency"
                     value={`${summary.avgLatency}ms`}
                     icon={<Activity className="text-emerald-500" />}
-                    desc="Response time"
+                    desc={`p95 ${summary.p95Latency}ms, last hour`}
                 />
                 <Card
                     title="Est. Cost"
                     value={`$${summary.cost.toFixed(4)}`}
                     icon={<DollarSign className="text-yellow-500" />}
-                    desc="LLM usage"
+                    desc="LLM usage, last hour"
                 />
             </div>
 
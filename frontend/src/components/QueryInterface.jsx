@@ -7,6 +7,8 @@ export default function QueryInterface() {
     const [query, setQuery] = useState("");
     const [history, setHistory] = useState([]);
     const [loading, setLoading] = useState(false);
+    // Lets the backend cache a summary of older turns for this chat
+    const [conversationId] = useState(() => crypto.randomUUID());
 
     const handleSearch = async (e) => {
         e.preventDefault();
@@ -19,7 +21,11 @@ export default function QueryInterface() {
 
         try {
             const res = await axios.post(`${API_URL}/query`, {
-                query: query
+                query: query,
+                chat_history: history
+                    .filter(msg => msg.role === 'user' || msg.role === 'assistant')
+                    .map(({ role, content }) => ({ role, content })),
+                conversation_id: conversationId
             });
 
             const data = res.data;
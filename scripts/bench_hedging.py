@@ -0,0 +1,114 @@
+"""
+Measure Pinecone query tail latency with and without hedged requests.
+
+Starts a local fake Pinecone data-plane server with injected latency
+(mostly fast, with an occasional slow straggler), points VectorService at it
+via PINECONE_HOST and runs the same query load with hedging off, then on.
+
+    python scripts/bench_hedging.py --queries 500 --slow-rate 0.05 --slow-ms 400
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Add backend to sys.path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+class FakePineconeHandler(BaseHTTPRequestHandler):
+    base_ms = 20.0
+    jitter_ms = 5.0
+    slow_rate = 0.05
+    slow_ms = 400.0
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+
+        delay = random.gauss(self.base_ms, self.jitter_ms)
+        if random.random() < self.slow_rate:
+            delay += self.slow_ms
+        time.sleep(max(delay, 0) / 1000)
+
+        top_k = int(body.get("topK", 5))
+        payload = {
+            "matches": [
+                {"id": f"doc_{i}", "score": 1.0 - i * 0.01, "metadata": {"text": f"chunk {i}", "source": "fake"}}
+                for i in range(top_k)
+            ],
+            "namespace": body.get("namespace", ""),
+            "usage": {"readUnits": 1}
+        }
+        data = json.dumps(payload).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+def start_server(port: int):
+    server = ThreadingHTTPServer(("127.0.0.1", port), FakePineconeHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def run(hedge: bool, args) -> dict:
+    from app.services.retrieval import VectorService
+    from app.services.hedging import HedgedCaller
+
+    service = VectorService(backend="pinecone")
+    service.caller = HedgedCaller(hedge=hedge, timeout_ms=args.timeout_ms, name="bench")
+    vector = [0.1] * args.dim
+
+    def one(_):
+        try:
+            service.query(vector, top_k=5)
+        except TimeoutError:
+            pass
+
+    # Warm up the latency window so the hedge delay has data
+    for _ in range(30):
+        one(None)
+    service.caller._calls.clear()
+    for key in service.caller.counters:
+        service.caller.counters[key] = 0
+
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        list(pool.map(one, range(args.queries)))
+    return service.latency_stats()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--base-ms", type=float, default=20.0)
+    parser.add_argument("--slow-rate", type=float, default=0.05)
+    parser.add_argument("--slow-ms", type=float, default=400.0)
+    parser.add_argument("--timeout-ms", type=int, default=2000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--port", type=int, default=8766)
+    args = parser.parse_args()
+
+    FakePineconeHandler.base_ms = args.base_ms
+    FakePineconeHandler.slow_rate = args.slow_rate
+    FakePineconeHandler.slow_ms = args.slow_ms
+    server = start_server(args.port)
+
+    os.environ.setdefault("PINECONE_API_KEY", "fake-key")
+    os.environ["PINECONE_HOST"] = f"http://127.0.0.1:{args.port}"
+
+    print(f"Fake server: {args.base_ms:.0f} ms base, {args.slow_rate:.0%} of calls +{args.slow_ms:.0f} ms")
+    print(f"{'mode':<10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'hedged':>8}{'wins':>6}{'timeouts':>10}")
+    for hedge in (False, True):
+        s = run(hedge, args)
+        print(f"{'hedged' if hedge else 'baseline':<10}{s.get('p50_ms', 0):>10.1f}{s.get('p95_ms', 0):>10.1f}"
+              f"{s.get('p99_ms', 0):>10.1f}{s['hedged']:>8}{s['hedge_wins']:>6}{s['timeouts']:>10}")
+
+    server.shutdown()
@@ -0,0 +1,129 @@
+"""
+Peak memory of the upload pipeline (load -> chunk -> embed) on a large PDF,
+comparing the previous representation with the compact one.
+
+    legacy   dataclass chunks with a metadata copy and a text copy each, and
+             every embedding held at once as List[List[float]] (.tolist())
+    compact  slotted chunks (text spans over the document, shared metadata)
+             and float32 embeddings produced and dropped INGEST_BATCH_SIZE at a time
+
+    python scripts/bench_ingest_memory.py                  # generates a 600-page PDF
+    python scripts/bench_ingest_memory.py --pdf big.pdf --model   # real PDF + local model
+
+Without --model a stand-in encoder returns random 384-d vectors, which take
+the same memory as real ones and keep the run fast.
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+import tracemalloc
+from dataclasses import dataclass
+from typing import Any, Dict
+import numpy as np
+
+# Add backend to sys.path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from app.config import settings
+from app.utils.preprocessing import FileLoader
+from app.utils.chunking import get_chunker
+
+WORDS = ("retrieval augmented generation index vector chunk embedding latency cache "
+         "tenant document page policy invoice refund security audit region model").split()
+
+def write_pdf(path: str, pages: int, lines_per_page: int = 48, seed: int = 0):
+    """Minimal multi-page text PDF (Helvetica, one content stream per page)."""
+    rng = random.Random(seed)
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for _ in range(pages):
+        lines = [" ".join(rng.choice(WORDS) for _ in range(14)).capitalize() + "." for _ in range(lines_per_page)]
+        body = "BT /F1 10 Tf 12 TL 40 800 Td " + " ".join(f"({line}) Tj T*" for line in lines) + " ET"
+        stream = body.encode("latin-1")
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        content_ref = len(objects)
+        objects.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 842] "
+                       b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_ref)
+        kids.append(len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [" + b" ".join(b"%d 0 R" % k for k in kids) + b"] /Count %d >>" % pages
+
+    with open(path, "wb") as f:
+        f.write(b"%PDF-1.4\n")
+        offsets = []
+        for i, obj in enumerate(objects, start=1):
+            offsets.append(f.tell())
+            f.write(b"%d 0 obj\n" % i + obj + b"\nendobj\n")
+        xref = f.tell()
+        f.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+        for off in offsets:
+            f.write(b"%010d 00000 n \n" % off)
+        f.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref))
+
+@dataclass
+class LegacyChunk:
+    content: str
+    metadata: Dict[str, Any]
+    chunk_id: str
+
+def legacy_pipeline(doc, embed):
+    # The pre-change FixedSizeChunking + upload flow
+    chunks, start, text = [], 0, doc.content
+    while start < len(text):
+        meta = doc.metadata.copy()
+        meta["chunk_index"] = len(chunks)
+        meta["strategy"] = "fixed_size"
+        chunks.append(LegacyChunk(text[start:start + settings.CHUNK_SIZE], meta, f"{doc.metadata['source']}_{len(chunks)}"))
+        start += settings.CHUNK_SIZE - settings.CHUNK_OVERLAP
+    texts = [c.content for c in chunks]
+    embeddings = embed(texts).tolist()
+    return len(chunks), len(embeddings)
+
+def compact_pipeline(doc, embed):
+    chunker = get_chunker("fixed", chunk_size=settings.CHUNK_SIZE, overlap=settings.CHUNK_OVERLAP)
+    chunks = chunker.chunk(doc)
+    embedded = 0
+    for i in range(0, len(chunks), settings.INGEST_BATCH_SIZE):
+        batch = chunks[i:i + settings.INGEST_BATCH_SIZE]
+        embeddings = embed([c.content for c in batch])
+        embedded += len(embeddings) # upsert would happen here
+        del embeddings
+    return len(chunks), embedded
+
+def measure(name, fn, *args):
+    tracemalloc.start()
+    t0 = time.time()
+    chunks, vectors = fn(*args)
+    seconds = time.time() - t0
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{name:<9}{chunks:>9}{vectors:>9}{peak / 1e6:>12.1f}{seconds:>9.2f}")
+    return peak
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdf", help="PDF to ingest (default: generate one)")
+    parser.add_argument("--pages", type=int, default=600)
+    parser.add_argument("--model", action="store_true", help="embed with the configured local model")
+    args = parser.parse_args()
+
+    pdf = args.pdf
+    if not pdf:
+        pdf = os.path.join(tempfile.mkdtemp(), "large.pdf")
+        write_pdf(pdf, args.pages)
+    doc = FileLoader().load_file(pdf)
+    print(f"{os.path.basename(pdf)}: {os.path.getsize(pdf) / 1e6:.1f} MB, {len(doc.content):,} characters")
+
+    if args.model:
+        from app.services.embeddings import EmbeddingService
+        embed = EmbeddingService(provider="local").get_embeddings
+    else:
+        rng = np.random.default_rng(0)
+        embed = lambda texts: rng.standard_normal((len(texts), 384), dtype=np.float32)
+
+    print(f"\n{'pipeline':<9}{'chunks':>9}{'vectors':>9}{'peak MB':>12}{'seconds':>9}")
+    legacy = measure("legacy", legacy_pipeline, doc, embed)
+    compact = measure("compact", compact_pipeline, doc, embed)
+    print(f"\nPeak memory reduced {legacy / compact:.1f}x (document text itself excluded: loaded before measuring)")
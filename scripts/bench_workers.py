@@ -0,0 +1,150 @@
+"""
+Compare memory and throughput of the gunicorn server across worker counts.
+
+For each worker count (with and without model preload) this starts
+`gunicorn -c gunicorn.conf.py app.main:app`, waits for /readyz, fires a fixed
+number of queries and samples memory of the master + workers:
+
+  RSS  counts shared pages once per process (overstates preload setups)
+  PSS  splits shared pages between the processes sharing them (true cost)
+
+Run from the repo root (Linux only, needs /proc):
+    VECTOR_BACKEND=local python scripts/bench_workers.py --workers 1 2 4
+"""
+import os
+import sys
+import time
+import signal
+import asyncio
+import argparse
+import statistics
+import subprocess
+
+import httpx
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend')
+
+def _children(pid: int):
+    kids = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, ValueError, IndexError):
+            continue
+        if ppid == pid:
+            kids.append(int(entry))
+    return kids
+
+def _memory_kb(pid: int):
+    rss = pss = 0
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                if line.startswith("Rss:"):
+                    rss = int(line.split()[1])
+                elif line.startswith("Pss:"):
+                    pss = int(line.split()[1])
+    except OSError:
+        pass
+    return rss, pss
+
+def measure_memory(master_pid: int):
+    pids = [master_pid] + _children(master_pid)
+    totals = [_memory_kb(pid) for pid in pids]
+    return sum(r for r, _ in totals) / 1024, sum(p for _, p in totals) / 1024
+
+async def wait_ready(base_url: str, timeout: float = 300):
+    deadline = time.time() + timeout
+    async with httpx.AsyncClient(timeout=5) as client:
+        while time.time() < deadline:
+            try:
+                if (await client.get(f"{base_url}/readyz")).status_code == 200:
+                    return True
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(1)
+    return False
+
+async def run_load(base_url: str, path: str, query: str, total: int, concurrency: int):
+    latencies = []
+    errors = 0
+    slots = asyncio.Semaphore(concurrency)
+
+    async with httpx.AsyncClient(timeout=60) as client:
+        async def one(i: int):
+            nonlocal errors
+            async with slots:
+                t0 = time.perf_counter()
+                try:
+                    # Vary the text so the cache and coalescing don't short-circuit
+                    res = await client.post(f"{base_url}{path}", json={"query": f"{query} #{i}"})
+                    if res.status_code != 200:
+                        errors += 1
+                except httpx.HTTPError:
+                    errors += 1
+                latencies.append((time.perf_counter() - t0) * 1000)
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(total)))
+        elapsed = time.perf_counter() - t0
+
+    latencies.sort()
+    return {
+        "rps": total / elapsed,
+        "p50": statistics.median(latencies),
+        "p95": latencies[int(len(latencies) * 0.95) - 1],
+        "errors": errors
+    }
+
+def bench(workers: int, preload: bool, args) -> dict:
+    env = dict(os.environ, SERVER_WORKERS=str(workers), SERVER_PRELOAD=str(preload).lower(), PORT=str(args.port))
+    base_url = f"http://127.0.0.1:{args.port}"
+
+    proc = subprocess.Popen(
+        ["gunicorn", "-c", "gunicorn.conf.py", "app.main:app"],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        t0 = time.time()
+        if not asyncio.run(wait_ready(base_url)):
+            raise RuntimeError("server never became ready")
+        startup = time.time() - t0
+        # Give the remaining workers time to finish their own lifespan startup
+        time.sleep(args.settle)
+
+        idle_rss, idle_pss = measure_memory(proc.pid)
+        load = asyncio.run(run_load(base_url, args.path, args.query, args.requests, args.concurrency))
+        rss, pss = measure_memory(proc.pid)
+        return {"workers": workers, "preload": preload, "startup_s": startup,
+                "idle_rss": idle_rss, "idle_pss": idle_pss, "rss": rss, "pss": pss, **load}
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        proc.wait(timeout=60)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--no-compare", action="store_true", help="Only benchmark with preload enabled")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--path", default="/api/query")
+    parser.add_argument("--query", default="What does the document say about pricing?")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--settle", type=float, default=10.0, help="Seconds to wait after first ready worker")
+    args = parser.parse_args()
+
+    if not os.path.exists("/proc/self/smaps_rollup"):
+        sys.exit("This benchmark needs Linux /proc (smaps_rollup).")
+
+    modes = [True] if args.no_compare else [True, False]
+    rows = [bench(w, p, args) for w in args.workers for p in modes]
+
+    print("\n| workers | preload | startup s | idle RSS MB | idle PSS MB | load RSS MB | load PSS MB | req/s | p50 ms | p95 ms | errors |")
+    print("|---|---|---|---|---|---|---|---|---|---|---|")
+    for r in rows:
+        print(f"| {r['workers']} | {'yes' if r['preload'] else 'no'} | {r['startup_s']:.1f} | "
+              f"{r['idle_rss']:.0f} | {r['idle_pss']:.0f} | {r['rss']:.0f} | {r['pss']:.0f} | "
+              f"{r['rps']:.1f} | {r['p50']:.0f} | {r['p95']:.0f} | {r['errors']} |")
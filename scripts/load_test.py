@@ -0,0 +1,300 @@
+"""
+Async load generator for the API: sweeps concurrency levels and reports
+throughput, latency percentiles, error and shed rates, and the knee point.
+
+Each level runs `--duration` seconds of closed-loop traffic: N workers, each
+sending its next request as soon as the previous one returns. Requests are
+drawn from a scenario mix (query, stream, upload); /api/query/stream is only
+used when the app serves it. The knee is the level with the highest power
+(throughput / p50 latency): past it, added concurrency mostly adds queueing.
+
+    # The app in this process, fully offline (no model weights, network or real data files)
+    python scripts/load_test.py --in-process --stub --ramp 1 2 4 8 16 32
+
+    # A running server, with queries replayed from a request log
+    python scripts/load_test.py --url http://localhost:8000 --queries backend/metrics.jsonl \\
+        --mix query=0.9,upload=0.1
+
+`--queries` takes JSONL with a "query" field per line (metrics.jsonl and
+similar request logs) or plain text, one query per line; repeated queries
+keep their weight in the mix. In-process runs share one event loop between
+client and server, so absolute numbers are pessimistic; compare levels.
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import hashlib
+import tempfile
+
+import httpx
+import numpy as np
+
+SAMPLE_QUERIES = [
+    "What is the refund policy?",
+    "How long does shipping take?",
+    "Which plans include priority support?",
+    "How is customer data encrypted?",
+    "Can I export my audit logs?",
+    "thanks",
+]
+
+SAMPLE_DOC = ("Refunds are processed within five business days. Shipping takes one to two weeks. "
+              "Priority support is included in the business plan. Data is encrypted at rest with AES-256. "
+              "Audit logs can be exported from the admin console. ")
+
+def load_queries(path: str):
+    queries = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+                text = record.get("query") if isinstance(record, dict) else None
+            except ValueError:
+                text = line
+            if text:
+                queries.append(text)
+    if not queries:
+        sys.exit(f"No queries found in {path}")
+    return queries
+
+def parse_mix(spec: str):
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+def percentile(sorted_values, p: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * p / 100))]
+
+class Scenarios:
+    """One request of each kind; returns the HTTP status (0 for a transport error)."""
+
+    def __init__(self, client: httpx.AsyncClient, queries, tenant: str, unique: bool):
+        self.client = client
+        self.queries = queries
+        self.tenant = tenant
+        self.unique = unique
+        self.counter = 0
+
+    def _query(self) -> str:
+        self.counter += 1
+        text = random.choice(self.queries)
+        # Unique text keeps the response cache and coalescing from short-circuiting
+        return f"{text} #{self.counter}" if self.unique else text
+
+    async def query(self) -> int:
+        res = await self.client.post("/api/query", json={"query": self._query(), "tenant": self.tenant})
+        return res.status_code
+
+    async def stream(self) -> int:
+        async with self.client.stream("POST", "/api/query/stream",
+                                      json={"query": self._query(), "tenant": self.tenant}) as res:
+            async for _ in res.aiter_bytes():
+                pass
+            return res.status_code
+
+    async def upload(self) -> int:
+        self.counter += 1
+        body = (SAMPLE_DOC * random.randint(5, 20)).encode()
+        res = await self.client.post(
+            "/api/documents/upload",
+            files={"file": (f"loadtest_{self.counter}.txt", body, "text/plain")},
+            data={"tenant": self.tenant}
+        )
+        return res.status_code
+
+async def run_level(scenarios: Scenarios, mix, concurrency: int, duration: float):
+    names = list(mix)
+    weights = [mix[n] for n in names]
+    samples = [] # (scenario, status, latency ms)
+    stop = time.perf_counter() + duration
+
+    async def worker():
+        while time.perf_counter() < stop:
+            name = random.choices(names, weights)[0]
+            t0 = time.perf_counter()
+            try:
+                status = await getattr(scenarios, name)()
+            except httpx.HTTPError:
+                status = 0
+            samples.append((name, status, (time.perf_counter() - t0) * 1000))
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - t0
+    return summarize(samples, elapsed, concurrency)
+
+def summarize(samples, elapsed: float, concurrency: int):
+    def stats(rows):
+        ok = sorted(ms for _, status, ms in rows if 200 <= status < 300)
+        shed = sum(1 for _, status, _ in rows if status in (429, 503))
+        errors = sum(1 for _, status, _ in rows if not 200 <= status < 300)
+        return {
+            "requests": len(rows),
+            "rps": len(ok) / elapsed if elapsed else 0.0, # successful requests per second
+            "p50_ms": percentile(ok, 50),
+            "p90_ms": percentile(ok, 90),
+            "p99_ms": percentile(ok, 99),
+            "error_rate": errors / len(rows) if rows else 0.0,
+            "shed_rate": shed / len(rows) if rows else 0.0
+        }
+
+    result = {"concurrency": concurrency, **stats(samples), "scenarios": {}}
+    for name in sorted({s[0] for s in samples}):
+        result["scenarios"][name] = stats([s for s in samples if s[0] == name])
+    return result
+
+def find_knee(levels):
+    """Level with the highest power (throughput / p50 latency)."""
+    def power(level):
+        return level["rps"] / level["p50_ms"] if level["p50_ms"] else 0.0
+    return max(levels, key=power) if levels else None
+
+async def wait_ready(client: httpx.AsyncClient, timeout: float = 300):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if (await client.get("/readyz")).status_code == 200:
+                return True
+        except httpx.HTTPError:
+            pass
+        await asyncio.sleep(0.5)
+    return False
+
+async def sweep(client: httpx.AsyncClient, args):
+    if not await wait_ready(client):
+        sys.exit("Server never became ready")
+
+    mix = parse_mix(args.mix)
+    paths = (await client.get("/openapi.json")).json().get("paths", {})
+    if "stream" in mix and "/api/query/stream" not in paths:
+        print("No /api/query/stream on this server: dropping the stream scenario")
+        mix.pop("stream")
+    unknown = set(mix) - {"query", "stream", "upload"}
+    if unknown:
+        sys.exit(f"Unknown scenarios: {sorted(unknown)}")
+
+    queries = load_queries(args.queries) if args.queries else SAMPLE_QUERIES
+    scenarios = Scenarios(client, queries, args.tenant, unique=not args.repeat)
+
+    # Something to retrieve from
+    for _ in range(args.seed_docs):
+        await scenarios.upload()
+
+    print(f"\nMix {mix}, {len(queries)} queries, {args.duration:.0f}s per level")
+    print(f"{'conc':>5}{'reqs':>7}{'rps':>8}{'p50 ms':>9}{'p90 ms':>9}{'p99 ms':>9}{'err %':>7}{'shed %':>8}")
+    levels = []
+    for concurrency in args.ramp:
+        level = await run_level(scenarios, mix, concurrency, args.duration)
+        levels.append(level)
+        print(f"{concurrency:>5}{level['requests']:>7}{level['rps']:>8.1f}{level['p50_ms']:>9.0f}"
+              f"{level['p90_ms']:>9.0f}{level['p99_ms']:>9.0f}{level['error_rate']:>7.1%}{level['shed_rate']:>8.1%}")
+        if args.per_scenario:
+            for name, s in level["scenarios"].items():
+                print(f"{'':>5}  {name:<8}{s['requests']:>5}{s['rps']:>8.1f}{s['p50_ms']:>9.0f}"
+                      f"{s['p90_ms']:>9.0f}{s['p99_ms']:>9.0f}{s['error_rate']:>7.1%}{s['shed_rate']:>8.1%}")
+
+    knee = find_knee(levels)
+    if knee:
+        print(f"\nKnee: concurrency {knee['concurrency']} ({knee['rps']:.1f} rps at p50 {knee['p50_ms']:.0f} ms)")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"mix": mix, "levels": levels, "knee": knee and knee["concurrency"]}, f, indent=2)
+        print(f"Wrote {args.json}")
+
+class HashEmbedder:
+    """Stand-in for the SentenceTransformer model: deterministic hashed bag-of-words vectors, no weights."""
+
+    def __init__(self, dimension: int = 384):
+        self.dimension = dimension
+
+    def encode(self, texts, **kwargs):
+        vectors = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in text.lower().split():
+                h = int.from_bytes(hashlib.blake2b(word.encode(), digest_size=8).digest(), "big")
+                vectors[row, h % self.dimension] += 1.0 if h >> 63 else -1.0
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-9)
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dimension
+
+def stub_environment(llm_ms: float):
+    """
+    Offline backends for in-process runs: mock LLM, hash embedder, local
+    index, no Redis or Postgres, and every on-disk store in a temp dir.
+    Overrides the environment and .env so a run never touches real data.
+    """
+    data = tempfile.mkdtemp(prefix="loadtest_")
+    print(f"Stub stores in {data}")
+    os.environ.update({
+        "VECTOR_BACKEND": "local",
+        "LOCAL_INDEX_SNAPSHOT_PATH": "",
+        "LLM_PROVIDERS": json.dumps(["mock"]),
+        "MOCK_LLM_LATENCY_MS": str(llm_ms),
+        "EMBEDDING_MODEL": "stub-hash-embedder",
+        "REDIS_URL": "",
+        "DATABASE_URL": "",
+        "MONITORING_BACKEND": "sqlite",
+        "MONITORING_DB_PATH": os.path.join(data, "metrics.sqlite"),
+        "DEDUP_INDEX_PATH": os.path.join(data, "dedup.sqlite"),
+        "DOCSTORE_PATH": os.path.join(data, "docstore.sqlite"),
+        "EXTRACTION_CACHE_PATH": os.path.join(data, "extraction_cache.sqlite"),
+        "ROUTER_CENTROIDS_PATH": os.path.join(data, "router_centroids.npz"),
+        "CACHE_WARM_ON_STARTUP": "false",
+    })
+
+def stub_embeddings():
+    # Pre-seed the per-process model cache so load_local_model never loads weights
+    from app.config import settings
+    from app.services import embeddings
+    embeddings._LOCAL_MODELS[settings.EMBEDDING_MODEL] = HashEmbedder()
+
+async def main(args):
+    if not args.in_process:
+        async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout) as client:
+            await sweep(client, args)
+        return
+
+    if args.stub:
+        stub_environment(args.stub_llm_ms)
+    # Add backend to sys.path
+    sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'backend'))
+    if args.stub:
+        stub_embeddings()
+    from app.main import app
+
+    # ASGITransport does not run the lifespan: start (and stop) services here
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://app", timeout=args.timeout) as client:
+            await sweep(client, args)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000", help="server to load (ignored with --in-process)")
+    parser.add_argument("--in-process", action="store_true", help="drive the ASGI app in this process")
+    parser.add_argument("--stub", action="store_true", help="with --in-process: mock LLM, hash embedder, local index, temp stores")
+    parser.add_argument("--stub-llm-ms", type=float, default=200.0, help="mock LLM latency")
+    parser.add_argument("--ramp", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32], help="concurrency levels")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per level")
+    parser.add_argument("--mix", default="query=0.85,stream=0.1,upload=0.05", help="scenario=weight,...")
+    parser.add_argument("--queries", help="JSONL request log (a 'query' per line) or plain text queries")
+    parser.add_argument("--repeat", action="store_true", help="send queries verbatim (exercise the cache)")
+    parser.add_argument("--tenant", default="loadtest", help="namespace for load-test uploads and queries")
+    parser.add_argument("--seed-docs", type=int, default=3, help="uploads before the sweep")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--per-scenario", action="store_true")
+    parser.add_argument("--json", help="write the results here")
+    asyncio.run(main(parser.parse_args()))
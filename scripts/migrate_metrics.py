@@ -0,0 +1,72 @@
+"""
+Load JSONL request-metrics history (metrics.jsonl, one JSON record per line)
+into the indexed metrics store the API now writes to.
+
+    python scripts/migrate_metrics.py backend/metrics.jsonl
+    python scripts/migrate_metrics.py old/*.jsonl --backend postgres --batch-size 5000
+
+The store comes from MONITORING_BACKEND / DATABASE_URL / MONITORING_DB_PATH.
+Files are streamed line by line; malformed lines are counted and skipped.
+Run it once, before the API has logged into the store: a store that already
+holds rows is refused unless --append is given, so a re-run cannot double
+the history.
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+
+# Add backend to sys.path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from app.services.monitoring import create_store, to_row
+
+async def migrate(paths, backend, batch_size, append):
+    store = create_store(backend)
+    await store.open()
+    try:
+        existing = await store.count()
+        if existing and not append:
+            print(f"The {store.name} store already holds {existing} rows; pass --append to add to them.")
+            return 1
+
+        t0 = time.time()
+        migrated = skipped = 0
+        for path in paths:
+            batch = []
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    try:
+                        batch.append(to_row(json.loads(line)))
+                    except (ValueError, TypeError, AttributeError):
+                        skipped += 1
+                        continue
+                    if len(batch) >= batch_size:
+                        await store.insert_many(batch)
+                        migrated += len(batch)
+                        batch = []
+            if batch:
+                await store.insert_many(batch)
+                migrated += len(batch)
+            print(f"{path}: done ({migrated} rows so far)")
+
+        seconds = time.time() - t0
+        print(f"Migrated {migrated} records into {store.name} in {seconds:.1f}s "
+              f"({migrated / max(seconds, 1e-9):.0f} rows/s), skipped {skipped} malformed lines")
+        return 0
+    finally:
+        await store.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("paths", nargs="+", help="JSONL files, oldest first")
+    parser.add_argument("--backend", choices=["auto", "postgres", "sqlite"], default=None,
+                        help="default: MONITORING_BACKEND")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--append", action="store_true", help="allow migrating into a non-empty store")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(migrate(args.paths, args.backend, args.batch_size, args.append)))
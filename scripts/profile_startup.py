@@ -0,0 +1,78 @@
+import sys
+import os
+import re
+import time
+import argparse
+import subprocess
+from collections import defaultdict
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend')
+
+IMPORT_LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+def profile_imports(module: str):
+    """
+    Import `module` in a fresh interpreter with -X importtime and parse the report.
+    Returns a list of (module, self_us, cumulative_us, depth).
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BACKEND_DIR,
+        capture_output=True,
+        text=True
+    )
+    if result.returncode != 0:
+        print(result.stderr.splitlines()[-1] if result.stderr else "Import failed.")
+
+    rows = []
+    for line in result.stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            rows.append((name, int(self_us), int(cumulative_us), (len(indent) - 1) // 2))
+    return rows
+
+def report_imports(module: str, top: int):
+    rows = profile_imports(module)
+    if not rows:
+        return
+
+    total = max(cumulative for _, _, cumulative, depth in rows if depth == 0)
+    print(f"\nImporting {module}: {total / 1000:.1f} ms total")
+
+    # Attribute self time to top-level packages (fastapi, numpy, app, ...)
+    by_package = defaultdict(int)
+    for name, self_us, _, _ in rows:
+        by_package[name.split(".")[0]] += self_us
+
+    print(f"\nTop {top} packages by self time:")
+    for package, us in sorted(by_package.items(), key=lambda kv: kv[1], reverse=True)[:top]:
+        print(f"  {package:<30} {us / 1000:8.1f} ms")
+
+    print(f"\nTop {top} modules by cumulative time:")
+    for name, _, cumulative, _ in sorted(rows, key=lambda r: r[2], reverse=True)[:top]:
+        print(f"  {name:<50} {cumulative / 1000:8.1f} ms")
+
+def report_services():
+    """Time each service constructor the way the app lifespan builds them."""
+    sys.path.append(BACKEND_DIR)
+    import asyncio
+    from app.services.container import services
+
+    t0 = time.time()
+    asyncio.run(services.start())
+    print(f"\nService startup: {time.time() - t0:.2f} s (ready={services.ready})")
+    for name, seconds in sorted(services.startup_seconds.items(), key=lambda kv: kv[1], reverse=True):
+        error = f"  FAILED: {services.errors[name]}" if name in services.errors else ""
+        print(f"  {name:<30} {seconds * 1000:8.1f} ms{error}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Report per-module import cost and service startup time.")
+    parser.add_argument("--module", default="app.main", help="Module to import (default: app.main)")
+    parser.add_argument("--top", type=int, default=15, help="Rows to show per table")
+    parser.add_argument("--services", action="store_true", help="Also time service construction")
+    args = parser.parse_args()
+
+    report_imports(args.module, args.top)
+    if args.services:
+        report_services()
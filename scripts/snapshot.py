@@ -0,0 +1,66 @@
+"""
+Export or import a vector index snapshot (ids, float32 vectors, text, metadata)
+without re-parsing or re-embedding any documents.
+
+    python scripts/snapshot.py export ./snapshots/default
+    python scripts/snapshot.py import ./snapshots/default --concurrency 8
+    python scripts/snapshot.py info ./snapshots/default
+
+The vector backend comes from VECTOR_BACKEND. A local index lives in-process,
+so to warm-start the API from a snapshot set LOCAL_INDEX_SNAPSHOT_PATH instead.
+For the same reason a local export first loads its source snapshot (--source,
+default LOCAL_INDEX_SNAPSHOT_PATH), e.g. to re-export one namespace of it.
+"""
+import os
+import sys
+import argparse
+
+# Add backend to sys.path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from app.config import settings
+from app.services.snapshot import SnapshotReader, export_snapshot, import_snapshot
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["export", "import", "info"])
+    parser.add_argument("path", help="snapshot directory")
+    parser.add_argument("--namespace", default=None, help="default: DEFAULT_NAMESPACE on export, the snapshot's own on import")
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=settings.SNAPSHOT_IMPORT_CONCURRENCY)
+    parser.add_argument("--source", default=settings.LOCAL_INDEX_SNAPSHOT_PATH,
+                        help="local backend: snapshot to load before exporting")
+    args = parser.parse_args()
+
+    if args.command == "info":
+        reader = SnapshotReader(args.path)
+        size = sum(os.path.getsize(os.path.join(args.path, f)) for f in os.listdir(args.path))
+        print({**reader.manifest, "bytes": size})
+        reader.close()
+        return
+
+    from app.services.retrieval import VectorService
+    service = VectorService()
+
+    if args.command == "export":
+        if service.backend == "local":
+            # A fresh process has an empty local index: load what it is exported from
+            if not args.source:
+                sys.exit("VECTOR_BACKEND=local has no stored index to export: pass --source "
+                         "(or set LOCAL_INDEX_SNAPSHOT_PATH) to a snapshot to load first.")
+            if os.path.abspath(args.source) == os.path.abspath(args.path):
+                sys.exit("--source and the export path must differ.")
+            count, _ = import_snapshot(service, args.source, batch_size=args.batch_size)
+            print(f"Loaded {count} vectors from {args.source}")
+        try:
+            manifest = export_snapshot(service, args.path, namespace=args.namespace, batch_size=args.batch_size)
+        except ValueError as e:
+            sys.exit(f"Export failed: {e}")
+        print(f"Exported {manifest['count']} vectors (dim {manifest['dimension']}) to {args.path}")
+    else:
+        count, seconds = import_snapshot(service, args.path, namespace=args.namespace,
+                                         batch_size=args.batch_size, concurrency=args.concurrency)
+        print(f"Imported {count} vectors in {seconds:.1f}s ({count / max(seconds, 1e-9):.0f} vectors/s)")
+
+if __name__ == "__main__":
+    main()
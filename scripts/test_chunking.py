@@ -0,0 +1,40 @@
+import sys
+import os
+
+# Add backend path to sys.path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from app.utils.preprocessing import Document
+from app.utils.chunking import SemanticChunking
+
+def test_long_sentence_split(max_tokens: int = 64, overlap_tokens: int = 8):
+    print("Testing semantic chunking of a sentence longer than the token budget...")
+    # PDF-extracted text often has no sentence punctuation at all
+    words = [f"word{i}" for i in range(600)]
+    text = "Short opening sentence. " + " ".join(words) + ". Short closing sentence."
+    count_tokens = lambda t: len(t.split())
+
+    chunker = SemanticChunking(max_tokens=max_tokens, min_tokens=16, overlap_tokens=overlap_tokens,
+                               count_tokens=count_tokens)
+    chunks = chunker.chunk(Document(content=text, metadata={"source": "long.txt"}))
+
+    sizes = [count_tokens(c.content) for c in chunks]
+    print(f"Generated {len(chunks)} chunks, token sizes: {sizes}")
+
+    covered = set()
+    for c in chunks:
+        covered.update(w for w in c.content.split() if w.startswith("word"))
+    missing = [w for w in words if w not in covered and w + "." not in covered]
+    overlapping = sum(
+        1 for a, b in zip(chunks, chunks[1:])
+        if set(a.content.split()) & set(b.content.split())
+    )
+    print(f"Words missing from every chunk: {len(missing)}, adjacent chunks sharing words: {overlapping}")
+
+    if max(sizes) <= max_tokens and not missing and overlapping:
+        print("\nSUCCESS: The long sentence was cut at the budget with overlap and nothing was lost.")
+    else:
+        print("\nFAILURE: A chunk exceeds the budget or text was dropped.")
+
+if __name__ == "__main__":
+    test_long_sentence_split()
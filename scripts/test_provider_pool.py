@@ -0,0 +1,51 @@
+import sys
+import os
+import json
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+# Mock providers: one fast, one slow, one that fails half the time
+os.environ.setdefault("LLM_PROVIDERS", json.dumps(["mock-fast", "mock-slow", "mock-flaky"]))
+os.environ.setdefault("MOCK_LLM_PROFILES", json.dumps({
+    "mock-fast": {"latency_ms": 50, "jitter_ms": 5},
+    "mock-slow": {"latency_ms": 400, "jitter_ms": 20},
+    "mock-flaky": {"latency_ms": 30, "jitter_ms": 5, "error_rate": 0.5}
+}))
+os.environ.setdefault("LLM_MAX_CONCURRENCY", json.dumps({"mock-fast": 4, "mock-slow": 4, "mock-flaky": 4}))
+
+# Add backend to sys.path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from app.services.generation import GenerationService
+
+def test_provider_pool(calls: int = 200, concurrency: int = 8):
+    print("Testing LLM provider pool with mock providers (offline)...")
+    service = GenerationService()
+    context = [{"text": "Python was created by Guido van Rossum.", "metadata": {}}]
+
+    def one(i):
+        return service.generate_with_provider(f"Who created Python? #{i}", context)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one, range(calls)))
+
+    served = Counter(provider for _, provider in results)
+    failed = sum(1 for answer, _ in results if answer is None)
+
+    print(f"\nCalls: {calls}, concurrency: {concurrency}, unanswered: {failed}")
+    for name, count in served.most_common():
+        print(f"  {name or 'none':<12} {count:4d}")
+
+    print("\nProvider state:")
+    for p in service.stats():
+        latency = p["ewma_latency_ms"]
+        print(f"  {p['name']:<12} ewma={latency or 0:7.1f} ms  errors={p['ewma_error_rate']:.2f}  "
+              f"breaker={p['breaker']['state']}")
+
+    if served["mock-fast"] > served["mock-slow"] and failed == 0:
+        print("\nSUCCESS: Traffic favoured the fast provider and failures failed over.")
+    else:
+        print("\nFAILURE: Unexpected routing.")
+
+if __name__ == "__main__":
+    test_provider_pool()